@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Load test for the permit API with a latency SLO report.
+
+Replays a weighted traffic mix - permit list pages, filtered lists, search,
+permit detail, dashboard and CSV export - from many concurrent asyncio
+clients (keep-alive HTTP/1.1, standard library only) against a running
+server, and reports p50/p95/p99 latency, throughput and error rate per
+endpoint, checked against per-endpoint SLOs.
+
+Save a run with --out, then judge a change to scraper/views.py with
+--baseline: endpoints whose p95 or throughput got worse than the tolerance
+are reported as regressions (exit status 1).
+
+Typical session:
+    python manage.py seed_permits --rows 1000000
+    gunicorn --workers 4 permit_api.wsgi:application --bind 127.0.0.1:8000
+    python benchmarks/api_load.py --duration 60 --concurrency 32 --out before.json
+    ... change views ...
+    python benchmarks/api_load.py --duration 60 --concurrency 32 --baseline before.json
+"""
+
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import platform
+from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit, urlencode
+
+API = "/api/scraper"
+
+# Relative weights of each request type in the traffic mix
+DEFAULT_MIX = {
+    "list": 30,
+    "list_filtered": 20,
+    "search": 15,
+    "detail": 20,
+    "dashboard": 10,
+    "export": 5,
+}
+
+# p95 latency (ms) and error rate each endpoint must stay under
+DEFAULT_SLOS = {
+    "list": {"p95_ms": 300, "error_rate": 0.01},
+    "list_filtered": {"p95_ms": 400, "error_rate": 0.01},
+    "search": {"p95_ms": 800, "error_rate": 0.01},
+    "detail": {"p95_ms": 100, "error_rate": 0.01},
+    "dashboard": {"p95_ms": 300, "error_rate": 0.01},
+    "export": {"p95_ms": 5000, "error_rate": 0.02},
+}
+
+CITY_NAMES = ["New York City", "Chicago", "Los Angeles", "San Francisco"]
+SEARCH_TERMS = ["renovation", "hospital", "residential", "office", "hotel", "warehouse", "Main", "Broadway"]
+
+
+class HTTPConnection:
+    """One keep-alive HTTP/1.1 connection on asyncio streams"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        """(status, body bytes) for a GET, reconnecting once if the server dropped the connection"""
+        for attempt in (0, 1):
+            if self.writer is None:
+                await self._connect()
+            try:
+                self.writer.write(
+                    f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\nAccept: */*\r\n"
+                    f"Connection: keep-alive\r\n\r\n".encode("latin-1")
+                )
+                await self.writer.drain()
+                return await self._read_response()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt:
+                    raise
+
+    async def _read_response(self):
+        status_line = await self.reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readuntil(b"\r\n")
+                    break
+                body += await self.reader.readexactly(size)
+                await self.reader.readexactly(2)
+        elif "content-length" in headers:
+            body = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await self.reader.read()
+            headers["connection"] = "close"
+
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, bytes(body)
+
+
+class TrafficMix:
+    """Random request paths following the weighted mix"""
+
+    def __init__(self, mix, permit_ids, rng, last_page=500):
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.permit_ids = permit_ids or [1]
+        self.last_page = max(1, last_page)
+        self.rng = rng
+
+    def next(self):
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        return kind, getattr(self, f"_{kind}")()
+
+    def _list(self):
+        # Mostly the first pages, occasionally deep ones
+        if self.rng.random() < 0.9:
+            page = int(self.rng.paretovariate(1.2))
+        else:
+            page = self.rng.randint(1, self.last_page)
+        page = min(page, self.last_page)
+        return f"{API}/permits/?{urlencode({'page': page, 'page_size': 50})}"
+
+    def _list_filtered(self):
+        params = {"city": self.rng.choice(CITY_NAMES)}
+        if self.rng.random() < 0.6:
+            params["min_cost"] = self.rng.choice([2000000, 5000000, 10000000])
+        if self.rng.random() < 0.5:
+            params["start_date"] = (date.today() - timedelta(days=self.rng.choice([30, 90, 180]))).isoformat()
+        return f"{API}/permits/?{urlencode(params)}"
+
+    def _search(self):
+        return f"{API}/permits/?{urlencode({'search': self.rng.choice(SEARCH_TERMS)})}"
+
+    def _detail(self):
+        return f"{API}/permits/{self.rng.choice(self.permit_ids)}/"
+
+    def _dashboard(self):
+        return f"{API}/dashboard/"
+
+    def _export(self):
+        params = {
+            "city": self.rng.choice(CITY_NAMES),
+            "min_cost": 20000000,
+            "start_date": (date.today() - timedelta(days=30)).isoformat(),
+        }
+        return f"{API}/permits/export-csv/?{urlencode(params)}"
+
+
+async def discover_permits(host, port, pages=5):
+    """(permit ids from the first list pages, total permit count) to aim detail and deep-page requests"""
+    conn = HTTPConnection(host, port)
+    ids = []
+    count = 0
+    try:
+        for page in range(1, pages + 1):
+            status, body = await conn.get(f"{API}/permits/?page={page}&page_size=100")
+            if status != 200:
+                break
+            data = json.loads(body)
+            count = data.get("count", count)
+            ids += [p["id"] for p in data.get("results", []) if "id" in p]
+    finally:
+        await conn.close()
+    return ids, count
+
+
+async def worker(host, port, mix, deadline, warmup_until, samples):
+    conn = HTTPConnection(host, port)
+    try:
+        while time.monotonic() < deadline:
+            kind, path = mix.next()
+            started = time.monotonic()
+            try:
+                status, body = await conn.get(path)
+                size = len(body)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                status, size = 0, 0
+                await conn.close()
+            finished = time.monotonic()
+            if started >= warmup_until:
+                samples.append((kind, status, finished - started, size))
+    finally:
+        await conn.close()
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, seconds, slos):
+    """Per-endpoint latency, throughput, error rate and SLO verdicts"""
+    by_kind = {}
+    for kind, status, latency, size in samples:
+        by_kind.setdefault(kind, []).append((status, latency, size))
+
+    report = {}
+    for kind, rows in sorted(by_kind.items()):
+        latencies = sorted(latency * 1000 for _, latency, _ in rows)
+        errors = sum(1 for status, _, _ in rows if status == 0 or status >= 400)
+        stats = {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": round(errors / len(rows), 4),
+            "rps": round(len(rows) / seconds, 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2),
+            "mean_bytes": int(sum(size for _, _, size in rows) / len(rows)),
+        }
+        slo = slos.get(kind)
+        if slo:
+            stats["slo"] = slo
+            stats["slo_met"] = stats["p95_ms"] <= slo["p95_ms"] and stats["error_rate"] <= slo["error_rate"]
+        report[kind] = stats
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """[(endpoint, metric, old, new, change)] that got worse than the tolerance"""
+    regressions = []
+    for kind, stats in report.items():
+        old = baseline["endpoints"].get(kind)
+        if not old:
+            continue
+        if old["p95_ms"] and (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"] > tolerance:
+            regressions.append((kind, "p95_ms", old["p95_ms"], stats["p95_ms"],
+                                (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"]))
+        if old["rps"] and (old["rps"] - stats["rps"]) / old["rps"] > tolerance:
+            regressions.append((kind, "rps", old["rps"], stats["rps"], (stats["rps"] - old["rps"]) / old["rps"]))
+        if stats["error_rate"] > old["error_rate"] + 0.01:
+            regressions.append((kind, "error_rate", old["error_rate"], stats["error_rate"],
+                                stats["error_rate"] - old["error_rate"]))
+    return regressions
+
+
+async def run(args, mix_weights, slos):
+    url = urlsplit(args.base_url)
+    host, port = url.hostname, url.port or 80
+    permit_ids, count = await discover_permits(host, port)
+    last_page = -(-count // 50)
+    if not permit_ids:
+        print("Warning: no permits found - seed the database first (manage.py seed_permits)")
+
+    samples = []
+    rng = random.Random(args.seed)
+    started = time.monotonic()
+    warmup_until = started + args.warmup
+    deadline = warmup_until + args.duration
+    await asyncio.gather(*(
+        worker(host, port, TrafficMix(mix_weights, permit_ids, random.Random(rng.random()), last_page),
+               deadline, warmup_until, samples)
+        for _ in range(args.concurrency)
+    ))
+    measured = max(time.monotonic() - warmup_until, 1e-9)
+    return summarize(samples, measured, slos), len(samples), measured
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of traffic before measuring")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mix", help='JSON weights, e.g. \'{"list": 50, "detail": 50}\'')
+    parser.add_argument("--slo-file", help="JSON file of per-endpoint {p95_ms, error_rate} SLOs")
+    parser.add_argument("--out", help="save the report as JSON")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed p95/throughput change vs baseline")
+    args = parser.parse_args()
+
+    mix_weights = json.loads(args.mix) if args.mix else DEFAULT_MIX
+    unknown = [k for k in mix_weights if k not in DEFAULT_MIX]
+    if unknown:
+        parser.error(f"Unknown request types in --mix: {', '.join(unknown)}")
+    slos = dict(DEFAULT_SLOS)
+    if args.slo_file:
+        with open(args.slo_file, encoding="utf-8") as f:
+            slos.update(json.load(f))
+
+    endpoints, total, seconds = asyncio.run(run(args, mix_weights, slos))
+
+    print(f"{total} requests in {seconds:.1f}s ({total / seconds:.1f} req/s), concurrency {args.concurrency}")
+    print(f"{'endpoint':<15}{'reqs':>7}{'rps':>8}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  SLO")
+    for kind, s in endpoints.items():
+        verdict = "" if "slo_met" not in s else ("ok" if s["slo_met"] else
+                                                 f"FAIL (p95 <= {s['slo']['p95_ms']}ms, "
+                                                 f"errors <= {s['slo']['error_rate']:.0%})")
+        print(f"{kind:<15}{s['requests']:>7}{s['rps']:>8}{s['error_rate'] * 100:>7.1f}"
+              f"{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}{s['max_ms']:>9}  {verdict}")
+
+    report = {
+        "benchmark": "api_load",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {
+            "base_url": args.base_url, "duration": args.duration, "warmup": args.warmup,
+            "concurrency": args.concurrency, "seed": args.seed, "mix": mix_weights,
+        },
+        "total_requests": total,
+        "rps": round(total / seconds, 2),
+        "endpoints": endpoints,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(endpoints, json.load(f), args.tolerance)
+        for kind, metric, old, new, change in regressions:
+            print(f"REGRESSION {kind} {metric}: {old} -> {new} ({change:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions vs {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
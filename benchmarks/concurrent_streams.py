@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Concurrent-connection capacity of the streaming endpoints.
+
+Opens --connections clients at once against a running server, each
+requesting a long-lived response - a run's progress stream
+(runs/<run_id>/events/) or a CSV export read by a slow client - and holding
+it open for --hold seconds. Reports how many streams were being served at
+the same time, the time to first byte (p50/p95/max) and the failures.
+
+A sync worker serves one response at a time, so the capacity of the old
+deployment is its worker count; under ASGI a few workers hold hundreds.
+Compare the two with CSV exports read by slow clients, using --out and
+--baseline:
+
+    gunicorn --workers 3 permit_api.wsgi:application --bind 127.0.0.1:8000
+    python benchmarks/concurrent_streams.py --export "city=Chicago" --connections 300 --out sync.json
+    gunicorn --workers 3 --worker-class uvicorn_worker.UvicornWorker permit_api.asgi:application --bind 127.0.0.1:8000
+    python benchmarks/concurrent_streams.py --export "city=Chicago" --connections 300 --baseline sync.json
+
+Progress streams (--run-id) only work under ASGI - WSGI buffers an async
+stream whole, so one never starts while its run is going. Give the run_id of
+a run that is still "running" so the streams stay open.
+"""
+
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import platform
+from datetime import datetime
+from urllib.parse import urlsplit
+
+API = "/api/scraper"
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Gauge:
+    """Number of streams open right now, and the most seen at once"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+
+    def enter(self):
+        self.current += 1
+        self.peak = max(self.peak, self.current)
+
+    def leave(self):
+        self.current -= 1
+
+
+async def stream_client(host, port, path, hold, read_delay, first_byte_timeout, open_streams):
+    """(status, seconds to first body byte or None, bytes read) for one held stream"""
+    started = time.monotonic()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), first_byte_timeout)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: */*\r\nConnection: close\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), first_byte_timeout - (time.monotonic() - started))
+        status = int(head.split(b" ", 2)[1])
+        first = await asyncio.wait_for(reader.read(1024), first_byte_timeout - (time.monotonic() - started))
+        first_byte = time.monotonic() - started
+        if status != 200 or not first:
+            return status, None, len(first)
+
+        size = len(first)
+        open_streams.enter()
+        try:
+            # A slow client: take a little at a time until the hold time is up or the stream ends
+            deadline = time.monotonic() + hold
+            while time.monotonic() < deadline:
+                await asyncio.sleep(read_delay)
+                try:
+                    data = await asyncio.wait_for(reader.read(4096), max(0.01, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    continue
+                if not data:
+                    break
+                size += len(data)
+        finally:
+            open_streams.leave()
+        return status, first_byte, size
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+        return 0, None, 0
+    finally:
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+async def run(args, path):
+    url = urlsplit(args.base_url)
+    open_streams = Gauge()
+    started = time.monotonic()
+    results = await asyncio.gather(*[
+        stream_client(url.hostname, url.port or 80, path, args.hold, args.read_delay,
+                      args.first_byte_timeout, open_streams)
+        for _ in range(args.connections)
+    ])
+    return results, open_streams.peak, time.monotonic() - started
+
+
+def summarize(results, peak, seconds):
+    first_bytes = sorted(fb * 1000 for _, fb, _ in results if fb is not None)
+    served = len(first_bytes)
+    return {
+        "connections": len(results),
+        "served": served,
+        "failed": len(results) - served,
+        "peak_concurrent_streams": peak,
+        "ttfb_p50_ms": round(percentile(first_bytes, 50), 1) if served else None,
+        "ttfb_p95_ms": round(percentile(first_bytes, 95), 1) if served else None,
+        "ttfb_max_ms": round(first_bytes[-1], 1) if served else None,
+        "bytes": sum(size for _, _, size in results),
+        "seconds": round(seconds, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--connections", type=int, default=200, help="clients opened at once")
+    parser.add_argument("--hold", type=float, default=20, help="seconds each client keeps its stream open")
+    parser.add_argument("--read-delay", type=float, default=0.5, help="seconds a client waits between reads")
+    parser.add_argument("--first-byte-timeout", type=float, default=10,
+                        help="a stream not started within this many seconds counts as failed")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--run-id", help="stream runs/<run_id>/events/")
+    target.add_argument("--export", metavar="QUERY", help='stream permits/export-csv/?QUERY (e.g. "city=Chicago")')
+    parser.add_argument("--out", help="save the report as JSON")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    if args.run_id:
+        path = f"{API}/runs/{args.run_id}/events/"
+    else:
+        path = f"{API}/permits/export-csv/?{args.export}"
+
+    results, peak, seconds = asyncio.run(run(args, path))
+    report = summarize(results, peak, seconds)
+    errors = {}
+    for status, first_byte, _ in results:
+        if first_byte is None:
+            errors[status or "connection"] = errors.get(status or "connection", 0) + 1
+
+    print(f"{report['connections']} connections to {path}")
+    print(f"  served {report['served']}, failed {report['failed']} {errors or ''}")
+    print(f"  peak concurrent streams {report['peak_concurrent_streams']}")
+    print(f"  time to first byte p50 {report['ttfb_p50_ms']} ms, p95 {report['ttfb_p95_ms']} ms, "
+          f"max {report['ttfb_max_ms']} ms")
+
+    report = {
+        "benchmark": "concurrent_streams",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {
+            "base_url": args.base_url, "path": path, "connections": args.connections, "hold": args.hold,
+            "read_delay": args.read_delay, "first_byte_timeout": args.first_byte_timeout,
+        },
+        **report,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        for key in ("served", "peak_concurrent_streams", "ttfb_p95_ms"):
+            print(f"  {key}: {baseline.get(key)} -> {report.get(key)}")
+        if report["served"] < baseline.get("served", 0):
+            print("REGRESSION: fewer streams served than the baseline")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Cold-start import cost of a web worker, measured with `python -X importtime`.
+
+Imports what a gunicorn worker loads before serving its first request
+(settings, apps, ASGI handler, middleware and URLconf) in a fresh
+interpreter, then reports total import time and the slowest top-level
+imports. Fails (exit status 1) if a heavy scraping dependency is pulled in
+at boot or the total goes over --max-ms, so it can gate builds.
+
+Usage:
+    python benchmarks/import_time.py [--max-ms 2000] [--top 15] [--json]
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed once a scrape or export actually runs. (requests is left out:
+# DRF imports it at boot whenever it is installed.)
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow"]
+
+WORKER_BOOT = (
+    "import django; django.setup(); "
+    "import permit_api.asgi, permit_api.urls, scraper.admin, scraper.views"
+)
+
+
+def measure(code=WORKER_BOOT, settings=None):
+    """[(module, self_us, cumulative_us, depth)] for every import done by `code` in a fresh interpreter"""
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", settings or "permit_api.settings")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Worker imports failed:\n{result.stderr[-3000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", 0)) or None,
+                        help="fail if total import time exceeds this (default: IMPORT_BUDGET_MS, unset = no limit)")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--forbid", nargs="*", default=HEAVY_MODULES, help="modules that must not load at boot")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    imports = measure()
+    total_ms = sum(self_us for _, self_us, _, _ in imports) / 1000
+    loaded = {name for name, _, _, _ in imports}
+    forbidden = sorted(m for m in args.forbid if m in loaded)
+    top_level = sorted((i for i in imports if i[3] == 1), key=lambda i: i[2], reverse=True)[:args.top]
+
+    if args.json:
+        print(json.dumps({
+            "total_ms": round(total_ms, 1),
+            "modules": len(imports),
+            "forbidden_loaded": forbidden,
+            "top": [{"module": n, "cumulative_ms": round(c / 1000, 1)} for n, _, c, _ in top_level],
+        }, indent=2))
+    else:
+        print(f"Worker boot imports: {len(imports)} modules, {total_ms:.0f} ms")
+        for name, _, cumulative_us, _ in top_level:
+            print(f"  {cumulative_us / 1000:>8.1f} ms  {name}")
+
+    failed = False
+    if forbidden:
+        print(f"FAIL: heavy modules imported at boot: {', '.join(forbidden)}")
+        failed = True
+    if args.max_ms is not None and total_ms > args.max_ms:
+        print(f"FAIL: boot imports took {total_ms:.0f} ms (budget {args.max_ms:.0f} ms)")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Peak memory of the typed city ingest path.
+
+For every city a synthetic API page (100k rows by default, shaped like the
+real Socrata payload) is parsed with parse_city_payload in its own process,
+so each city's peak RSS is measured in isolation.
+
+Usage:
+    python benchmarks/ingest_memory.py [--rows 100000] [--cities nyc chicago]
+"""
+
+import os
+import sys
+import json
+import argparse
+import resource
+import tracemalloc
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import permit_scraper as engine  # noqa: E402
+from benchmarks.synthetic import synthetic_rows  # noqa: E402
+
+
+def _proc_status_mb(key):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(key):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def current_rss_mb():
+    """Resident set size right now (Linux), falling back to the peak elsewhere"""
+    rss = _proc_status_mb("VmRSS:")
+    return rss if rss is not None else peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Peak resident set size since start, or since the last reset_peak_rss()"""
+    hwm = _proc_status_mb("VmHWM:")
+    if hwm is not None:
+        return hwm
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def reset_peak_rss():
+    """Reset the kernel's high-water mark so the next peak covers only what follows"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def synthetic_page(city_key, rows, seed=0):
+    """A decoded API page for a city: list of JSON rows using its source field names"""
+    return synthetic_rows(engine.CITY_REGISTRY[city_key], rows, seed=seed)
+
+
+def profile_city(city_key, rows, queue):
+    page = synthetic_page(city_key, rows)
+    baseline = current_rss_mb()
+    reset_peak_rss()
+
+    tracemalloc.start()
+    permits = engine.parse_city_payload(city_key, page)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    queue.put({
+        "city": city_key,
+        "rows": rows,
+        "permits": len(permits),
+        "payload_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "python_alloc_peak_mb": round(traced_peak / (1024 * 1024), 1),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--cities", nargs="*", default=[k for k in engine.CITY_REGISTRY if engine.CITY_REGISTRY[k].has_api])
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for city_key in args.cities:
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=profile_city, args=(city_key, args.rows, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'city':<10}{'rows':>9}{'permits':>9}{'payload MB':>12}{'peak MB':>10}{'py alloc MB':>13}")
+    for r in results:
+        print(f"{r['city']:<10}{r['rows']:>9}{r['permits']:>9}{r['payload_rss_mb']:>12}"
+              f"{r['peak_rss_mb']:>10}{r['python_alloc_peak_mb']:>13}")
+
+
+if __name__ == "__main__":
+    main()
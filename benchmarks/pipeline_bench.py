@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+End-to-end scraper benchmark against the local Socrata stub.
+
+Starts benchmarks/socrata_stub.py in-process, writes a city config pointing
+every API at it and runs the real pipeline per city - process_city (fetch,
+decode, filter, normalize), the city CSV, the master dataset upsert and the
+database ingest (scraper.ingest.save_permits into a scratch SQLite database,
+then the same permits again as the unchanged re-scrape) - in a fresh process
+with its own output directory. Reports rows/sec, peak RSS and per-stage
+timings, and saves everything as JSON under benchmarks/results/. --no-db
+skips the database stages (compare only against a baseline run the same way).
+
+Pass --baseline with an earlier results file to flag throughput regressions
+(exit status 1 when any city is slower than the tolerance allows).
+
+Usage:
+    python benchmarks/pipeline_bench.py [--rows 20000] [--latency-ms 20] [--error-rate 0]
+                                        [--cities nyc chicago] [--no-db] [--baseline results/old.json]
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.ingest_memory import peak_rss_mb, reset_peak_rss  # noqa: E402
+from benchmarks.socrata_stub import SocrataStub  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def setup_scratch_db(work_dir):
+    """Point Django at an empty SQLite database in work_dir and migrate it (not timed)"""
+    os.environ["DATABASE_SQLITE_PATH"] = os.path.join(work_dir, "bench.sqlite3")
+    for name in ("DATABASE_REPLICA_SQLITE_PATH", "DATABASE_REPLICA_HOST"):
+        os.environ.pop(name, None)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "permit_api.settings")
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+
+def run_city(city_key, work_dir, queue, db=True):
+    """Child process: one city through the full pipeline (engine reads PERMIT_CITY_CONFIG on import)"""
+    import permit_scraper as engine
+
+    if db:
+        setup_scratch_db(work_dir)
+        from scraper.ingest import save_permits
+    for name in (None, "scraper"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    os.chdir(work_dir)
+    engine.ensure_directories()
+    reset_peak_rss()
+
+    timer = engine.RunTimer()
+    started = time.monotonic()
+    permits = engine.process_city(city_key, timer=timer)
+    engine.save_city_csv(city_key, permits, timer=timer)
+    engine.update_master_dataset(permits, timer=timer)
+    db_counts = {}
+    if db:
+        # First scrape into the empty database, then the same permits again: the unchanged path
+        for stage in ("db_ingest", "db_reingest"):
+            with timer.span(city_key, stage) as span:
+                counts, errors = save_permits(permits)
+                span["rows"] = len(permits)
+            db_counts[stage] = {**counts, "errors": len(errors)}
+    seconds = time.monotonic() - started
+
+    stages = timer.stage_totals()
+    rows_fetched = stages.get("decode", {}).get("rows", 0)
+    queue.put({
+        "city": city_key,
+        "rows_fetched": rows_fetched,
+        "permits": len(permits),
+        "fell_back_to_mock": any("Demo Data" in p.get("data_source", "") for p in permits),
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows_fetched / seconds, 1) if seconds else 0.0,
+        "permits_per_sec": round(len(permits) / seconds, 1) if seconds else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "db": db_counts,
+        "stages": {
+            stage: {k: round(v, 4) if k == "seconds" else v for k, v in totals.items()}
+            for stage, totals in stages.items()
+        },
+    })
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(RESULTS_DIR), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """[(city, old rows/sec, new rows/sec, change)] for cities slower than the tolerance"""
+    previous = {r["city"]: r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = previous.get(r["city"])
+        if not old or not old["rows_per_sec"]:
+            continue
+        change = (r["rows_per_sec"] - old["rows_per_sec"]) / old["rows_per_sec"]
+        if change < -tolerance:
+            regressions.append((r["city"], old["rows_per_sec"], r["rows_per_sec"], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="rows per city dataset (and per-city max_rows)")
+    parser.add_argument("--cities", nargs="*")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--no-db", action="store_true", help="skip the save_permits database stages")
+    parser.add_argument("--out", help="results file (default: benchmarks/results/pipeline_<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare rows/sec against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed rows/sec drop vs baseline")
+    args = parser.parse_args()
+
+    stub = SocrataStub(rows=args.rows, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                       error_rate=args.error_rate, cities=args.cities).start()
+    results = []
+    with tempfile.TemporaryDirectory(prefix="permit-bench-") as tmp:
+        os.environ["PERMIT_CITY_CONFIG"] = stub.write_stub_config(
+            os.path.join(tmp, "city_adapters.json"), max_rows=args.rows
+        )
+        # spawn, so each child imports the engine fresh with the stub config
+        context = multiprocessing.get_context("spawn")
+        for city_key in stub.endpoints:
+            work_dir = os.path.join(tmp, city_key)
+            os.makedirs(work_dir)
+            queue = context.Queue()
+            process = context.Process(target=run_city, args=(city_key, work_dir, queue, not args.no_db))
+            process.start()
+            results.append(queue.get())
+            process.join()
+    stub.stop()
+
+    report = {
+        "benchmark": "pipeline",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "params": {
+            "rows": args.rows, "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms, "error_rate": args.error_rate, "db": not args.no_db,
+        },
+        "stub": {"requests": stub.requests, "injected_errors": stub.errors},
+        "results": results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'city':<10}{'rows':>9}{'permits':>9}{'seconds':>9}{'rows/s':>10}{'peak MB':>9}  stages (s)")
+    for r in results:
+        stages = " ".join(f"{stage}={t['seconds']:.2f}" for stage, t in r["stages"].items())
+        flag = "  [mock fallback]" if r["fell_back_to_mock"] else ""
+        flag += "".join(f"  [{stage}: {c['errors']} errors]" for stage, c in r["db"].items() if c["errors"])
+        print(f"{r['city']:<10}{r['rows_fetched']:>9}{r['permits']:>9}{r['seconds']:>9}"
+              f"{r['rows_per_sec']:>10}{r['peak_rss_mb']:>9}  {stages}{flag}")
+    print(f"Stub: {stub.requests} requests, {stub.errors} injected errors. Results: {out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for city, old, new, change in regressions:
+            print(f"REGRESSION {city}: {old} -> {new} rows/s ({change:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No throughput regressions vs {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the city Socrata endpoints, for offline benchmarks.
+
+Serves synthetic datasets at the same /resource/<dataset>.json paths the
+adapter config points at, and understands the SoQL parameters the scraper
+sends: $limit, $offset, $order, $select and $where (comparisons joined by
+AND). Latency and errors can be injected to see how the pipeline behaves
+against a slow or flaky portal.
+
+Usage:
+    python benchmarks/socrata_stub.py [--port 8765] [--rows 50000] [--latency-ms 50] [--error-rate 0.05]
+
+Point the scraper at it with a config written by write_stub_config() and
+PERMIT_CITY_CONFIG (benchmarks/pipeline_bench.py does this for you).
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import permit_scraper as engine  # noqa: E402
+from benchmarks.synthetic import synthetic_rows  # noqa: E402
+
+_CONDITION = re.compile(r"^\s*(\w+)\s*(>=|<=|!=|=|>|<)\s*('(?:[^']|'')*'|-?\d+(?:\.\d+)?)\s*$")
+_OPERATORS = {
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+}
+
+
+class SoQLError(ValueError):
+    pass
+
+
+def dataset_path(endpoint):
+    """/resource/<dataset>.json part of an endpoint URL"""
+    return urlsplit(endpoint).path
+
+
+def parse_where(clause):
+    """Predicate for a $where made of simple comparisons joined by AND"""
+    conditions = []
+    for part in re.split(r"\s+AND\s+", clause.strip(), flags=re.IGNORECASE):
+        match = _CONDITION.match(part)
+        if not match:
+            raise SoQLError(f"Unsupported $where condition: {part}")
+        field, op, literal = match.groups()
+        if literal.startswith("'"):
+            value, numeric = literal[1:-1].replace("''", "'"), False
+        else:
+            value, numeric = float(literal), True
+        conditions.append((field, _OPERATORS[op], value, numeric))
+
+    def predicate(row):
+        for field, compare, value, numeric in conditions:
+            raw = row.get(field)
+            if raw is None:
+                return False
+            if numeric:
+                try:
+                    raw = float(raw)
+                except (TypeError, ValueError):
+                    return False
+            # ISO timestamps compare correctly as strings
+            if not compare(raw, value):
+                return False
+        return True
+    return predicate
+
+
+def apply_query(rows, params):
+    """Rows for a SoQL query string (already parsed into a dict of lists)"""
+    get = lambda name, default=None: params.get(name, [default])[0]  # noqa: E731
+
+    where = get("$where")
+    if where:
+        rows = list(filter(parse_where(where), rows))
+
+    order = get("$order")
+    if order:
+        parts = order.split()
+        field = parts[0]
+        descending = len(parts) > 1 and parts[1].upper() == "DESC"
+        rows = sorted(rows, key=lambda r: (r.get(field) is not None, r.get(field) or ""), reverse=descending)
+
+    offset = int(get("$offset", 0))
+    limit = int(get("$limit", 1000))
+    rows = rows[offset:offset + limit]
+
+    select = get("$select")
+    if select:
+        fields = [f.strip() for f in select.split(",") if f.strip()]
+        rows = [{f: r[f] for f in fields if f in r} for r in rows]
+    return rows
+
+
+class SocrataStub:
+    """Threaded HTTP server holding one synthetic dataset per configured city"""
+
+    def __init__(self, rows=50000, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 host="127.0.0.1", port=0, seed=0, cities=None):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        # dataset path -> rows, pre-sorted newest first like the scraper asks
+        self.datasets = {}
+        self.endpoints = {}
+        for key in cities or list(engine.CITY_REGISTRY):
+            adapter = engine.CITY_REGISTRY[key]
+            if not adapter.has_api:
+                continue
+            data = synthetic_rows(adapter, rows, seed=seed)
+            data.sort(key=lambda r: r[adapter.date_field], reverse=True)
+            self.datasets[dataset_path(adapter.endpoint)] = data
+            self.endpoints[key] = adapter.endpoint
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                with stub._lock:
+                    stub.requests += 1
+                    delay = stub.latency + stub._rng.uniform(0, stub.jitter)
+                    fail = stub._rng.random() < stub.error_rate
+                    if fail:
+                        stub.errors += 1
+                if delay:
+                    time.sleep(delay)
+                if fail:
+                    return self._send(503, {"error": True, "message": "Injected failure"})
+
+                data = stub.datasets.get(url.path)
+                if data is None:
+                    return self._send(404, {"error": True, "message": f"Unknown dataset {url.path}"})
+                try:
+                    rows = apply_query(data, parse_qs(url.query))
+                except (SoQLError, ValueError) as e:
+                    return self._send(400, {"error": True, "message": str(e)})
+                self._send(200, rows)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def write_stub_config(self, path, max_rows=None, rate_limit=0):
+        """Copy of the adapter config with every API endpoint pointed at this server"""
+        with open(engine.Config.CITY_CONFIG, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        for key, city in config.get("cities", {}).items():
+            if key in self.endpoints:
+                city["endpoint"] = self.url + dataset_path(self.endpoints[key])
+                if max_rows is not None:
+                    city["max_rows"] = max_rows
+                city["rate_limit"] = rate_limit
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2)
+        return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rows", type=int, default=50000, help="rows per city dataset")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--write-config", help="also write a city config pointing at this server")
+    args = parser.parse_args()
+
+    stub = SocrataStub(rows=args.rows, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                       error_rate=args.error_rate, host=args.host, port=args.port)
+    if args.write_config:
+        stub.write_stub_config(args.write_config)
+        print(f"Wrote {args.write_config}; run with PERMIT_CITY_CONFIG={args.write_config}")
+    print(f"Socrata stub serving {', '.join(stub.endpoints)} at {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
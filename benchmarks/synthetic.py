@@ -0,0 +1,37 @@
+"""
+Synthetic Socrata rows for a city adapter, shaped like the real payloads:
+the adapter's own id/cost/date/area/address fields, the common descriptive
+columns, Chicago-style contacts, and a pile of columns the scraper never reads.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+
+def synthetic_rows(adapter, rows, seed=0, days=120):
+    """List of JSON rows for an adapter, issue dates spread over the last `days` days"""
+    rng = random.Random(seed)
+    today = datetime.now()
+    page = []
+    for i in range(rows):
+        row = {
+            adapter.id_field: f"{adapter.key.upper()}{i:08d}",
+            adapter.cost_field: str(int(rng.lognormvariate(12.5, 1.8))),
+            adapter.date_field: (today - timedelta(days=rng.randint(0, days))).strftime("%Y-%m-%dT00:00:00.000"),
+            adapter.area_field: f"Area {rng.randint(1, 50)}",
+            "work_description": "Interior renovation of existing commercial space " * rng.randint(1, 3),
+            "work_type": rng.choice(["NEW", "ALT", "DEM", "REN"]),
+            "zip_code": str(rng.randint(10000, 99999)),
+        }
+        for field in adapter.address_fields:
+            row[field] = rng.choice(["MAIN", "OAK", "N", "ST", "123"])
+        if "contact_1_type" in adapter.hook_fields:
+            row["contact_1_type"] = "CONTRACTOR-GENERAL CONTRACTOR"
+            row["contact_1_name"] = f"Contractor {rng.randint(1, 5000)}"
+        else:
+            row["contractors_business_name"] = f"Contractor {rng.randint(1, 5000)}"
+        # Real payloads carry many columns the scraper never reads
+        for extra in range(30):
+            row[f"unused_field_{extra}"] = "x" * 12
+        page.append(row)
+    return page
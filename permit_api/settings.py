@@ -49,9 +49,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'scraper.middleware.MetricsMiddleware',
+    'scraper.middleware.QueryBudgetMiddleware',
+    'scraper.middleware.ReadReplicaMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'scraper.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -100,6 +103,37 @@ DATABASES = {
     }
 }
 
+# Local stand-in for the MySQL primary
+if os.getenv('DATABASE_SQLITE_PATH'):
+    DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.getenv('DATABASE_SQLITE_PATH')}
+
+# Read replica for list, export, dashboard and admin change list reads (see scraper/replicas.py)
+if os.getenv('DATABASE_REPLICA_SQLITE_PATH'):
+    # Copy of the SQLite stand-in, refreshed with `manage.py sync_replica`
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DATABASE_REPLICA_SQLITE_PATH'),
+        'TEST': {'MIRROR': 'default'},
+    }
+elif os.getenv('DATABASE_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DATABASE_REPLICA_HOST'),
+        'PORT': os.getenv('DATABASE_REPLICA_PORT', DATABASES['default'].get('PORT', '')),
+        'USER': os.getenv('DATABASE_REPLICA_USER', DATABASES['default'].get('USER', '')),
+        'PASSWORD': os.getenv('DATABASE_REPLICA_PASSWORD', DATABASES['default'].get('PASSWORD', '')),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_READ_ALIAS = 'replica' if 'replica' in DATABASES else 'default'
+DATABASE_ROUTERS = ['scraper.replicas.ReadReplicaRouter']
+REPLICA_READ_VIEWS = [
+    'scraper:permit-list', 'scraper:export-permits-csv', 'scraper:dashboard-stats', 'admin:*_changelist',
+]
+REPLICA_PIN_COOKIE = 'db_pin'
+REPLICA_PIN_SECONDS = 15  # After a write the client reads from the primary this long
+REPLICA_WATERMARK_CHECK_SECONDS = 2  # Per process
+REPLICA_MAX_VERSION_LAG = 0  # Watermark bumps (ingest calls) the replica may be behind
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -143,11 +177,81 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # File upload settings - Support large files up to 1.5GB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024 * 100  # 100MB in memory
-DATA_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024 * 1024 * 2  # 2GB
+# Uploaded files are spooled to disk; only form fields count against the body limit
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024 * 10  # 10MB in memory
+DATA_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024 * 10  # 10MB of non-file form data
 FILE_UPLOAD_TEMP_DIR = os.path.join(BASE_DIR, 'temp')
 DATA_UPLOAD_MAX_NUMBER_FIELDS = None  # No limit on fields
 
+# Chunked, resumable ZIP uploads (see scraper/uploads.py)
+UPLOAD_MAX_SIZE = 1610612736  # 1.5GB
+UPLOAD_CHUNK_SIZE = 1024 * 1024 * 8  # 8MB per chunk
+UPLOAD_SESSION_DIR = os.path.join(MEDIA_ROOT, 'uploads', 'partial')
+UPLOAD_SESSION_TTL_HOURS = 24  # Abandoned partial uploads are purged after this
+
+# Hash uploads as they stream in so repeat bundles hit the processed ZIP cache
+FILE_UPLOAD_HANDLERS = [
+    'scraper.zip_cache.ContentHashUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Processed ZIP dedup cache (see scraper/zip_cache.py)
+ZIP_CACHE_DIR = os.path.join(MEDIA_ROOT, 'zip_cache')
+ZIP_CACHE_MAX_BYTES = 1024 * 1024 * 1024 * 10  # 10GB
+ZIP_CACHE_MAX_ENTRIES = 200
+
+# Permit CSV exports (see scraper/exports.py)
+EXPORT_CHUNK_SIZE = 5000  # Rows per keyset query
+EXPORT_BACKGROUND_ROWS = 200000  # Larger selections are written by a background ExportJob
+EXPORT_DIR = os.path.join(MEDIA_ROOT, 'exports')
+EXPORT_MAX_ACTIVE_JOBS = 3  # Queued or running at once; the API answers 429 beyond this
+EXPORT_JOB_STALE_SECONDS = 300  # A job silent this long was lost with its worker (e.g. recycled by --max-requests)
+
+# Async endpoints under ASGI (see scraper/progress.py and the async views)
+RUN_EVENTS_POLL_SECONDS = 2  # One query per worker per interval covers every open progress stream
+RUN_EVENTS_KEEPALIVE_SECONDS = 15  # Comment line sent when a run has not changed
+RUN_EVENTS_MAX_SECONDS = 3600  # Streams close after this even if the run never finishes
+DASHBOARD_CACHE_SECONDS = 30  # Per worker with the locmem cache; dropped when a run completes
+
+# Contractor entity resolution (see scraper/resolution.py)
+CONTRACTOR_MATCH_THRESHOLD = 0.72  # Trigram similarity for two spellings to be one firm
+CONTRACTOR_MAX_BLOCK_SIZE = 200  # Blocking keys shared by more entities are ignored
+
+# Near-duplicate permit detection (see scraper/duplicates.py)
+DUPLICATE_MATCH_THRESHOLD = 0.8  # Shingle Jaccard similarity of address + description
+DUPLICATE_COST_TOLERANCE = 0.1  # Estimated costs may differ by this fraction of the larger one
+DUPLICATE_MAX_BUCKET_SIZE = 500  # LSH buckets holding more permits (boilerplate filings) are ignored
+
+# Offline geocoding (see scraper/geocoding.py); add e.g. the Census ZCTA gazetteer for full ZIP coverage
+GEOCODER_GAZETTEER_FILES = [os.path.join(BASE_DIR, 'scraper', 'data', 'gazetteer.csv')] + [
+    path for path in os.getenv('GEOCODER_GAZETTEER_FILES', '').split(',') if path
+]
+
+# Prometheus metrics at /metrics (see scraper/metrics.py)
+# Set a shared directory when running several gunicorn workers so /metrics sums all of them
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')
+METRICS_FLUSH_SECONDS = 5
+METRICS_ALLOWED_IPS = [ip for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip]
+
+# Permit change list at scale (see scraper/admin_perf.py)
+ADMIN_PERFORMANCE_MODE = os.getenv('ADMIN_PERFORMANCE_MODE', 'True') == 'True'
+ADMIN_ESTIMATED_COUNT_MIN = 100000  # Unfiltered lists use table statistics above this many rows
+ADMIN_FILTERED_COUNT_LIMIT = 100000  # Filtered lists count at most this many matches
+ADMIN_FILTER_CACHE_SECONDS = 3600  # Refreshed after each run; per worker with the locmem cache
+ADMIN_FILTER_MAX_CHOICES = 500
+
+# Per-request query budgets (see scraper/middleware.py); offenders are logged
+QUERY_BUDGET = {
+    'max_queries': 20,
+    'max_seconds': 0.5,
+    'n_plus_one_threshold': 5,  # same query shape this many times in one request
+    'views': {
+        # Per-view overrides, keyed by URL name
+        'scraper:start-scraper': {'max_queries': None, 'max_seconds': None},
+    },
+}
+
 # Session settings for large uploads
 SESSION_COOKIE_AGE = 3600 * 6  # 6 hours for long upload sessions
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
@@ -19,6 +19,7 @@ from django.urls import path, include
 from django.http import JsonResponse
 from django.conf import settings
 from django.conf.urls.static import static
+from scraper.views import metrics_view
 
 def api_root(request):
     """API root endpoint with available endpoints"""
@@ -40,6 +41,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', api_root, name='api-root'),
     path('api/scraper/', include('scraper.urls')),
+    path('metrics', metrics_view, name='metrics'),
     path('', api_root, name='home'),  # Root URL shows API info
 ]
 
@@ -0,0 +1,57 @@
+"""
+Permit scraper engine.
+
+    config     paths, logging, run state
+    timing     RunTimer (per-stage wall time)
+    cities     city adapters and the registry (CITIES, CITY_REGISTRY)
+    ingest     payload -> typed frame -> permits                      [pandas]
+    anomaly    cost anomaly flagging from rolling statistics          [numpy]
+    scrape     fetching city APIs, process_city, iter_city_results    [pandas, requests]
+    master     city CSVs and the partitioned master dataset           [pandas]
+    synthetic  mock and bulk synthetic permits                        [numpy, pandas]
+    cli        the command-line run
+
+Importing the package (or config, timing, cities) only touches the standard
+library; the modules marked above pull in their heavy dependencies when they
+are first imported. Names are also available from the package itself and are
+resolved on first access, e.g. permit_scraper.process_city.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "config": ["Config", "setup_logging", "ensure_directories", "load_state", "save_state"],
+    "timing": ["RunTimer"],
+    "cities": [
+        "CITIES", "CITY_REGISTRY", "CityAdapter", "CityRegistry", "NORMALIZATION_HOOKS",
+        "COMMON_FIELDS", "CONTACT_FIELDS", "get_contact_by_type",
+    ],
+    "ingest": ["load_city_frame", "parse_city_payload"],
+    "anomaly": ["CostStats", "cost_stats", "flag_cost_anomalies"],
+    "scrape": ["fetch_city_rows", "scrape_real_city_data", "process_city", "iter_city_results"],
+    "master": [
+        "save_city_csv", "update_master_dataset", "update_master_csv",
+        "load_master_permits", "export_master_csv",
+    ],
+    "synthetic": [
+        "CONTRACTORS", "ADDRESSES", "DESCRIPTIONS", "WORK_TYPES", "generate_permit",
+        "generate_permit_frame", "iter_permit_frames",
+    ],
+    "cli": ["main", "run"],
+}
+_MODULE_FOR = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_MODULE_FOR)
+
+
+def __getattr__(name):
+    module = _MODULE_FOR.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
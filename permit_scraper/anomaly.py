@@ -0,0 +1,214 @@
+"""
+Cost anomaly flagging: robust per-city, per-work-type statistics of log cost.
+
+Feeds carry obviously wrong costs (an extra zero or three on Chicago's
+reported_cost), which would dominate every total. Each batch of permits is
+scored against the median and MAD (median absolute deviation) of log10 cost
+for its city and work type:
+
+    score = 0.6745 * (log10(cost) - median) / MAD
+
+and flagged when |score| > ANOMALY_THRESHOLD (the usual 3.5 cut-off for
+this modified z-score) - unless the history already holds at least
+RARE_SHARE of the key's permits that far out on the same side. A
+heavy-tailed city keeps producing costs far above its median; once its
+history has seen enough of them they are its high end, not errors.
+Permits get "cost_anomaly" and "cost_anomaly_score".
+
+The statistics are never recomputed from history. Each (city, work type) -
+and each city as a whole, used while a work type has under MIN_HISTORY
+permits - keeps a histogram of log10 cost in BIN_WIDTH bins; a batch is
+added to it in one np.add.at, older batches fade with a half-life of
+HISTORY_HALF_LIFE permits, and median and MAD are read off the histogram's
+cumulative counts. Flagged permits are added at FLAGGED_WEIGHT, so a
+one-off outlier barely moves the statistics but a recurring high end
+builds up the history that stops it being flagged. The histograms persist
+in Config.COST_STATS_FILE between runs.
+"""
+
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from .config import Config
+
+ANOMALY_THRESHOLD = 3.5
+MIN_HISTORY = 30  # Permits a histogram needs before it is trusted
+HISTORY_HALF_LIFE = 5000  # Permits after which a key's older history counts half
+FLAGGED_WEIGHT = 0.2  # A flagged cost counts this much in the history
+RARE_SHARE = 0.002  # Far-out costs are only flagged while the history has fewer than this share that far out
+
+# log10 cost from $1 to $1T in 0.02 steps (about 5% apart)
+LOG_MIN, LOG_MAX, BIN_WIDTH = 0.0, 12.0, 0.02
+BINS = int(round((LOG_MAX - LOG_MIN) / BIN_WIDTH))
+_CENTERS = LOG_MIN + (np.arange(BINS) + 0.5) * BIN_WIDTH
+# A histogram can put every permit in one bin; never divide by less than a bin
+MIN_MAD = BIN_WIDTH
+
+ALL_WORK_TYPES = "*"
+
+
+def _bins(log_costs):
+    return np.clip(((log_costs - LOG_MIN) / BIN_WIDTH).astype(int), 0, BINS - 1)
+
+
+def _median_mad(histogram):
+    """(median, MAD) of log10 cost read off a histogram, or None with too little history"""
+    cumulative = np.cumsum(histogram)
+    if cumulative[-1] < MIN_HISTORY:
+        return None
+    median = _CENTERS[np.searchsorted(cumulative, cumulative[-1] / 2)]
+    deviations = np.abs(_CENTERS - median)
+    order = np.argsort(deviations, kind="stable")
+    spread = np.cumsum(histogram[order])
+    mad = deviations[order][np.searchsorted(spread, spread[-1] / 2)]
+    return median, max(mad, MIN_MAD)
+
+
+def _tail_share(history, log_costs, median):
+    """Share of the history at least as far out as each log cost, on its side of the median"""
+    total = history.sum()
+    if total < MIN_HISTORY:
+        return np.zeros(len(log_costs))
+    cumulative = np.cumsum(history)
+    bins = _bins(log_costs)
+    at_or_above = total - cumulative[bins] + history[bins]
+    at_or_below = cumulative[bins]
+    return np.where(log_costs >= median, at_or_above, at_or_below) / total
+
+
+class CostStats:
+    """Decayed log-cost histograms per (city, work type) and per city"""
+
+    def __init__(self, path=None):
+        self.path = path or Config.COST_STATS_FILE
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(city, work_type):
+        return f"{city}|{work_type or ALL_WORK_TYPES}"
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            for key, bins in stored.get("histograms", {}).items():
+                histogram = np.zeros(BINS)
+                index, counts = zip(*bins) if bins else ((), ())
+                histogram[list(index)] = counts
+                self.histograms[key] = histogram
+        except Exception as e:
+            logging.error(f"Could not load cost statistics from {self.path}: {e}")
+        return self
+
+    def save(self):
+        # Sparse: a city's histograms cover a few dozen bins each
+        with self._lock:
+            stored = {
+                "histograms": {
+                    key: [[int(i), round(float(histogram[i]), 4)] for i in np.flatnonzero(histogram > 1e-4)]
+                    for key, histogram in self.histograms.items()
+                }
+            }
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                # Swap a complete file in: a crash mid-write must not cost the whole history
+                tmp_path = f"{self.path}.tmp{os.getpid()}"
+                try:
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        json.dump(stored, f)
+                    os.replace(tmp_path, self.path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+            except Exception as e:
+                logging.error(f"Failed to save cost statistics: {e}")
+
+    def histogram(self, key):
+        """Copy of a key's histogram (zeros if it has none)"""
+        with self._lock:
+            histogram = self.histograms.get(key)
+            return np.zeros(BINS) if histogram is None else histogram.copy()
+
+    def add(self, key, log_costs, weights):
+        """Fold a batch into a key's histogram, fading what was there by the batch's weight"""
+        with self._lock:
+            histogram = self.histograms.setdefault(key, np.zeros(BINS))
+            histogram *= 0.5 ** (weights.sum() / HISTORY_HALF_LIFE)
+            np.add.at(histogram, _bins(log_costs), weights)
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def cost_stats():
+    """The process-wide statistics, loaded from disk on first use"""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = CostStats().load()
+        return _stats
+
+
+def flag_cost_anomalies(city, permits, stats=None, save=True):
+    """Set cost_anomaly / cost_anomaly_score on a city's permit dicts and learn from the rest
+
+    Scores against the statistics before this batch, folded together with the
+    batch itself so a first run still has a baseline; how rare a far-out cost
+    is comes from the history alone, so a batch cannot vouch for its own
+    outliers. Returns the number flagged.
+    """
+    if not permits:
+        return 0
+    stats = stats or cost_stats()
+    costs = np.array([float(p.get("estimated_cost") or 0) for p in permits])
+    log_costs = np.log10(np.maximum(costs, 1.0))
+    work_types = np.array([p.get("work_type") or ALL_WORK_TYPES for p in permits], dtype=object)
+    scores = np.full(len(permits), np.nan)
+    shares = np.zeros(len(permits))
+
+    city_key = stats.key(city, None)
+    city_history = stats.histogram(city_key)
+    histogram = city_history.copy()
+    np.add.at(histogram, _bins(log_costs), 1.0)
+    city_baseline = _median_mad(histogram)
+
+    groups = {}
+    for work_type in np.unique(work_types):
+        rows = np.flatnonzero(work_types == work_type)
+        key = stats.key(city, work_type)
+        groups[key] = rows
+        history = stats.histogram(key)
+        histogram = history.copy()
+        np.add.at(histogram, _bins(log_costs[rows]), 1.0)
+        baseline = _median_mad(histogram)
+        if baseline is None:
+            baseline, history = city_baseline, city_history
+        if baseline:
+            median, mad = baseline
+            scores[rows] = 0.6745 * (log_costs[rows] - median) / mad
+            shares[rows] = _tail_share(history, log_costs[rows], median)
+
+    flagged = (np.abs(np.nan_to_num(scores)) > ANOMALY_THRESHOLD) & (shares < RARE_SHARE)
+    for permit, score, flag in zip(permits, scores.tolist(), flagged.tolist()):
+        permit["cost_anomaly"] = flag
+        permit["cost_anomaly_score"] = None if np.isnan(score) else round(score, 2)
+
+    weights = np.where(flagged, FLAGGED_WEIGHT, 1.0)
+    stats.add(city_key, log_costs, weights)
+    for key, rows in groups.items():
+        stats.add(key, log_costs[rows], weights[rows])
+    if save:
+        stats.save()
+
+    count = int(flagged.sum())
+    if count:
+        logging.warning(f"{city}: flagged {count} of {len(permits)} permits with anomalous costs")
+    return count
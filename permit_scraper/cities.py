@@ -0,0 +1,207 @@
+"""
+City adapters and the registry built from city_adapters.json.
+
+Only the standard library is imported here, so the web app can list cities
+(CITIES, CITY_REGISTRY) without loading pandas or requests.
+"""
+
+import json
+import time
+import threading
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+
+from .config import Config
+
+# ---------- City adapters ----------
+# Everything we know about a city lives in one adapter declared in
+# city_adapters.json: endpoint, source field map, whether the API can filter
+# server-side, page size, rate limit and which normalization hooks to run.
+# Onboarding a municipality means adding a config entry, not code.
+
+# Source fields read from every payload, besides the adapter's own field map
+COMMON_FIELDS = [
+    "zip_code", "zipcode", "work_description", "description", "job_description",
+    "contractors_business_name", "contractor_name", "license", "contractor_license",
+    "applicant_first_name", "applicant_last_name", "license_status", "contractor_address",
+    "work_type", "permit_type", "block", "lot", "bin",
+]
+CONTACT_FIELDS = [f"contact_{i}_{part}" for i in range(1, 6) for part in ("type", "name")]
+
+def _default_parties(row, permit):
+    """Contractor from the usual business/contractor name columns"""
+    permit["contractor_name"] = _first_text(row, ['contractors_business_name', 'contractor_name'])
+
+def _chicago_contacts(row, permit):
+    """Chicago lists parties as contact_1..5 type/name pairs"""
+    contractor_name = "N/A"
+    # Look for contractor in contact_1_type through contact_5_type fields
+    for i in range(1, 6):
+        contact_type = _text(row.get(f'contact_{i}_type'), '')
+        if contact_type and 'CONTRACTOR' in contact_type.upper():
+            contractor_name = _text(row.get(f'contact_{i}_name'))
+            # Prefer general contractor over specific trades
+            if 'GENERAL CONTRACTOR' in contact_type.upper():
+                break
+    permit["contractor_name"] = contractor_name
+    permit["owner_name"] = get_contact_by_type(row, "OWNER")
+    permit["architect_name"] = get_contact_by_type(row, "ARCHITECT")
+
+# Normalization hooks adapters can refer to by name: (function, source fields it reads)
+NORMALIZATION_HOOKS = {
+    "default_parties": (_default_parties, []),
+    "chicago_contacts": (_chicago_contacts, CONTACT_FIELDS),
+}
+
+class CityAdapter:
+    """One city's data source, built from its entry in the adapter config"""
+    
+    def __init__(self, key, config, defaults=None):
+        settings = dict(defaults or {})
+        settings.update(config)
+        fields = settings.get("fields", {})
+        
+        self.key = key
+        self.name = settings["name"]
+        self.areas = settings.get("areas", ["Citywide"])
+        self.endpoint = settings.get("endpoint")
+        self.id_field = fields.get("id")
+        self.cost_field = fields.get("cost")
+        self.date_field = fields.get("date")
+        self.area_field = fields.get("area")
+        self.address_fields = fields.get("address", [])
+        self.server_side_filters = bool(settings.get("server_side_filters", False))
+        self.page_size = int(settings.get("page_size", 500))
+        self.max_rows = int(settings.get("max_rows", self.page_size))
+        self.rate_limit = float(settings.get("rate_limit", 0) or 0)
+        self.min_cost = int(settings.get("min_cost", 1000000))
+        self.days_back = int(settings.get("days_back", 60))
+        self.data_source = settings.get("data_source", f"{self.name} Open Data (Real Data)")
+        
+        unknown = [h for h in settings.get("hooks", []) if h not in NORMALIZATION_HOOKS]
+        if unknown:
+            raise ValueError(f"Unknown normalization hooks for {key}: {', '.join(unknown)}")
+        self.hooks = [NORMALIZATION_HOOKS[h][0] for h in settings.get("hooks", [])]
+        self.hook_fields = [f for h in settings.get("hooks", []) for f in NORMALIZATION_HOOKS[h][1]]
+        
+        self._lock = threading.Lock()
+        self._last_request = 0.0
+    
+    @property
+    def has_api(self):
+        return bool(self.endpoint and self.cost_field)
+    
+    def source_fields(self):
+        """Every payload field this adapter reads"""
+        fields = [self.id_field, self.area_field, *self.address_fields, *COMMON_FIELDS, *self.hook_fields]
+        return [f for f in dict.fromkeys(fields) if f and f not in (self.cost_field, self.date_field)]
+    
+    def payload_fields(self):
+        """source_fields() plus cost and date: everything kept when a page is decoded"""
+        return [f for f in (self.cost_field, self.date_field) if f] + self.source_fields()
+    
+    def throttle(self):
+        """Block until the next request is allowed by the adapter's rate limit"""
+        if self.rate_limit <= 0:
+            return
+        with self._lock:
+            wait = self._last_request + 1.0 / self.rate_limit - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_request = time.monotonic()
+    
+    def query_params(self, min_cost, days_back, offset):
+        params = {
+            "$limit": min(self.page_size, self.max_rows - offset),
+            "$offset": offset,
+            "$order": f"{self.date_field} DESC",
+        }
+        if self.server_side_filters:
+            cutoff = (datetime.now() - timedelta(days=days_back)).strftime("%Y-%m-%dT00:00:00")
+            params["$where"] = f"{self.cost_field} > {int(min_cost)} AND {self.date_field} >= '{cutoff}'"
+        return params
+
+class CityRegistry(Mapping):
+    """City adapters, read from the config file on first use and built on demand"""
+    
+    def __init__(self, path=None):
+        self.path = path
+        self._configs = None
+        self._defaults = {}
+        self._adapters = {}
+        self._lock = threading.Lock()
+    
+    def _load(self):
+        if self._configs is None:
+            with self._lock:
+                if self._configs is None:
+                    with open(self.path or Config.CITY_CONFIG, "r", encoding="utf-8") as f:
+                        config = json.load(f)
+                    self._defaults = config.get("defaults", {})
+                    self._configs = config.get("cities", {})
+        return self._configs
+    
+    def __getitem__(self, key):
+        configs = self._load()
+        if key not in self._adapters:
+            self._adapters[key] = CityAdapter(key, configs[key], self._defaults)
+        return self._adapters[key]
+    
+    def __iter__(self):
+        return iter(self._load())
+    
+    def __len__(self):
+        return len(self._load())
+    
+    def reload(self, path=None):
+        """Drop loaded adapters, optionally switching to another config file"""
+        with self._lock:
+            if path:
+                self.path = path
+            self._configs = None
+            self._adapters = {}
+
+class _CityMetadata(Mapping):
+    """Read-only {"name", "areas"} view of the registry, the shape CITIES always had"""
+    
+    def __getitem__(self, key):
+        adapter = CITY_REGISTRY[key]
+        return {"name": adapter.name, "areas": adapter.areas}
+    
+    def __iter__(self):
+        return iter(CITY_REGISTRY)
+    
+    def __len__(self):
+        return len(CITY_REGISTRY)
+
+CITY_REGISTRY = CityRegistry()
+
+# Cities to scrape
+CITIES = _CityMetadata()
+
+def get_contact_by_type(row, contact_type):
+    """
+    Extract contact name by type from Chicago permit data.
+    Looks through contact_1_type through contact_5_type fields.
+    """
+    for i in range(1, 6):
+        type_field = f'contact_{i}_type'
+        name_field = f'contact_{i}_name'
+        if type_field in row and name_field in row:
+            type_value = _text(row.get(type_field), '').upper()
+            if contact_type.upper() in type_value:
+                return _text(row.get(name_field))
+    return "N/A"
+
+def _text(value, default="N/A"):
+    """String value of a payload field, treating missing/NaN as default"""
+    if value is None or (isinstance(value, float) and value != value):
+        return default
+    return str(value)
+
+def _first_text(row, fields, default="N/A"):
+    for field in fields:
+        value = row.get(field)
+        if value is not None and not (isinstance(value, float) and value != value):
+            return str(value)
+    return default
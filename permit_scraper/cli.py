@@ -0,0 +1,146 @@
+"""
+Command-line run: scrape every city, write outputs and print a summary.
+"""
+
+import os
+import sys
+import logging
+from datetime import datetime
+
+from .config import Config, ensure_directories, load_state, save_state, setup_logging
+from .cities import CITIES
+from .master import export_master_csv, save_city_csv, update_master_dataset
+from .scrape import iter_city_results
+from .timing import RunTimer
+
+def record_run_metrics(timer):
+    """Feed the run's stage timings to the web app's /metrics, when run with its settings
+
+    Only the Django app has a metrics registry; under METRICS_MULTIPROC_DIR
+    this process's snapshot is folded into the totals once it exits.
+    """
+    if not os.getenv("DJANGO_SETTINGS_MODULE"):
+        return
+    try:
+        from scraper import metrics
+        metrics.record_stage_timings(timer.as_list())
+        metrics.REGISTRY.flush(force=True)
+    except Exception as e:
+        logging.warning(f"Could not record run metrics: {e}")
+
+def main():
+    """Main execution function"""
+    logger = setup_logging()
+    ensure_directories()
+    
+    start_time = datetime.now()
+    
+    logger.info("=" * 60)
+    logger.info("ENTERPRISE PERMIT SCRAPER - PRODUCTION RUN")
+    logger.info("=" * 60)
+    logger.info(f"Started at: {start_time}")
+    
+    state = load_state()
+    timer = RunTimer()
+    all_permits = []
+    city_summaries = []
+    
+    try:
+        # Process every registered city, fetching concurrently
+        for city_key, permits, error in iter_city_results(timer=timer):
+            try:
+                if error:
+                    raise error
+                
+                if permits:
+                    # Save city CSV
+                    filepath = save_city_csv(city_key, permits, timer=timer)
+                    
+                    # Add to master list
+                    all_permits.extend(permits)
+                    
+                    # Update state
+                    state[city_key] = {
+                        "last_run": datetime.now().isoformat(),
+                        "permits_found": len(permits),
+                        "last_file": filepath,
+                        "last_error": None
+                    }
+                    
+                    total_value = sum(int(p["estimated_cost"]) for p in permits if not p.get("cost_anomaly"))
+                    city_summaries.append(f"SUCCESS {CITIES[city_key]['name']}: {len(permits)} permits (${total_value:,})")
+                    
+                else:
+                    city_summaries.append(f"WARNING {CITIES[city_key]['name']}: No permits found")
+                    
+            except Exception as e:
+                error_msg = f"Error processing {CITIES[city_key]['name']}: {str(e)}"
+                logger.error(error_msg)
+                city_summaries.append(f"ERROR {CITIES[city_key]['name']}: {str(e)}")
+                
+                # Update state with error
+                if city_key not in state:
+                    state[city_key] = {}
+                state[city_key]["last_error"] = error_msg
+        
+        # Update master dataset (only the partitions this run touched)
+        update_master_dataset(all_permits, timer=timer)
+        
+        # Save final state
+        save_state(state)
+        record_run_metrics(timer)
+        
+        # Generate final summary
+        end_time = datetime.now()
+        duration = end_time - start_time
+        total_permits = len(all_permits)
+        # Flagged costs (see anomaly.py) are left out of the headline value
+        total_value = sum(int(p["estimated_cost"]) for p in all_permits if not p.get("cost_anomaly"))
+        anomalies = sum(1 for p in all_permits if p.get("cost_anomaly"))
+        
+        summary = f"""
+PERMIT SCRAPER RUN COMPLETED
+============================
+Runtime: {duration}
+Total permits found: {total_permits}
+Combined project value: ${total_value:,} ({anomalies} cost anomalies excluded)
+
+City Results:
+{chr(10).join(city_summaries)}
+
+Stage Timings:
+{chr(10).join(f"- {stage}: {t['seconds']:.2f}s, {t['rows']:,} rows, {t['bytes']:,} bytes" for stage, t in timer.stage_totals().items())}
+
+Output Files:
+- Master dataset: {Config.MASTER_DIR}
+- Individual city files in: {Config.OUTPUT_DIR}
+- State file: {Config.STATE_FILE}
+- Log file: {Config.LOG_FILE}
+
+Next Steps:
+1. Review the CSV files for data quality
+2. Import into your CRM system
+3. Set up daily automation
+4. Configure API integrations for live data
+"""
+        
+        logger.info(summary)
+        print("\nSUCCESS! Check the output folder for your permit data.")
+        
+    except KeyboardInterrupt:
+        logger.info("Scraper interrupted by user")
+        
+    except Exception as e:
+        logger.error(f"Critical error in main execution: {str(e)}")
+        raise
+    
+    logger.info("Permit scraper execution completed")
+
+def run(argv=None):
+    """Entry point for `python MAIN_permit_scraper.py` and `python -m permit_scraper`"""
+    argv = sys.argv[1:] if argv is None else argv
+    if "--export-master" in argv:
+        ensure_directories()
+        print(f"Master CSV written to {export_master_csv()}")
+    else:
+        main()
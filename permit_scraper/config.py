@@ -0,0 +1,72 @@
+"""
+Paths and run settings, logging setup and run state. Standard library only.
+"""
+
+import os
+import json
+import logging
+from datetime import datetime
+
+# ---------- Configuration ----------
+class Config:
+    OUTPUT_DIR = "output"
+    STATE_DIR = "state" 
+    LOGS_DIR = "logs"
+    
+    STATE_FILE = os.path.join(STATE_DIR, "last_run.json")
+    # Rolling cost statistics for anomaly flagging (see anomaly.py)
+    COST_STATS_FILE = os.path.join(STATE_DIR, "cost_stats.json")
+    MASTER_CSV = os.path.join(OUTPUT_DIR, "master_permits.csv")
+    # Partitioned master dataset: master/city=<slug>/<YYYY-MM>.csv plus a per-city key index
+    MASTER_DIR = os.path.join(OUTPUT_DIR, "master")
+    LOG_FILE = os.path.join(LOGS_DIR, f"scraper_{datetime.now().strftime('%Y%m%d')}.log")
+    
+    # Declarative city adapter configs (override with PERMIT_CITY_CONFIG)
+    CITY_CONFIG = os.getenv(
+        "PERMIT_CITY_CONFIG",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "city_adapters.json")
+    )
+    # Cities fetched concurrently by iter_city_results()
+    MAX_FETCH_WORKERS = int(os.getenv("PERMIT_FETCH_WORKERS", "4"))
+
+def setup_logging():
+    """Setup logging with UTF-8 encoding"""
+    os.makedirs(Config.LOGS_DIR, exist_ok=True)
+    
+    file_handler = logging.FileHandler(Config.LOG_FILE, encoding='utf-8')
+    console_handler = logging.StreamHandler()
+    
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    console_handler.setFormatter(formatter)
+    
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.INFO)
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
+    
+    return logger
+
+def ensure_directories():
+    """Create required directories"""
+    for directory in [Config.OUTPUT_DIR, Config.MASTER_DIR, Config.STATE_DIR, Config.LOGS_DIR]:
+        os.makedirs(directory, exist_ok=True)
+
+def load_state():
+    """Load previous run state"""
+    if not os.path.exists(Config.STATE_FILE):
+        return {}
+    try:
+        with open(Config.STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def save_state(state):
+    """Save current run state"""
+    try:
+        with open(Config.STATE_FILE, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2, ensure_ascii=False)
+        logging.info("State saved successfully")
+    except Exception as e:
+        logging.error(f"Failed to save state: {e}")
@@ -0,0 +1,132 @@
+"""
+Decoded city payloads to permits: typed, filtered frames and normalization.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from .cities import CITY_REGISTRY, _first_text, _text
+from .timing import RunTimer
+
+def load_city_frame(city_key, data, min_cost=1000000, days_back=60):
+    """
+    Typed, filtered DataFrame for a decoded city payload (a list of JSON rows).
+    Cost and date are parsed first and filtered with a single mask; only the
+    surviving rows are materialized, and only for the columns we use, with
+    compact dtypes: nullable Float64 cost, datetime64 dates and categoricals
+    for city, area and work type. Rows with an unparseable date skip the date
+    filter (and are counted in a warning) instead of being dropped.
+    """
+    adapter = CITY_REGISTRY[city_key]
+    cost_field, date_field = adapter.cost_field, adapter.date_field
+
+    if not any(cost_field in row for row in data):
+        logging.error(f"Missing {cost_field} column in {adapter.name} data")
+        return None
+
+    cost = pd.to_numeric(pd.Series([row.get(cost_field) for row in data], dtype=object),
+                         errors="coerce").astype("Float64")
+    mask = (cost > min_cost).fillna(False)
+    issue_dates = None
+    if any(date_field in row for row in data):
+        issue_dates = pd.to_datetime(pd.Series([row.get(date_field) for row in data], dtype=object),
+                                     errors="coerce", format="mixed")
+        if issue_dates.dt.tz is not None:
+            issue_dates = issue_dates.dt.tz_localize(None)
+        cutoff = pd.Timestamp(datetime.now() - timedelta(days=days_back)).normalize()
+        # Rows whose date does not parse are kept undated rather than dropped by the cutoff
+        undated = issue_dates.isna()
+        if (undated & mask).any():
+            logging.warning(f"{int((undated & mask).sum())} {adapter.name} permits have no parseable "
+                            f"{date_field}; keeping them without a date filter")
+        mask &= (issue_dates >= cutoff) | undated
+
+    keep = mask.to_numpy().nonzero()[0]
+    rows = [data[i] for i in keep]
+
+    columns = {
+        cost_field: cost.take(keep).reset_index(drop=True),
+        date_field: (issue_dates.take(keep).reset_index(drop=True) if issue_dates is not None
+                     else pd.Series(pd.NaT, index=range(len(keep)), dtype="datetime64[ns]")),
+    }
+    present = set().union(*(row.keys() for row in rows)) if rows else set()
+    for field in adapter.source_fields():
+        if field in present:
+            columns[field] = pd.Series([row.get(field) for row in rows], dtype=object)
+
+    df = pd.DataFrame(columns)
+    df.index = keep  # Original payload positions, used for fallback permit ids
+    df["city"] = pd.Categorical([adapter.name] * len(df))
+    for field in (adapter.area_field, "work_type"):
+        if field in df.columns:
+            df[field] = df[field].astype("category")
+    return df
+
+def parse_city_payload(city_key, data, min_cost=1000000, days_back=60, timer=None):
+    """Convert a decoded city payload into permits in the format expected by the main scraper"""
+    adapter = CITY_REGISTRY[city_key]
+    timer = timer or RunTimer()
+    with timer.span(city_key, "filter") as span:
+        df = load_city_frame(city_key, data, min_cost=min_cost, days_back=days_back)
+        span["rows"] = 0 if df is None else len(df)
+    if df is None:
+        return []
+    logging.info(f"Found {len(df)} {adapter.name} permits over ${min_cost:,}")
+    
+    with timer.span(city_key, "normalize") as span:
+        permits = _normalize_rows(city_key, adapter, df)
+        span["rows"] = len(permits)
+    
+    if permits:
+        total_value = sum(int(p["estimated_cost"]) for p in permits)
+        logging.info(f"{adapter.name} real data: {len(permits)} permits, total value: ${total_value:,}")
+    
+    return permits
+
+def _normalize_rows(city_key, adapter, df):
+    """Build permit dicts from the filtered frame"""
+
+    scraped_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    today = datetime.now().strftime("%Y-%m-%d")
+    permits = []
+    for idx, row in zip(df.index, df.to_dict("records")):
+        
+        # Build address from available fields
+        address_parts = [_text(row.get(field), "") for field in adapter.address_fields]
+        full_address = ' '.join(part for part in address_parts if part).strip()
+        
+        issue_date = row.get(adapter.date_field)
+        applicant_name = f"{_text(row.get('applicant_first_name'), '')} {_text(row.get('applicant_last_name'), '')}".strip()
+        
+        permit = {
+            "city": adapter.name,
+            "permit_id": _text(row.get(adapter.id_field), f"{city_key.upper()}-{idx}"),
+            "issue_date": issue_date.strftime("%Y-%m-%d") if pd.notnull(issue_date) else today,
+            "full_address": full_address or "Address Not Available",
+            "borough_area": _text(row.get(adapter.area_field), 'Unknown'),
+            "zip_code": _first_text(row, ['zip_code', 'zipcode']),
+            "project_description": _first_text(row, ['work_description', 'description', 'job_description'], 'Construction project')[:500],
+            "estimated_cost": str(int(row[adapter.cost_field])),
+            "contractor_name": "N/A",
+            "contractor_license": _first_text(row, ['license', 'contractor_license']),
+            "applicant_name": applicant_name or "N/A",
+            "owner_name": "N/A",
+            "architect_name": "N/A",
+            "license_status": _text(row.get('license_status')),
+            "business_address": _text(row.get('contractor_address')),
+            "business_phone": "N/A",
+            "work_type": _first_text(row, ['work_type', 'permit_type'], 'General Construction'),
+            "block": _text(row.get('block'), ''),
+            "lot": _text(row.get('lot'), ''),
+            "bin": _text(row.get('bin'), ''),
+            "data_source": adapter.data_source,
+            "scraped_at": scraped_at
+        }
+        # City-specific normalization (parties, etc.) declared by the adapter
+        for hook in adapter.hooks:
+            hook(row, permit)
+        permits.append(permit)
+    
+    return permits
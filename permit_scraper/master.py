@@ -0,0 +1,245 @@
+"""
+Per-run city CSVs and the partitioned master dataset.
+"""
+
+import os
+import re
+import csv
+import shutil
+import logging
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+from .config import Config
+from .timing import RunTimer
+
+def save_city_csv(city_key, permits, timer=None):
+    """Save permits to city-specific CSV"""
+    if not permits:
+        return ""
+    
+    date_tag = datetime.now().strftime("%Y%m%d")
+    filename = f"{city_key}_permits_{date_tag}.csv"
+    filepath = os.path.join(Config.OUTPUT_DIR, filename)
+    
+    with (timer or RunTimer()).span(city_key, "csv_write") as span:
+        df = pd.DataFrame(permits)
+        df.to_csv(filepath, index=False, quoting=csv.QUOTE_MINIMAL)
+        span["rows"] = len(df)
+        span["bytes"] = os.path.getsize(filepath)
+    
+    logging.info(f"Saved {city_key} permits to {filename}")
+    return filepath
+
+# ---------- Master dataset ----------
+# The master store is partitioned by city and issue month. Each partition holds
+# only the latest version of every permit in it, and a per-city key index
+# (permit_id -> month) tells us when a permit moved between months. A run only
+# touches the partitions its permits fall into, and the index is a keyed SQLite
+# table from which it reads and writes only the run's own keys, so its cost
+# follows the delta instead of everything ever scraped.
+#
+# Partitions are always swapped in whole, and the key index is committed only
+# after them. A run that dies in between leaves rows the index does not know,
+# so before writing a partition we drop any of its stored rows whose key is
+# being written again: re-running the batch replaces them instead of adding
+# duplicates.
+
+MASTER_KEY_INDEX = "_keys.sqlite"
+LEGACY_KEY_INDEX = "_keys.csv"  # Whole-file index of earlier versions, imported once
+KEY_LOOKUP_CHUNK = 500  # Keys per IN (...) lookup, under SQLite's bound-parameter limit
+
+def _city_slug(city_name):
+    return re.sub(r"[^a-z0-9]+", "_", str(city_name).lower()).strip("_") or "unknown"
+
+def _city_dir(city_slug):
+    return os.path.join(Config.MASTER_DIR, f"city={city_slug}")
+
+def _partition_path(city_slug, month):
+    return os.path.join(_city_dir(city_slug), f"{month}.csv")
+
+def _write_atomic(df, path):
+    """Write a CSV next to its target and swap it in, so readers never see half a file"""
+    tmp_path = f"{path}.tmp"
+    df.to_csv(tmp_path, index=False, quoting=csv.QUOTE_MINIMAL)
+    os.replace(tmp_path, path)
+
+def _open_key_index(city_slug):
+    """Connection to a city's permit_id -> month index, created (or imported from CSV) on first use"""
+    conn = sqlite3.connect(os.path.join(_city_dir(city_slug), MASTER_KEY_INDEX))
+    conn.execute("CREATE TABLE IF NOT EXISTS keys (permit_id TEXT PRIMARY KEY, month TEXT NOT NULL) WITHOUT ROWID")
+    legacy_path = os.path.join(_city_dir(city_slug), LEGACY_KEY_INDEX)
+    if os.path.exists(legacy_path):
+        index_df = pd.read_csv(legacy_path, dtype=str, keep_default_na=False)
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO keys VALUES (?, ?)", zip(index_df["permit_id"], index_df["month"]))
+        os.remove(legacy_path)
+    return conn
+
+def _lookup_keys(conn, permit_ids):
+    """Stored month of the given permit ids (those seen before)"""
+    permit_ids = list(permit_ids)
+    found = {}
+    for start in range(0, len(permit_ids), KEY_LOOKUP_CHUNK):
+        chunk = permit_ids[start:start + KEY_LOOKUP_CHUNK]
+        found.update(conn.execute(
+            f"SELECT permit_id, month FROM keys WHERE permit_id IN ({','.join('?' * len(chunk))})", chunk
+        ))
+    return found
+
+def _read_partition_header(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return next(csv.reader(f), [])
+
+def _upsert_partition(city_slug, month, new_rows, drop_ids):
+    """Add rows to a partition, replacing stored rows with the same keys and dropping drop_ids"""
+    path = _partition_path(city_slug, month)
+
+    if os.path.exists(path):
+        header = _read_partition_header(path)
+        # Rows of an earlier run that died before committing the key index are replaced, not duplicated
+        stored_ids = pd.read_csv(path, usecols=["permit_id"], dtype=str, keep_default_na=False)["permit_id"]
+        drop_ids = set(drop_ids) | set(stored_ids[stored_ids.isin(new_rows["permit_id"])])
+        # Pure inserts with a known schema are appended to a copy, without parsing the other columns
+        if not drop_ids and set(new_rows.columns) <= set(header):
+            tmp_path = f"{path}.tmp"
+            shutil.copyfile(path, tmp_path)
+            new_rows.reindex(columns=header).to_csv(
+                tmp_path, mode="a", header=False, index=False, quoting=csv.QUOTE_MINIMAL
+            )
+            os.replace(tmp_path, path)
+            return
+        existing = pd.read_csv(path, dtype=str, keep_default_na=False)
+        existing = existing[~existing["permit_id"].isin(drop_ids)]
+        combined = pd.concat([existing, new_rows], ignore_index=True)
+    else:
+        combined = new_rows
+
+    if combined.empty:
+        os.remove(path)
+    else:
+        _write_atomic(combined, path)
+
+def update_master_dataset(all_permits, timer=None):
+    """Upsert a batch of permits into the partitioned master dataset"""
+    if not all_permits:
+        return
+    with (timer or RunTimer()).span("all", "master_write") as span:
+        _import_legacy_master_csv()
+        _upsert_master(pd.DataFrame(all_permits, dtype=str))
+        span["rows"] = len(all_permits)
+
+def _upsert_master(df):
+    df = df.drop_duplicates(subset=["city", "permit_id"], keep="last")
+    issue_dates = df["issue_date"].fillna("")
+    months = issue_dates.str[:7].where(issue_dates.str.match(r"\d{4}-\d{2}"), "unknown")
+    city_slugs = df["city"].map(_city_slug)
+
+    partitions_written = 0
+    for city_slug, city_df in df.groupby(city_slugs, sort=False):
+        os.makedirs(_city_dir(city_slug), exist_ok=True)
+        city_months = months.loc[city_df.index]
+        conn = _open_key_index(city_slug)
+        try:
+            index = _lookup_keys(conn, city_df["permit_id"])
+
+            # Keys seen before must be replaced; keys that moved month leave their old partition
+            updated_ids = {}
+            moved_ids = {}
+            changed_keys = []
+            for permit_id, month in zip(city_df["permit_id"], city_months):
+                previous = index.get(permit_id)
+                if previous == month:
+                    updated_ids.setdefault(month, set()).add(permit_id)
+                    continue
+                if previous is not None:
+                    moved_ids.setdefault(previous, set()).add(permit_id)
+                changed_keys.append((permit_id, month))
+
+            # Moved keys leave their old month first: a run cut short loses them until
+            # they are written again, instead of leaving two versions behind
+            for month, permit_ids in moved_ids.items():
+                if os.path.exists(_partition_path(city_slug, month)):
+                    _upsert_partition(city_slug, month, df.iloc[0:0], permit_ids)
+                    partitions_written += 1
+            for month, month_df in city_df.groupby(city_months, sort=False):
+                _upsert_partition(city_slug, month, month_df, updated_ids.get(month, set()))
+                partitions_written += 1
+
+            # Only new and moved keys are written
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO keys VALUES (?, ?)", changed_keys)
+        finally:
+            conn.close()
+
+    logging.info(f"Master dataset updated: {len(df)} permits across {partitions_written} partitions")
+
+def update_master_csv(all_permits, timer=None):
+    """Update the master permit store (kept for existing callers)"""
+    update_master_dataset(all_permits, timer=timer)
+
+def _import_legacy_master_csv():
+    """One-time migration of the old single-file master CSV into partitions"""
+    if not os.path.exists(Config.MASTER_CSV):
+        return
+    if os.path.exists(Config.MASTER_DIR) and os.listdir(Config.MASTER_DIR):
+        return
+    logging.info(f"Importing legacy {Config.MASTER_CSV} into {Config.MASTER_DIR}")
+    os.makedirs(Config.MASTER_DIR, exist_ok=True)
+    for chunk in pd.read_csv(Config.MASTER_CSV, dtype=str, keep_default_na=False, chunksize=50000):
+        _upsert_master(chunk)
+
+def _iter_partitions(cities=None, start_month=None, end_month=None):
+    if not os.path.exists(Config.MASTER_DIR):
+        return
+    city_slugs = {_city_slug(c) for c in cities} if cities else None
+    for city_dirname in sorted(os.listdir(Config.MASTER_DIR)):
+        if not city_dirname.startswith("city="):
+            continue
+        city_slug = city_dirname.split("=", 1)[-1]
+        if city_slugs is not None and city_slug not in city_slugs:
+            continue
+        for filename in sorted(os.listdir(_city_dir(city_slug))):
+            if not filename.endswith(".csv") or filename == LEGACY_KEY_INDEX:
+                continue
+            month = filename[:-4]
+            if (start_month and month < start_month) or (end_month and month > end_month):
+                continue
+            yield _partition_path(city_slug, month)
+
+def load_master_permits(cities=None, start_month=None, end_month=None):
+    """
+    Latest version of every permit, optionally limited to some cities and an
+    issue-month range ("YYYY-MM"). Only the matching partitions are read.
+    """
+    frames = [pd.read_csv(path, dtype=str, keep_default_na=False)
+              for path in _iter_partitions(cities, start_month, end_month)]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+def export_master_csv(path=None):
+    """Materialize the master dataset as a single CSV, one partition at a time"""
+    path = path or Config.MASTER_CSV
+    tmp_path = f"{path}.tmp"
+    partitions = list(_iter_partitions())
+
+    # Partitions written by different feeds may carry different columns
+    header = []
+    for partition in partitions:
+        header.extend(c for c in _read_partition_header(partition) if c not in header)
+
+    total = 0
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerow(header)
+        for partition in partitions:
+            partition_df = pd.read_csv(partition, dtype=str, keep_default_na=False)
+            partition_df.reindex(columns=header).to_csv(
+                f, header=False, index=False, quoting=csv.QUOTE_MINIMAL
+            )
+            total += len(partition_df)
+    os.replace(tmp_path, path)
+    logging.info(f"Exported {total} permits to {path}")
+    return path
@@ -0,0 +1,138 @@
+"""
+Fetching city APIs and turning them into permits, one city or many at once.
+"""
+
+import json
+import time
+import random
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from .anomaly import flag_cost_anomalies
+from .config import Config
+from .cities import CITY_REGISTRY
+from .ingest import parse_city_payload
+from .synthetic import generate_permit
+from .timing import RunTimer
+
+def decode_rows(body, fields):
+    """JSON rows of an API page, each holding only the given fields
+
+    The projection runs inside the decoder, so unused columns (some datasets
+    carry dozens) are never built into row dicts. Nested objects are
+    projected the same way; none of the fields we read is one.
+    """
+    fields = frozenset(fields)
+    return json.loads(body, object_pairs_hook=lambda pairs: {k: v for k, v in pairs if k in fields})
+
+def fetch_city_rows(adapter, min_cost, days_back, session=None, timer=None):
+    """Page through a city API, honoring the adapter's page size, row cap and rate limit"""
+    session = session or requests.Session()
+    timer = timer or RunTimer()
+    rows = []
+    fields = adapter.payload_fields()
+    while len(rows) < adapter.max_rows:
+        adapter.throttle()
+        started = time.monotonic()
+        response = session.get(
+            adapter.endpoint, params=adapter.query_params(min_cost, days_back, len(rows)), timeout=30
+        )
+        response.raise_for_status()
+        body = response.content
+        fetched = time.monotonic()
+        # One fetch and one decode span per request (rate-limit waits excluded)
+        timer.add(adapter.key, "fetch", started, fetched - started, bytes=len(body))
+        page = decode_rows(body, fields)
+        timer.add(adapter.key, "decode", fetched, time.monotonic() - fetched, rows=len(page))
+        rows.extend(page)
+        if len(page) < adapter.page_size:
+            break
+    return rows
+
+def scrape_real_city_data(city_key, min_cost=None, days_back=None, timer=None):
+    """
+    Scrape real permit data for any city.
+    Returns list of permits in the format expected by the main scraper.
+    """
+    if city_key not in CITY_REGISTRY or not CITY_REGISTRY[city_key].has_api:
+        logging.error(f"No API configuration for city: {city_key}")
+        return []
+        
+    adapter = CITY_REGISTRY[city_key]
+    min_cost = adapter.min_cost if min_cost is None else min_cost
+    days_back = adapter.days_back if days_back is None else days_back
+    logging.info(f"🏗️  Scraping REAL {adapter.name} permit data from API...")
+    
+    try:
+        data = fetch_city_rows(adapter, min_cost, days_back, timer=timer)
+        
+        if not data:
+            logging.warning(f"No data received from {adapter.name} API")
+            return []
+        logging.info(f"Retrieved {len(data)} total {adapter.name} records")
+        
+        return parse_city_payload(city_key, data, min_cost=min_cost, days_back=days_back, timer=timer)
+        
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error fetching {adapter.name} data: {e}")
+        return []
+    except Exception as e:
+        logging.error(f"Error processing {adapter.name} data: {e}")
+        return []
+
+def process_city(city_key, timer=None):
+    """Process permits for a single city"""
+    adapter = CITY_REGISTRY[city_key]
+    logging.info(f"Processing {adapter.name}...")
+    
+    permits = []
+    
+    # Use real data wherever the adapter declares an API
+    if adapter.has_api:
+        logging.info(f"🔥 Using REAL {adapter.name} permit data from Open Data API...")
+        permits = scrape_real_city_data(city_key, timer=timer)
+        
+        # If real data fails, fall back to mock data
+        if not permits:
+            logging.warning(f"Real {adapter.name} data failed, falling back to mock data")
+            num_permits = random.randint(3, 8)
+            for i in range(num_permits):
+                permit = generate_permit(city_key, i + 1)
+                permits.append(permit)
+    else:
+        # Generate mock data for any other cities
+        num_permits = random.randint(2, 8)
+        for i in range(num_permits):
+            permit = generate_permit(city_key, i + 1)
+            permits.append(permit)
+    
+    # Flag implausible costs against the city's rolling statistics
+    timer = timer or RunTimer()
+    with timer.span(city_key, "anomaly") as span:
+        flagged = flag_cost_anomalies(adapter.name, permits)
+        span["rows"] = len(permits)
+    
+    # Calculate total value (flagged costs left out)
+    total_value = sum(int(p["estimated_cost"]) for p in permits if not p["cost_anomaly"])
+    logging.info(f"Collected {len(permits)} permits for {adapter.name} (${total_value:,}, {flagged} flagged)")
+    
+    return permits
+
+def iter_city_results(city_keys=None, max_workers=None, timer=None):
+    """
+    Fan process_city out over the registry (or the given cities) in a thread
+    pool and yield (city_key, permits, error) as each city finishes.
+    Persistence stays with the caller, on the calling thread.
+    """
+    city_keys = list(CITY_REGISTRY.keys() if city_keys is None else city_keys)
+    max_workers = max(1, min(max_workers or Config.MAX_FETCH_WORKERS, len(city_keys) or 1))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="city") as executor:
+        futures = {executor.submit(process_city, city_key, timer): city_key for city_key in city_keys}
+        for future in as_completed(futures):
+            city_key = futures[future]
+            try:
+                yield city_key, future.result(), None
+            except Exception as e:
+                yield city_key, [], e
@@ -0,0 +1,229 @@
+"""
+Mock permits: one at a time for demo runs, or column-at-a-time with NumPy for
+load and scale testing.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .cities import CITIES, CITY_REGISTRY
+
+# Sample data pools
+CONTRACTORS = [
+    "ABC Construction Corp", "Metro Building Systems", "Elite Contractors LLC",
+    "Skyline Construction", "Premier Build Group", "Urban Development Co",
+    "Apex Construction Services", "Diamond Building Solutions", "Crown Contractors",
+    "Pacific Construction Group", "Summit Building Corp", "Prestige Builders Inc"
+]
+
+ADDRESSES = [
+    ("123", "Main Street"), ("456", "Broadway"), ("789", "Park Avenue"), 
+    ("321", "First Street"), ("654", "Second Avenue"), ("987", "Third Street"),
+    ("159", "Market Street"), ("753", "Oak Avenue"), ("852", "Pine Street")
+]
+
+DESCRIPTIONS = [
+    "New 30-story mixed-use commercial building with retail ground floor",
+    "High-rise residential tower with 300+ luxury units", 
+    "Major office building renovation and modernization project",
+    "New hospital wing construction and medical facilities expansion",
+    "Large retail and entertainment complex development",
+    "Mixed-use development with residential and commercial spaces",
+    "Corporate headquarters building construction project",
+    "Luxury hotel and conference center development",
+    "Educational facility expansion and renovation project",
+    "Industrial warehouse and distribution center construction"
+]
+
+WORK_TYPES = ["New Building", "Alteration", "Renovation", "Demolition", "General Construction"]
+
+def generate_permit(city_key, permit_num):
+    """Generate a realistic permit record"""
+    city_data = CITIES[city_key]
+    
+    # Random date within last 30 days
+    days_ago = random.randint(0, 30)
+    issue_date = datetime.now() - timedelta(days=days_ago)
+    
+    # Random cost between $1M and $50M
+    cost = random.randint(1000000, 50000000)
+    
+    # Random address
+    house_num, street = random.choice(ADDRESSES)
+    
+    return {
+        "city": city_data["name"],
+        "permit_id": f"{city_key.upper()}-2025-{permit_num:06d}",
+        "issue_date": issue_date.strftime("%Y-%m-%d"),
+        "full_address": f"{house_num} {street}",
+        "borough_area": random.choice(city_data["areas"]),
+        "zip_code": f"{random.randint(10000, 99999)}",
+        "project_description": random.choice(DESCRIPTIONS),
+        "work_type": random.choice(WORK_TYPES),
+        "estimated_cost": str(cost),
+        "contractor_name": random.choice(CONTRACTORS),
+        "contractor_license": f"LIC-{random.randint(100000, 999999)}",
+        "applicant_name": f"Development Group {random.randint(1, 100)} LLC",
+        "owner_name": f"Property Holdings {random.randint(1, 50)} Inc",
+        "architect_name": f"Design Studio {random.randint(1, 25)}",
+        "license_status": random.choice(["Active", "Verified", "Good Standing"]),
+        "business_address": f"{random.randint(100, 9999)} Business Ave",
+        "business_phone": f"({random.randint(200, 999)}) {random.randint(200, 999)}-{random.randint(1000, 9999)}",
+        "data_source": f"{city_data['name']} DOB (Demo Data)",
+        "scraped_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+# ---------- Bulk synthetic data ----------
+# Column-at-a-time version of generate_permit for load and scale testing:
+# each chunk is drawn with NumPy from a seed derived from (seed, chunk number),
+# so the same rows/seed/chunk_rows always produce the same permits.
+
+SYNTHETIC_STREETS = [street for _, street in ADDRESSES] + [
+    "Madison Avenue", "Lexington Avenue", "Mission Street", "Wacker Drive",
+    "Sunset Boulevard", "Wilshire Boulevard", "Howard Street", "Michigan Avenue",
+]
+
+# Descriptions are assembled from templates and independent slots: with a
+# handful of fixed sentences, unrelated permits at the same address look like
+# re-filed duplicates to scraper.duplicates
+SYNTHETIC_SCOPES = [
+    "New construction of", "Renovation of", "Interior alteration of", "Addition to",
+    "Facade restoration of", "Structural repair of", "Change of use of", "Modernization of",
+    "Seismic retrofit of", "Demolition and rebuild of", "Tenant fit-out of", "Expansion of",
+]
+
+SYNTHETIC_BUILDINGS = [
+    "mixed-use building", "residential tower", "office building", "hospital wing", "retail complex",
+    "hotel", "public school", "warehouse", "distribution center", "parking garage",
+    "laboratory building", "data center", "senior housing", "apartment building", "community center",
+    "branch library", "transit station", "manufacturing plant", "condominium", "university hall",
+]
+
+SYNTHETIC_FEATURES = [
+    "ground-floor retail", "underground parking", "a rooftop amenity deck", "new mechanical systems",
+    "a green roof", "accessible entrances", "new elevators", "solar panels", "a loading dock",
+    "fire sprinkler upgrades", "a public plaza", "EV charging stations", "a fitness center",
+    "a new curtain wall", "a structural steel frame", "conference facilities", "a childcare center",
+    "seismic bracing", "energy-efficient glazing", "a landscaped courtyard",
+]
+
+# One trade and legal suffix per name word, so every firm is its own contractor entity
+SYNTHETIC_FIRM_WORDS = [
+    "Abbott", "Beacon", "Cardinal", "Dalton", "Evergreen", "Fairway", "Granite", "Harbor",
+    "Ironwood", "Juniper", "Keystone", "Lakeshore", "Meridian", "Northgate", "Oakridge", "Pinnacle",
+    "Quarry", "Redstone", "Sterling", "Tidewater", "Union Square", "Vanguard", "Westbrook", "Yardley",
+    "Zenith", "Alder", "Bluestone", "Cobalt", "Driftwood", "Emerson", "Foxhall", "Greystone",
+    "Hartwell", "Ivory Tower", "Jasper", "Kingsley", "Linden", "Monarch", "Newport", "Orchard",
+]
+SYNTHETIC_TRADES = [
+    "Construction", "Builders", "Contracting", "General Contractors", "Building Group",
+    "Construction Services", "Structures", "Development",
+]
+SYNTHETIC_CONTRACTORS = CONTRACTORS + [
+    f"{word} {SYNTHETIC_TRADES[i % len(SYNTHETIC_TRADES)]} {['LLC', 'Inc', 'Corp', 'Co'][i % 4]}"
+    for i, word in enumerate(SYNTHETIC_FIRM_WORDS)
+]
+SYNTHETIC_APPLICANTS = [
+    f"{word} {kind} LLC" for word in SYNTHETIC_FIRM_WORDS
+    for kind in ["Development Group", "Properties", "Partners", "Ventures", "Realty"]
+]
+SYNTHETIC_OWNERS = [
+    f"{word} {kind} Inc" for word in SYNTHETIC_FIRM_WORDS
+    for kind in ["Property Holdings", "Capital", "Real Estate", "Land Trust"]
+]
+SYNTHETIC_ARCHITECTS = [
+    f"{word} {kind}" for word in SYNTHETIC_FIRM_WORDS
+    for kind in ["Architects", "Design Studio", "Architecture", "Associates"]
+]
+
+def _pick(rng, pool, n, weights=None):
+    """Categorical column of n draws from pool (stored as codes, not strings)"""
+    codes = rng.choice(len(pool), size=n, p=weights)
+    return pd.Categorical.from_codes(codes, categories=pool)
+
+def _prefixed(prefix, numbers):
+    return prefix + pd.Series(numbers).astype(str)
+
+def _descriptions(rng, n):
+    """Project descriptions from SYNTHETIC_* slots, one of four sentence templates per row"""
+    scope = pd.Series(_pick(rng, SYNTHETIC_SCOPES, n)).astype(str)
+    building = pd.Series(_pick(rng, SYNTHETIC_BUILDINGS, n)).astype(str)
+    feature = pd.Series(_pick(rng, SYNTHETIC_FEATURES, n)).astype(str)
+    other = pd.Series(_pick(rng, SYNTHETIC_FEATURES, n)).astype(str)
+    stories = _prefixed("", rng.integers(2, 61, size=n))
+    units = _prefixed("", rng.integers(10, 801, size=n))
+    square_feet = _prefixed("", rng.integers(5, 900, size=n) * 1000)
+    templates = [
+        scope + " " + stories + "-story " + building + " with " + feature + " and " + other,
+        scope + " " + building + " (" + units + " units), including " + feature,
+        building.str.capitalize() + ": " + scope.str.lower() + " " + stories + " floors, " + feature + ", " + other,
+        scope + " " + building + ", " + square_feet + " sq ft with " + feature,
+    ]
+    choice = rng.integers(0, len(templates), size=n)
+    return np.select([choice == i for i in range(len(templates))], [t.to_numpy(dtype=object) for t in templates])
+
+def generate_permit_frame(rows, seed=0, city_keys=None, days=365, start=0):
+    """
+    DataFrame of `rows` synthetic permits in the permit dict layout. Costs are
+    log-normal (median around $3M, floored at $1M), issue dates are skewed
+    towards recent days, and contractors follow a long-tailed distribution.
+    Descriptions vary enough that no two permits pass for duplicates.
+    `start` offsets the permit id sequence.
+    """
+    rng = np.random.default_rng(seed)
+    city_keys = list(city_keys or CITY_REGISTRY)
+    cities = [CITY_REGISTRY[key] for key in city_keys]
+    city_codes = rng.integers(0, len(cities), size=rows)
+    
+    # Areas: a per-city random index into that city's own area list
+    # (city areas are flattened, then mapped onto a de-duplicated category pool)
+    flat_areas = [area for adapter in cities for area in adapter.areas]
+    area_pool = list(dict.fromkeys(flat_areas))
+    flat_to_pool = np.array([area_pool.index(area) for area in flat_areas])
+    area_offsets = np.cumsum([0] + [len(adapter.areas) for adapter in cities[:-1]])
+    area_counts = np.array([len(adapter.areas) for adapter in cities])
+    area_codes = flat_to_pool[area_offsets[city_codes] + (rng.random(rows) * area_counts[city_codes]).astype(np.int64)]
+    
+    # Zipf-like contractor popularity: a few firms hold most large permits
+    contractor_weights = 1.0 / np.arange(1, len(SYNTHETIC_CONTRACTORS) + 1) ** 1.1
+    contractor_weights /= contractor_weights.sum()
+    
+    cost = np.maximum(np.rint(rng.lognormal(mean=np.log(3_000_000), sigma=0.9, size=rows)), 1_000_000)
+    days_ago = np.minimum(rng.exponential(scale=days / 3, size=rows), days - 1).astype("timedelta64[D]")
+    today = np.datetime64(datetime.now().date(), "D")
+    sequence = np.arange(start, start + rows)
+    prefixes = np.array([f"{key.upper()}-SYN-" for key in city_keys], dtype=object)
+    
+    return pd.DataFrame({
+        "city": pd.Categorical.from_codes(city_codes, categories=[a.name for a in cities]),
+        "permit_id": prefixes[city_codes] + pd.Series(sequence).astype(str).str.zfill(10).to_numpy(dtype=object),
+        "issue_date": pd.Series(today - days_ago).dt.strftime("%Y-%m-%d"),
+        "full_address": _prefixed("", rng.integers(1, 9999, size=rows)) + " "
+                        + pd.Series(_pick(rng, SYNTHETIC_STREETS, rows)).astype(str),
+        "borough_area": pd.Categorical.from_codes(area_codes, categories=area_pool),
+        "zip_code": pd.Series(rng.integers(10000, 99999, size=rows)).astype(str),
+        "project_description": _descriptions(rng, rows),
+        "work_type": _pick(rng, WORK_TYPES, rows, [0.15, 0.4, 0.25, 0.05, 0.15]),
+        "estimated_cost": cost.astype(np.int64),
+        "contractor_name": _pick(rng, SYNTHETIC_CONTRACTORS, rows, contractor_weights),
+        "contractor_license": _prefixed("LIC-", rng.integers(100000, 999999, size=rows)),
+        "applicant_name": _pick(rng, SYNTHETIC_APPLICANTS, rows),
+        "owner_name": _pick(rng, SYNTHETIC_OWNERS, rows),
+        "architect_name": _pick(rng, SYNTHETIC_ARCHITECTS, rows),
+        "license_status": _pick(rng, ["Active", "Verified", "Good Standing"], rows),
+        "business_address": _prefixed("", rng.integers(100, 9999, size=rows)) + " Business Ave",
+        "business_phone": pd.Series(rng.integers(200, 999, size=rows)).astype(str).radd("(") + ") "
+                          + pd.Series(rng.integers(200, 999, size=rows)).astype(str) + "-"
+                          + pd.Series(rng.integers(1000, 9999, size=rows)).astype(str),
+        "data_source": pd.Categorical.from_codes(city_codes, categories=[f"{a.name} (Synthetic Data)" for a in cities]),
+        "scraped_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    })
+
+def iter_permit_frames(rows, seed=0, chunk_rows=250_000, city_keys=None, days=365, start=0):
+    """Yield generate_permit_frame chunks totalling `rows`, each seeded from (seed, chunk number)"""
+    for chunk, offset in enumerate(range(0, rows, chunk_rows)):
+        n = min(chunk_rows, rows - offset)
+        yield generate_permit_frame(n, seed=[seed, chunk], city_keys=city_keys, days=days, start=start + offset)
@@ -0,0 +1,56 @@
+"""
+Per-stage wall time of a scraper run. Standard library only.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+class RunTimer:
+    """
+    Per-city, per-stage wall time for one scraper run. Spans record their
+    offset from the start of the run, duration, and optional row and byte
+    counts; the result is a JSON-ready list (stored on ScraperRun).
+    Safe to share between the fetch threads of a run.
+    """
+    
+    def __init__(self):
+        self._origin = time.monotonic()
+        self._spans = []
+        self._lock = threading.Lock()
+    
+    def add(self, city, stage, started, seconds, rows=None, bytes=None):
+        """Record a span measured elsewhere; started is a time.monotonic() value"""
+        with self._lock:
+            self._spans.append({
+                "city": city,
+                "stage": stage,
+                "start": round(started - self._origin, 4),
+                "seconds": round(seconds, 4),
+                "rows": rows,
+                "bytes": bytes,
+            })
+    
+    @contextmanager
+    def span(self, city, stage):
+        """Time a block; set span["rows"] / span["bytes"] inside it to record counts"""
+        counts = {"rows": None, "bytes": None}
+        started = time.monotonic()
+        try:
+            yield counts
+        finally:
+            self.add(city, stage, started, time.monotonic() - started, counts["rows"], counts["bytes"])
+    
+    def as_list(self):
+        with self._lock:
+            return sorted(self._spans, key=lambda s: s["start"])
+    
+    def stage_totals(self):
+        """Summed seconds, rows and bytes per stage, in first-seen order"""
+        totals = {}
+        for span in self.as_list():
+            stage = totals.setdefault(span["stage"], {"seconds": 0.0, "rows": 0, "bytes": 0})
+            stage["seconds"] += span["seconds"]
+            stage["rows"] += span["rows"] or 0
+            stage["bytes"] += span["bytes"] or 0
+        return totals
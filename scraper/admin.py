@@ -1,29 +1,39 @@
+from django.conf import settings
 from django.contrib import admin
 from django.utils.html import format_html
-from django.urls import path
-from django.http import HttpResponseRedirect, HttpResponse
+from django.utils.safestring import mark_safe
+from django.urls import path, reverse
+from django.http import HttpResponseRedirect, JsonResponse, FileResponse
 from django.contrib import messages
 from django.shortcuts import redirect, render
-import csv
+import json
 import os
 import zipfile
 import tempfile
 import time
 from datetime import datetime
 from django.utils import timezone
-from .models import Permit, ScraperRun, FileProcessor
+from .models import (
+    Permit, ScraperRun, FileProcessor, UploadSession, ExportJob, City, Party, DataSource, ContractorEntity,
+    DuplicateCluster,
+)
+from . import exports, metrics, zip_cache
+from .admin_perf import EstimatedCountPaginator, FullTextSearchMixin, cached_values_filter
+from .duplicates import DOCUMENT_FIELDS, DuplicateDetector
+from .geocoding import location_fields
 
 
 @admin.register(FileProcessor)
 class FileProcessorAdmin(admin.ModelAdmin):
     list_display = [
-        'id', 'upload_file', 'status', 'files_count', 
+        'id', 'upload_file', 'status', 'files_count', 'cache_hit',
         'uploaded_at', 'processed_at'
     ]
-    list_filter = ['status', 'uploaded_at']
+    list_filter = ['status', 'cache_hit', 'uploaded_at']
     readonly_fields = [
         'upload_file', 'uploaded_at', 'processed_at', 'files_count', 
-        'output_file', 'error_message', 'status'
+        'output_file', 'error_message', 'status',
+        'content_hash', 'cache_hit', 'processing_seconds'
     ]
     
     def has_add_permission(self, request):
@@ -47,6 +57,9 @@ class FileProcessorAdmin(admin.ModelAdmin):
                 'files_count', 'output_file', 'processed_at', 'error_message'
             )
         }),
+        ('Dedup Cache', {
+            'fields': ('content_hash', 'cache_hit', 'processing_seconds')
+        }),
         ('Timestamps', {
             'fields': ('uploaded_at',)
         }),
@@ -58,6 +71,10 @@ class FileProcessorAdmin(admin.ModelAdmin):
             path('process-zip/', self.admin_site.admin_view(self.process_zip_view), name='process_zip'),
             path('<int:object_id>/process/', self.admin_site.admin_view(self.process_single_file), name='process_single_file'),
             path('cleanup/<int:processor_id>/', self.admin_site.admin_view(self.cleanup_files_view), name='cleanup_files'),
+            path('upload/start/', self.admin_site.admin_view(self.upload_start_view), name='upload_start'),
+            path('upload/<str:upload_id>/', self.admin_site.admin_view(self.upload_status_view), name='upload_status'),
+            path('upload/<str:upload_id>/chunk/', self.admin_site.admin_view(self.upload_chunk_view), name='upload_chunk'),
+            path('upload/<str:upload_id>/complete/', self.admin_site.admin_view(self.upload_complete_view), name='upload_complete'),
         ]
         return custom_urls + urls
     
@@ -80,42 +97,16 @@ class FileProcessorAdmin(admin.ModelAdmin):
                     messages.error(request, error_msg)
                     return HttpResponseRedirect('../')
                 
-                # Create FileProcessor instance
+                # Create FileProcessor instance, keyed by the hash computed while uploading
+                content_hashes = getattr(request, 'upload_content_hashes', {})
                 processor = FileProcessor.objects.create(
                     upload_file=zip_file,
-                    status='processing'
+                    status='processing',
+                    content_hash=content_hashes.get('zip_file', '')
                 )
                 logger.info(f"Created FileProcessor ID: {processor.id}")
                 
-                # Process the file with enhanced error handling
-                try:
-                    output_path = self._process_zip_file(processor)
-                    logger.info(f"Processing completed for ID: {processor.id}, output: {output_path}")
-                    
-                    if processor.status == 'completed' and output_path:
-                        # Auto-download the processed file
-                        response = self._serve_and_cleanup_file(processor, output_path)
-                        logger.info(f"File served for download: {processor.id}")
-                        return response
-                    else:
-                        error_msg = f'Processing failed: {processor.error_message or "Unknown error"}'
-                        logger.error(f"Processing failed for ID {processor.id}: {processor.error_message}")
-                        messages.error(request, error_msg)
-                        # Clean up failed processor
-                        if processor:
-                            try:
-                                processor.delete()
-                            except:
-                                pass
-                        return HttpResponseRedirect('../')
-                        
-                except Exception as process_error:
-                    logger.error(f"Processing error for ID {processor.id}: {str(process_error)}", exc_info=True)
-                    if processor:
-                        processor.status = 'failed'
-                        processor.error_message = str(process_error)
-                        processor.save()
-                    raise process_error
+                return self._process_and_serve(request, processor)
                 
             except Exception as e:
                 error_msg = f'Error processing ZIP file: {str(e)}'
@@ -132,6 +123,128 @@ class FileProcessorAdmin(admin.ModelAdmin):
         # Show upload form
         return render(request, 'admin/scraper/fileprocessor/upload_zip.html')
     
+    def _process_and_serve(self, request, processor, redirect_url='../'):
+        """Run the ZIP pipeline for a stored upload and return the download response"""
+        import logging
+        logger = logging.getLogger('scraper')
+        
+        # Process the file with enhanced error handling
+        try:
+            output_path = self._process_zip_file(processor)
+            logger.info(f"Processing completed for ID: {processor.id}, output: {output_path}")
+            
+            if processor.status == 'completed' and output_path:
+                # Auto-download the processed file
+                response = self._serve_and_cleanup_file(processor, output_path)
+                logger.info(f"File served for download: {processor.id}")
+                return response
+            else:
+                error_msg = f'Processing failed: {processor.error_message or "Unknown error"}'
+                logger.error(f"Processing failed for ID {processor.id}: {processor.error_message}")
+                messages.error(request, error_msg)
+                # Clean up failed processor
+                try:
+                    processor.delete()
+                except:
+                    pass
+                return HttpResponseRedirect(redirect_url)
+                
+        except Exception as process_error:
+            logger.error(f"Processing error for ID {processor.id}: {str(process_error)}", exc_info=True)
+            processor.status = 'failed'
+            processor.error_message = str(process_error)
+            processor.save()
+            raise process_error
+    
+    def upload_start_view(self, request):
+        """Open a chunked upload session: POST {"filename": ..., "size": ...}"""
+        from .uploads import UploadError, create_session, session_state
+        
+        if request.method != 'POST':
+            return JsonResponse({'status': 'error', 'message': 'POST required'}, status=405)
+        try:
+            payload = json.loads(request.body or b'{}')
+            session = create_session(payload.get('filename'), int(payload.get('size') or 0))
+            return JsonResponse(session_state(session), status=201)
+        except (ValueError, TypeError):
+            return JsonResponse({'status': 'error', 'message': 'Invalid upload request'}, status=400)
+        except UploadError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=e.status)
+    
+    def upload_status_view(self, request, upload_id):
+        """Report the resume offset of an upload, or discard it with DELETE"""
+        from .uploads import discard_session, session_state
+        
+        try:
+            session = UploadSession.objects.get(upload_id=upload_id)
+        except UploadSession.DoesNotExist:
+            return JsonResponse({'status': 'error', 'message': 'Upload not found'}, status=404)
+        
+        if request.method == 'DELETE':
+            discard_session(session)
+            return JsonResponse({'status': 'success', 'message': 'Upload discarded'})
+        return JsonResponse(session_state(session))
+    
+    def upload_chunk_view(self, request, upload_id):
+        """
+        Receive one chunk as the raw request body. The chunk offset and its
+        CRC32 are sent in the X-Chunk-Offset and X-Chunk-CRC32 headers.
+        """
+        from .uploads import UploadError, session_state, write_chunk
+        
+        if request.method != 'POST':
+            return JsonResponse({'status': 'error', 'message': 'POST required'}, status=405)
+        try:
+            session = UploadSession.objects.get(upload_id=upload_id)
+        except UploadSession.DoesNotExist:
+            return JsonResponse({'status': 'error', 'message': 'Upload not found'}, status=404)
+        
+        try:
+            offset = int(request.headers.get('X-Chunk-Offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'Invalid chunk headers'}, status=400)
+        
+        try:
+            # Read the body as a stream so a chunk never sits in memory whole
+            write_chunk(session, offset, request, length, request.headers.get('X-Chunk-CRC32'))
+            return JsonResponse(session_state(session))
+        except UploadError as e:
+            # Include the current offset so the client knows where to resume
+            session.refresh_from_db()
+            return JsonResponse(dict(session_state(session), error=str(e)), status=e.status)
+    
+    def upload_complete_view(self, request, upload_id):
+        """Assemble a fully received upload, then process and serve it like a direct upload"""
+        import logging
+        from .uploads import UploadError, complete_session
+        logger = logging.getLogger('scraper')
+        
+        if request.method != 'POST':
+            return JsonResponse({'status': 'error', 'message': 'POST required'}, status=405)
+        try:
+            session = UploadSession.objects.get(upload_id=upload_id)
+        except UploadSession.DoesNotExist:
+            return JsonResponse({'status': 'error', 'message': 'Upload not found'}, status=404)
+        
+        try:
+            processor = complete_session(session)
+        except UploadError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=e.status)
+        
+        changelist_url = reverse('admin:scraper_fileprocessor_changelist')
+        try:
+            return self._process_and_serve(request, processor, redirect_url=changelist_url)
+        except Exception as e:
+            error_msg = f'Error processing ZIP file: {str(e)}'
+            logger.error(error_msg, exc_info=True)
+            messages.error(request, error_msg)
+            try:
+                processor.delete()
+            except:
+                pass
+            return HttpResponseRedirect(changelist_url)
+    
     def process_single_file(self, request, object_id):
         """Process a single uploaded file"""
         try:
@@ -190,14 +303,9 @@ class FileProcessorAdmin(admin.ModelAdmin):
             if not content_type:
                 content_type = 'application/zip'
             
-            # Read the file content into memory
-            with open(output_path, 'rb') as f:
-                file_content = f.read()
-            
-            # Create download response
-            response = HttpResponse(file_content, content_type=content_type)
+            # Stream the file instead of reading it into memory
+            response = FileResponse(open(output_path, 'rb'), content_type=content_type)
             response['Content-Disposition'] = f'attachment; filename="{processor.output_file}"'
-            response['Content-Length'] = len(file_content)
             
             # Set custom headers for client-side cleanup notification
             response['X-Cleanup-Required'] = 'true'
@@ -240,8 +348,8 @@ class FileProcessorAdmin(admin.ModelAdmin):
         errors = []
         
         try:
-            # Delete the processed output file
-            if output_path and os.path.exists(output_path):
+            # Delete the processed output file (cached outputs are kept for repeat uploads)
+            if output_path and os.path.exists(output_path) and not zip_cache.is_cache_path(output_path):
                 try:
                     os.remove(output_path)
                     files_deleted.append(f"Processed file: {output_path}")
@@ -299,7 +407,24 @@ class FileProcessorAdmin(admin.ModelAdmin):
         import shutil
         
         output_path = None
+        started = time.monotonic()
         try:
+            # Serve repeat uploads of the same bundle straight from the cache
+            if not processor.content_hash:
+                processor.content_hash = zip_cache.hash_file(processor.upload_file.path)
+            cached = zip_cache.lookup(processor.content_hash)
+            if cached:
+                processor.status = 'completed'
+                processor.processed_at = timezone.now()
+                processor.files_count = cached.files_count
+                processor.output_file = f'combined_files_{int(time.time())}.zip'
+                processor.cache_hit = True
+                processor.processing_seconds = time.monotonic() - started
+                processor.save()
+                self._record_zip_metrics(processor, 'hit')
+                return zip_cache.entry_path(cached)
+            
+
             # Ensure directories exist
             temp_dir = os.path.join(settings.BASE_DIR, 'temp')
             processed_dir = os.path.join(settings.MEDIA_ROOT, 'processed')
@@ -343,12 +468,18 @@ class FileProcessorAdmin(admin.ModelAdmin):
                     
                     output_zip.write(file_path, filename)
             
+            # Keep the output for future uploads of the same bundle
+            output_path = zip_cache.store(processor.content_hash, output_path, len(all_files))
+            
             # Update processor record
             processor.status = 'completed'
             processor.processed_at = timezone.now()
             processor.files_count = len(all_files)
             processor.output_file = output_filename
+            processor.cache_hit = False
+            processor.processing_seconds = time.monotonic() - started
             processor.save()
+            self._record_zip_metrics(processor, 'miss')
             
             # Clean up temporary directory
             shutil.rmtree(work_dir)
@@ -368,6 +499,16 @@ class FileProcessorAdmin(admin.ModelAdmin):
         
         return None
     
+    def _record_zip_metrics(self, processor, result):
+        """Cache hit/miss and throughput of one processed upload"""
+        metrics.zip_cache_requests.inc(result=result)
+        metrics.zip_processing_seconds.observe(processor.processing_seconds, result=result)
+        metrics.zip_processed_files.inc(processor.files_count, result=result)
+        try:
+            metrics.zip_processed_bytes.inc(processor.upload_file.size, result=result)
+        except (OSError, ValueError):
+            pass
+    
     def changelist_view(self, request, extra_context=None):
         """Add custom context for the changelist"""
         extra_context = extra_context or {}
@@ -375,37 +516,117 @@ class FileProcessorAdmin(admin.ModelAdmin):
         return super().changelist_view(request, extra_context)
 
 
+@admin.register(City, DataSource)
+class DimensionAdmin(admin.ModelAdmin):
+    """Interned permit names (see scraper/dimensions.py); searched by the Permit form autocompletes"""
+    list_display = ['name']
+    search_fields = ['name']
+
+
+@admin.register(Party)
+class PartyAdmin(DimensionAdmin):
+    list_display = ['name', 'entity']
+    list_select_related = ['entity']
+    raw_id_fields = ['entity']
+    readonly_fields = ['normalized_name']
+
+
+class PartyInline(admin.TabularInline):
+    model = Party
+    fields = ['name', 'normalized_name']
+    readonly_fields = ['name', 'normalized_name']
+    extra = 0
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ContractorEntity)
+class ContractorEntityAdmin(admin.ModelAdmin):
+    """Resolved contractor firms (see scraper/resolution.py) with the spellings that map to them"""
+    list_display = ['name', 'normalized_name', 'created_at']
+    search_fields = ['normalized_name']
+    readonly_fields = ['normalized_name', 'created_at']
+    inlines = [PartyInline]
+
+
+class DuplicatePermitInline(admin.TabularInline):
+    model = Permit
+    fields = ['permit_id', 'issue_date', 'full_address', 'project_description', 'estimated_cost']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    show_change_link = True
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DuplicateCluster)
+class DuplicateClusterAdmin(admin.ModelAdmin):
+    """Permits that look like one job filed more than once (see scraper/duplicates.py)"""
+    list_display = ['__str__', 'created_at', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at']
+    inlines = [DuplicatePermitInline]
+
+
 @admin.register(Permit)
-class PermitAdmin(admin.ModelAdmin):
+class PermitAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = [
         'permit_id', 'city', 'issue_date', 'formatted_cost', 
-        'contractor_name', 'scraped_at'
+        'contractor', 'scraped_at'
     ]
+    list_select_related = ['city', 'contractor']
     list_filter = [
-        'city', 'issue_date', 'license_status', 'scraped_at'
+        'city', 'issue_date', 'license_status', 'cost_anomaly', 'scraped_at'
     ]
     search_fields = [
         'permit_id', 'full_address', 'project_description', 
-        'contractor_name', 'applicant_name'
+        'contractor__name', 'applicant__name'
+    ]
+    # MySQL FULLTEXT index permits_search_ft (migration 0010)
+    exact_search_fields = ['permit_id']
+    fulltext_fields = ['full_address', 'project_description']
+    prefix_search_fields = ['contractor__name', 'applicant__name']
+    autocomplete_fields = ['city', 'contractor', 'applicant', 'owner', 'architect', 'data_source']
+    readonly_fields = [
+        'created_at', 'updated_at', 'scraped_at', 'latitude', 'longitude', 'geocode_precision', 'duplicate_cluster',
+        'cost_anomaly_score',
     ]
-    readonly_fields = ['created_at', 'updated_at', 'scraped_at']
     date_hierarchy = 'issue_date'
-    actions = ['export_selected_permits']
+    
+    if settings.ADMIN_PERFORMANCE_MODE:
+        # No full COUNT(*) or SELECT DISTINCT per page view, and deep pages offset over keys only
+        # (see scraper/admin_perf.py)
+        # (the city filter lists the small dim_cities table)
+        list_filter = [
+            'city', 'issue_date',
+            cached_values_filter(Permit, 'license_status'), 'cost_anomaly', 'scraped_at'
+        ]
+        paginator = EstimatedCountPaginator
+        show_full_result_count = False
+        # The year/month drill-down runs SELECT DISTINCT over every issue date
+        date_hierarchy = None
+    else:
+        fulltext_fields = []
+    
+    actions = ['export_selected_permits', 'export_selected_permits_background']
     
     fieldsets = (
         ('Identification', {
             'fields': ('permit_id', 'city', 'issue_date')
         }),
         ('Location', {
-            'fields': ('full_address', 'borough_area', 'zip_code')
+            'fields': ('full_address', 'borough_area', 'zip_code', 'latitude', 'longitude', 'geocode_precision')
         }),
         ('Project Details', {
-            'fields': ('project_description', 'estimated_cost')
+            'fields': ('project_description', 'estimated_cost', 'cost_anomaly', 'cost_anomaly_score')
         }),
         ('Parties Involved', {
             'fields': (
-                'contractor_name', 'contractor_license', 
-                'applicant_name', 'owner_name', 'architect_name'
+                'contractor', 'contractor_license', 
+                'applicant', 'owner', 'architect'
             )
         }),
         ('Contact & Status', {
@@ -414,7 +635,7 @@ class PermitAdmin(admin.ModelAdmin):
             )
         }),
         ('Metadata', {
-            'fields': ('data_source', 'scraped_at', 'created_at', 'updated_at')
+            'fields': ('data_source', 'duplicate_cluster', 'scraped_at', 'created_at', 'updated_at')
         }),
     )
     
@@ -422,7 +643,15 @@ class PermitAdmin(admin.ModelAdmin):
         return f"${obj.estimated_cost:,}"
     formatted_cost.short_description = 'Cost'
     formatted_cost.admin_order_field = 'estimated_cost'
-    
+
+    def save_model(self, request, obj, form, change):
+        """Re-geocode from the (possibly edited) address and re-check it for duplicates"""
+        for name, value in location_fields(obj.city.name, obj.full_address, obj.zip_code, obj.borough_area).items():
+            setattr(obj, name, value)
+        super().save_model(request, obj, form, change)
+        if not change or set(form.changed_data) & set(DOCUMENT_FIELDS):
+            DuplicateDetector().index(Permit.objects.filter(pk=obj.pk))
+
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
@@ -431,59 +660,91 @@ class PermitAdmin(admin.ModelAdmin):
         return custom_urls + urls
     
     def export_permits_csv(self, request):
-        """Export all permits to CSV"""
-        return self._export_permits_to_csv(request, Permit.objects.all(), "permits")
+        """Export all permits to CSV (?background=1 writes it as an ExportJob)"""
+        return self._export_permits_to_csv(
+            request, Permit.objects.all(), "permits", background=request.GET.get('background') == '1'
+        )
     
-    def _export_permits_to_csv(self, request, queryset, filename_prefix):
-        """Helper method to export permits to CSV"""
+    def _export_permits_to_csv(self, request, queryset, filename_prefix, background=False):
+        """Stream the permits as CSV, or hand large selections to a background ExportJob"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"{filename_prefix}_{timestamp}.csv"
         
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        writer = csv.writer(response)
-        
-        # Write header row with comprehensive fields
-        writer.writerow([
-            'Permit ID', 'City', 'Issue Date', 'Full Address', 'Borough/Area', 'ZIP Code',
-            'Project Description', 'Estimated Cost', 'Contractor Name', 'Contractor License',
-            'Applicant Name', 'Owner Name', 'Architect Name', 'License Status',
-            'Business Address', 'Business Phone', 'Data Source', 'Scraped At'
-        ])
-        
-        # Write data rows
-        for permit in queryset:
-            writer.writerow([
-                permit.permit_id,
-                permit.city,
-                permit.issue_date.strftime('%Y-%m-%d') if permit.issue_date else '',
-                permit.full_address,
-                permit.borough_area or '',
-                permit.zip_code or '',
-                permit.project_description,
-                float(permit.estimated_cost) if permit.estimated_cost else 0,
-                permit.contractor_name or '',
-                permit.contractor_license or '',
-                permit.applicant_name or '',
-                permit.owner_name or '',
-                permit.architect_name or '',
-                permit.license_status or '',
-                permit.business_address or '',
-                permit.business_phone or '',
-                permit.data_source or '',
-                permit.scraped_at.strftime('%Y-%m-%d %H:%M:%S') if permit.scraped_at else ''
-            ])
+        limit = settings.EXPORT_BACKGROUND_ROWS
+        if background or exports.estimate_rows(queryset, limit) > limit:
+            job = exports.start_export_job(
+                queryset, filename, description=filename_prefix.replace('_', ' '), user=request.user
+            )
+            url = reverse('admin:scraper_exportjob_change', args=[job.pk])
+            self.message_user(request, format_html(
+                'Export is running in the background - download it from <a href="{}">export job {}</a> when it completes.',
+                url, job.pk
+            ))
+            return HttpResponseRedirect(request.get_full_path() if request.method == 'POST' else '../')
         
-        count = queryset.count()
-        self.message_user(request, f'Successfully exported {count} permits to {filename}')
-        return response
+        return exports.stream_permits_csv(queryset, filename)
 
     def export_selected_permits(self, request, queryset):
         """Export selected permits to CSV"""
         return self._export_permits_to_csv(request, queryset, "selected_permits")
     
     export_selected_permits.short_description = "Export selected permits to CSV"
+    
+    def export_selected_permits_background(self, request, queryset):
+        """Export selected permits to a CSV file written by a background job"""
+        return self._export_permits_to_csv(request, queryset, "selected_permits", background=True)
+    
+    export_selected_permits_background.short_description = "Export selected permits to CSV (background job)"
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'filename', 'status', 'row_count', 'requested_by', 'created_at', 'completed_at', 'download_link']
+    list_filter = ['status', 'created_at']
+    readonly_fields = [
+        'status', 'filename', 'description', 'requested_by', 'row_count', 'size_bytes',
+        'file_path', 'error_message', 'created_at', 'started_at', 'completed_at', 'heartbeat_at', 'download_link'
+    ]
+    
+    def has_add_permission(self, request):
+        """Jobs are created by the Permit export actions"""
+        return False
+    
+    def changelist_view(self, request, extra_context=None):
+        """Show jobs lost with a recycled worker as failed, not running forever"""
+        exports.fail_stale_jobs()
+        return super().changelist_view(request, extra_context)
+    
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        exports.fail_stale_jobs()
+        return super().change_view(request, object_id, form_url, extra_context)
+    
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('<int:object_id>/download/', self.admin_site.admin_view(self.download_view), name='exportjob_download'),
+        ]
+        return custom_urls + urls
+    
+    def download_link(self, obj):
+        if obj.status != 'completed':
+            return '-'
+        return format_html('<a href="{}">Download CSV</a>', reverse('admin:exportjob_download', args=[obj.pk]))
+    download_link.short_description = 'Download'
+    
+    def download_view(self, request, object_id):
+        """Serve a finished export file"""
+        job = ExportJob.objects.filter(pk=object_id, status='completed').first()
+        if not job or not os.path.exists(job.file_path):
+            messages.error(request, 'Export file is not available.')
+            return redirect('admin:scraper_exportjob_changelist')
+        return FileResponse(open(job.file_path, 'rb'), as_attachment=True, filename=job.filename, content_type='text/csv')
+    
+    def delete_model(self, request, obj):
+        """Remove the export file along with the job"""
+        if obj.file_path and os.path.exists(obj.file_path):
+            os.remove(obj.file_path)
+        super().delete_model(request, obj)
 
 
 class ScraperRunAdmin(admin.ModelAdmin):
@@ -495,8 +756,8 @@ class ScraperRunAdmin(admin.ModelAdmin):
     search_fields = ['run_id']
     readonly_fields = [
         'run_id', 'started_at', 'completed_at', 'duration_seconds',
-        'total_permits_found', 'total_project_value', 'cities_processed',
-        'errors', 'summary_report'
+        'total_permits_found', 'total_project_value', 'anomalous_permits_found', 'cities_processed',
+        'errors', 'summary_report', 'stage_waterfall', 'stage_timings'
     ]
     
     fieldsets = (
@@ -506,9 +767,13 @@ class ScraperRunAdmin(admin.ModelAdmin):
         ('Timing', {
             'fields': ('started_at', 'completed_at', 'duration_seconds')
         }),
+        ('Stage Timings', {
+            'fields': ('stage_waterfall', 'stage_timings'),
+            'classes': ('collapse',)
+        }),
         ('Results', {
             'fields': (
-                'total_permits_found', 'total_project_value', 'cities_processed'
+                'total_permits_found', 'total_project_value', 'anomalous_permits_found', 'cities_processed'
             )
         }),
         ('Details', {
@@ -529,6 +794,47 @@ class ScraperRunAdmin(admin.ModelAdmin):
         return f"${obj.total_project_value:,}"
     formatted_value.short_description = 'Total Value'
     formatted_value.admin_order_field = 'total_project_value'
+    
+    STAGE_COLORS = {
+        'fetch': '#417690',
+        'decode': '#79aec8',
+        'filter': '#c4dce8',
+        'normalize': '#f5dd5d',
+        'anomaly': '#e8a33d',
+        'csv_write': '#70bf2b',
+        'master_write': '#4b8a1c',
+        'db_write': '#ba2121',
+    }
+    
+    def stage_waterfall(self, obj):
+        """Waterfall of the run's stage spans, one row per city and stage"""
+        spans = obj.stage_timings or []
+        if not spans:
+            return "No stage timings recorded"
+        total = max(s['start'] + s['seconds'] for s in spans) or 1
+        
+        rows = []
+        for s in spans:
+            left = 100 * s['start'] / total
+            width = max(100 * s['seconds'] / total, 0.3)
+            title = f"{s['seconds']:.3f}s"
+            if s.get('rows') is not None:
+                title += f", {s['rows']:,} rows"
+            if s.get('bytes') is not None:
+                title += f", {s['bytes']:,} bytes"
+            rows.append(format_html(
+                '<div style="display:flex;align-items:center;font-size:11px;margin:1px 0">'
+                '<span style="width:160px;flex:none">{} / {}</span>'
+                '<span style="flex:1;position:relative;height:12px;background:#f4f4f4">'
+                '<span title="{}" style="position:absolute;left:{}%;width:{}%;height:100%;background:{}"></span>'
+                '</span>'
+                '<span style="width:70px;flex:none;text-align:right">{}s</span>'
+                '</div>',
+                s['city'], s['stage'], title, f"{left:.2f}", f"{width:.2f}",
+                self.STAGE_COLORS.get(s['stage'], '#999'), f"{s['seconds']:.2f}"
+            ))
+        return format_html('<div style="width:700px">{}</div>', mark_safe(''.join(rows)))
+    stage_waterfall.short_description = 'Waterfall'
 
 
 # Custom Admin View for Scraper Control - inherits from ScraperRunAdmin
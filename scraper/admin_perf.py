@@ -0,0 +1,189 @@
+"""
+Change list helpers for admin pages over very large tables.
+
+The stock change list runs a COUNT(*) over the whole table (twice when a
+filter is active), a SELECT DISTINCT per list filter, LIMIT/OFFSET paging that
+reads and throws away every row before the page, and LIKE '%term%' across all
+search fields. On millions of permits each of those is a full scan. This
+module swaps them for:
+
+- EstimatedCountPaginator: row count from table statistics for the unfiltered
+  list, a bounded count for filtered ones, and a deferred join for pages
+  (page primary keys from the index first, then only those rows). Page links
+  are random access, so the OFFSET stays: deep pages still step over every
+  earlier entry of the ordering index, but no longer read the full rows.
+- cached_values_filter(): list filter choices kept in the cache and rebuilt by
+  refresh_filter_choices() after each scraper run.
+- FullTextSearchMixin: MATCH ... AGAINST over a FULLTEXT index on MySQL,
+  plus exact/prefix matches on indexed columns.
+
+Enabled for PermitAdmin by settings.ADMIN_PERFORMANCE_MODE.
+"""
+
+import re
+import logging
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections, router
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+
+logger = logging.getLogger('scraper')
+
+# (model, field) of every cached filter, for refresh_filter_choices()
+_CACHED_FILTERS = []
+
+# Words InnoDB will not index (innodb_ft_min_token_size defaults to 3)
+FULLTEXT_MIN_WORD = 3
+
+
+def estimated_row_count(model, using=None):
+    """Row count from the table statistics, or None when the backend has none"""
+    connection = connections[using or router.db_for_read(model)]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute(
+                    "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", [table]
+                )
+            elif connection.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+            else:
+                return None
+            row = cursor.fetchone()
+    except Exception as e:
+        logger.warning(f"Could not read table statistics for {table}: {e}")
+        return None
+    # PostgreSQL reports -1 for a table that has never been analyzed
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never counts the whole table and defers the row fetch of a page
+
+    page() still offsets: the admin links straight to page N, which keyset
+    paging cannot serve without the previous page's last row. The OFFSET runs
+    over primary keys read from the ordering index, so a deep page costs an
+    index scan up to it rather than reading and discarding whole rows.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            # Unfiltered list: table statistics are close enough for page links
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_MIN:
+                return estimate
+            return queryset.count()
+        # Filtered or searched: count at most ADMIN_FILTERED_COUNT_LIMIT matches
+        return queryset.order_by().values('pk')[:settings.ADMIN_FILTERED_COUNT_LIMIT].count()
+
+    def page(self, number):
+        """Deferred join: OFFSET over primary keys only, then fetch just this page's rows
+
+        Only the row fetch is deferred; the database still walks the index
+        past (number - 1) * per_page entries to find the page's keys.
+        """
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        ids = list(self.object_list.values_list('pk', flat=True)[bottom:bottom + self.per_page])
+        # Keeps the change list ordering; the sort now only covers per_page rows
+        return self._get_page(self.object_list.filter(pk__in=ids), number, self)
+
+
+def _choices_key(model, field):
+    return f"admin_filter_choices:{model._meta.label_lower}:{field}"
+
+
+def _load_choices(model, field):
+    values = (
+        model._default_manager.exclude(**{f"{field}__isnull": True}).exclude(**{field: ''})
+        .order_by(field).values_list(field, flat=True).distinct()
+    )
+    return list(values[:settings.ADMIN_FILTER_MAX_CHOICES])
+
+
+def filter_choices(model, field):
+    """Distinct values of a column, from the cache when possible"""
+    key = _choices_key(model, field)
+    choices = cache.get(key)
+    if choices is None:
+        choices = _load_choices(model, field)
+        cache.set(key, choices, settings.ADMIN_FILTER_CACHE_SECONDS)
+    return choices
+
+
+def refresh_filter_choices():
+    """Rebuild every cached filter's choices (called after scraper runs and bulk loads)"""
+    for model, field in _CACHED_FILTERS:
+        try:
+            cache.set(_choices_key(model, field), _load_choices(model, field), settings.ADMIN_FILTER_CACHE_SECONDS)
+        except Exception as e:
+            logger.warning(f"Could not refresh admin filter choices for {model.__name__}.{field}: {e}")
+
+
+def cached_values_filter(model, field, title=None):
+    """List filter over the distinct values of `field` without a SELECT DISTINCT per page view"""
+    _CACHED_FILTERS.append((model, field))
+
+    class CachedValuesFilter(admin.SimpleListFilter):
+        parameter_name = field
+
+        def lookups(self, request, model_admin):
+            return [(value, value) for value in filter_choices(model, field)]
+
+        def queryset(self, request, queryset):
+            if self.value():
+                return queryset.filter(**{field: self.value()})
+            return queryset
+
+    CachedValuesFilter.title = title or model._meta.get_field(field).verbose_name
+    CachedValuesFilter.__name__ = f"Cached{field.title().replace('_', '')}Filter"
+    return CachedValuesFilter
+
+
+def boolean_mode_query(search_term):
+    """'smith roof' -> '+smith* +roof*' (every word required, prefix match)"""
+    words = re.findall(r'\w+', search_term)
+    return ' '.join(f"+{word}*" for word in words if len(word) >= FULLTEXT_MIN_WORD)
+
+
+class FullTextSearchMixin:
+    """ModelAdmin search through indexes instead of LIKE '%term%' on every column
+
+    fulltext_fields must be exactly the columns of one MySQL FULLTEXT index;
+    exact_search_fields are matched with = (unique/indexed identifiers) and
+    prefix_search_fields with LIKE 'term%' (e.g. names in a dimension table).
+    Other backends, and terms with no indexable word, use the normal search.
+    """
+    fulltext_fields = ()
+    exact_search_fields = ()
+    prefix_search_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        connection = connections[queryset.db]
+        query = boolean_mode_query(search_term) if search_term else ''
+        if connection.vendor != 'mysql' or not self.fulltext_fields or not query:
+            return super().get_search_results(request, queryset, search_term)
+
+        qn = connection.ops.quote_name
+        table = qn(queryset.model._meta.db_table)
+        columns = ', '.join(
+            f"{table}.{qn(queryset.model._meta.get_field(name).column)}" for name in self.fulltext_fields
+        )
+        term = search_term.strip()
+        condition = Q(RawSQL(f"MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)", [query], output_field=BooleanField()))
+        for name in self.exact_search_fields:
+            condition |= Q(**{name: term})
+        for name in self.prefix_search_fields:
+            condition |= Q(**{f"{name}__istartswith": term})
+        return queryset.filter(condition), False
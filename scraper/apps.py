@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ScraperConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scraper'
+
+    def ready(self):
+        # Keep the permit rollup cube and heatmap grid in step with single-row saves and deletes
+        from . import heatmap, rollups  # noqa: F401
@@ -0,0 +1,87 @@
+"""
+Interned dimension values for permits.
+
+City, party (contractor/applicant/owner/architect) and data source names come
+from a small vocabulary, so Permit stores integer foreign keys into
+dim_cities, dim_parties and dim_data_sources instead of repeating the strings
+on every row. The API and exports still expose the names.
+
+Bulk writers resolve names through a DimensionCache: every name in a batch is
+looked up in one query, missing ones are inserted in one more, and the
+name <-> id maps are kept for the rest of the run.
+"""
+
+from .models import City, DataSource, Party
+
+# (permit dict / API key, Permit foreign key, dimension model)
+PERMIT_DIMENSIONS = [
+    ('city', 'city', City),
+    ('contractor_name', 'contractor', Party),
+    ('applicant_name', 'applicant', Party),
+    ('owner_name', 'owner', Party),
+    ('architect_name', 'architect', Party),
+    ('data_source', 'data_source', DataSource),
+]
+
+# Foreign keys to select_related when the names are needed
+PERMIT_DIMENSION_FIELDS = [field for _, field, _ in PERMIT_DIMENSIONS]
+
+
+def clean_name(value):
+    """Dimension name for a raw value; empty values have no dimension row"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value[:200] or None
+
+
+class DimensionCache:
+    """name <-> id maps for one dimension table, filled a batch at a time"""
+
+    def __init__(self, model):
+        self.model = model
+        self.ids = {}
+        self.names = {}
+
+    def _remember(self, rows):
+        for pk, name in rows:
+            self.ids[name] = pk
+            self.names[pk] = name
+
+    def resolve(self, names):
+        """Make sure every name has an id, inserting the new ones"""
+        missing = {n for n in map(clean_name, names) if n is not None and n not in self.ids}
+        if not missing:
+            return
+        self._remember(self.model.objects.filter(name__in=missing).values_list('id', 'name'))
+        missing -= self.ids.keys()
+        if missing:
+            # ignore_conflicts: a concurrent run may insert the same name first
+            self.model.objects.bulk_create([self.model(name=name) for name in missing], ignore_conflicts=True)
+            self._remember(self.model.objects.filter(name__in=missing).values_list('id', 'name'))
+
+    def load_ids(self, ids):
+        """Make sure names are known for these ids (e.g. of stored permits)"""
+        missing = {pk for pk in ids if pk is not None and pk not in self.names}
+        if missing:
+            self._remember(self.model.objects.filter(id__in=missing).values_list('id', 'name'))
+
+    def id_for(self, name):
+        name = clean_name(name)
+        return None if name is None else self.ids[name]
+
+    def name_for(self, pk):
+        return None if pk is None else self.names[pk]
+
+
+def dimension_caches():
+    """One DimensionCache per dimension model, for one ingest run"""
+    return {model: DimensionCache(model) for model in {model for _, _, model in PERMIT_DIMENSIONS}}
+
+
+def id_for_name(model, name):
+    """Id of an existing dimension row, or None"""
+    name = clean_name(name)
+    if name is None:
+        return None
+    return model.objects.filter(name=name).values_list('id', flat=True).first()
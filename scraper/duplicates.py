@@ -0,0 +1,288 @@
+"""
+Near-duplicate permit detection.
+
+Cities sometimes re-file the same job under a new permit number, so the
+(city, permit_id) key never sees it twice. Each permit is reduced to a
+document - its normalized address and description - and the set of
+character shingles of that document. Two permits are duplicates when, in the
+same city and with the same house number, their shingle sets have a Jaccard
+similarity of at least settings.DUPLICATE_MATCH_THRESHOLD and their estimated
+costs are within settings.DUPLICATE_COST_TOLERANCE.
+
+Comparing every pair does not scale, so candidates come from MinHash LSH:
+a permit's MinHash signature (NUM_BANDS x BAND_ROWS hash minimums) is cut
+into bands, and each band (with the city and house number) hashes to a
+bucket stored in PermitLshBucket. Permits sharing any bucket are candidates -
+pairs at the threshold almost always share one (about 97% at 0.8),
+dissimilar pairs almost never - and only candidates are compared exactly.
+
+The buckets are persisted, so each run only signs the permits it inserted
+or whose address, description or cost changed, and looks up the buckets
+those fall into. Matches join (or merge) DuplicateClusters; Permit.duplicate_cluster
+points at the cluster. `manage.py find_duplicates` indexes permits loaded
+outside the scraper, and --rebuild recomputes every cluster.
+"""
+
+import hashlib
+import logging
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef
+
+from .geocoding import normalize_street
+from .models import DuplicateCluster, Permit, PermitLshBucket
+
+logger = logging.getLogger('scraper')
+
+DETECT_BATCH_SIZE = 5000
+
+# 12 bands of 6 rows: candidate probability 1 - (1 - s^6)^12 for similarity s
+NUM_BANDS = 12
+BAND_ROWS = 6
+SHINGLE_SIZE = 5
+
+# Fields a permit's document is built from; changing one re-indexes the permit
+DOCUMENT_FIELDS = ['city', 'full_address', 'project_description', 'estimated_cost']
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_permutations = None
+
+
+def _hash_functions():
+    """Fixed (a, b) pairs of the universal hashes - buckets must match across runs"""
+    global _permutations
+    if _permutations is None:
+        import numpy as np
+
+        rng = np.random.RandomState(20240601)
+        count = NUM_BANDS * BAND_ROWS
+        # a < 2^29 and shingle hashes < 2^32 keep a * x + b below 2^63
+        _permutations = (
+            rng.randint(1, 1 << 29, size=count, dtype=np.uint64),
+            rng.randint(0, 1 << 29, size=count, dtype=np.uint64),
+        )
+    return _permutations
+
+
+def _text(value):
+    text = unicodedata.normalize('NFKD', str(value or '')).encode('ascii', 'ignore').decode().lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def house_number(address):
+    """Leading house number of an address ('123-45 W 3rd St' -> '123-45'), '' if none"""
+    match = re.match(r'\s*(\d+[a-z]?(?:-\d+)?)\b', str(address or '').lower())
+    return match.group(1) if match else ''
+
+
+def document(full_address, project_description):
+    """Comparable text of a permit: '123 W. 3rd St' + 'Roof repair' -> '123 west 3rd street | roof repair'"""
+    address = f"{house_number(full_address)} {normalize_street(full_address or '')}".strip()
+    return f"{address} | {_text(project_description)}"
+
+
+def shingles(text):
+    """Hashes (CRC32, stable across processes) of the text's character shingles"""
+    if len(text) <= SHINGLE_SIZE:
+        return {zlib.crc32(text.encode())}
+    return {zlib.crc32(text[i:i + SHINGLE_SIZE].encode()) for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(shingle_hashes):
+    """MinHash signature: the minimum of each hash function over the shingles"""
+    import numpy as np
+
+    a, b = _hash_functions()
+    values = np.fromiter(shingle_hashes, dtype=np.uint64, count=len(shingle_hashes))
+    return ((np.outer(values, a) + b) % _MERSENNE_PRIME).min(axis=0)
+
+
+def buckets(city_id, house, minhashes):
+    """LSH bucket of each band, as signed 64-bit ints"""
+    result = []
+    for band in range(NUM_BANDS):
+        rows = minhashes[band * BAND_ROWS:(band + 1) * BAND_ROWS]
+        digest = hashlib.blake2b(f"{city_id}:{house}:{band}:".encode() + rows.tobytes(), digest_size=8).digest()
+        result.append(int.from_bytes(digest, 'big', signed=True))
+    return result
+
+
+def _insert_buckets(rows):
+    """Plain multi-row INSERTs - NUM_BANDS rows per permit, too many for model instances"""
+    ops = connection.ops
+    sql = (
+        f"INSERT INTO {ops.quote_name(PermitLshBucket._meta.db_table)} "
+        f"({ops.quote_name('permit_id')}, {ops.quote_name('bucket')}) VALUES (%s, %s)"
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), 5000):
+            cursor.executemany(sql, rows[start:start + 5000])
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class _Clusters:
+    """Union-find over permit ids"""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        if parent != item:
+            parent = self.parent[item] = self.find(parent)
+        return parent
+
+    def union(self, a, b):
+        self.parent[self.find(a)] = self.find(b)
+
+    def groups(self):
+        groups = defaultdict(list)
+        for item in self.parent:
+            groups[self.find(item)].append(item)
+        return list(groups.values())
+
+
+def _surviving(cluster_id, merged):
+    """The cluster a cluster id ended up in after the merges recorded in merged"""
+    while cluster_id in merged:
+        cluster_id = merged[cluster_id]
+    return cluster_id
+
+
+class DuplicateDetector:
+    """Indexes permits into the LSH buckets and clusters the duplicates it finds"""
+
+    def __init__(self, threshold=None, cost_tolerance=None, max_bucket_size=None):
+        self.threshold = threshold if threshold is not None else settings.DUPLICATE_MATCH_THRESHOLD
+        self.cost_tolerance = cost_tolerance if cost_tolerance is not None else settings.DUPLICATE_COST_TOLERANCE
+        self.max_bucket_size = max_bucket_size or settings.DUPLICATE_MAX_BUCKET_SIZE
+
+    def _same_job(self, a, b):
+        cost_a, cost_b = Decimal(a['estimated_cost'] or 0), Decimal(b['estimated_cost'] or 0)
+        if abs(cost_a - cost_b) > Decimal(str(self.cost_tolerance)) * max(cost_a, cost_b):
+            return False
+        return jaccard(a['shingles'], b['shingles']) >= self.threshold
+
+    @staticmethod
+    def _load(ids):
+        rows = {}
+        ids = list(ids)
+        for start in range(0, len(ids), 1000):
+            for row in Permit.objects.filter(id__in=ids[start:start + 1000]).values(
+                'id', 'city_id', 'full_address', 'project_description', 'estimated_cost', 'duplicate_cluster_id'
+            ):
+                text = document(row['full_address'], row['project_description'])
+                row['house'] = house_number(row['full_address'])
+                row['shingles'] = shingles(text)
+                rows[row['id']] = row
+        return rows
+
+    def _index_batch(self, ids):
+        """Re-index one batch of permits; returns the number of duplicate pairs found"""
+        permits = self._load(ids)
+        signed = {}
+        for permit_id, row in permits.items():
+            if row['shingles']:
+                signed[permit_id] = buckets(row['city_id'], row['house'], signature(row['shingles']))
+
+        with transaction.atomic():
+            # Forget the batch's old buckets and clusters; matching below puts them back
+            PermitLshBucket.objects.filter(permit_id__in=permits).delete()
+            left = {row['duplicate_cluster_id'] for row in permits.values()} - {None}
+            Permit.objects.filter(id__in=permits, duplicate_cluster__isnull=False).update(duplicate_cluster=None)
+
+            members = defaultdict(list)  # bucket -> permit ids
+            wanted = sorted({bucket for keys in signed.values() for bucket in keys})
+            for start in range(0, len(wanted), 1000):
+                for bucket, permit_id in PermitLshBucket.objects.filter(
+                    bucket__in=wanted[start:start + 1000]
+                ).values_list('bucket', 'permit_id'):
+                    members[bucket].append(permit_id)
+            for permit_id, keys in signed.items():
+                for bucket in keys:
+                    members[bucket].append(permit_id)
+
+            candidates = set()
+            for permit_id, keys in signed.items():
+                others = set()
+                for bucket in keys:
+                    block = members[bucket]
+                    # A huge bucket is boilerplate (the same filing text over and over), not one job
+                    if len(block) <= self.max_bucket_size:
+                        others.update(block)
+                others.discard(permit_id)
+                candidates.update((min(permit_id, other), max(permit_id, other)) for other in others)
+            permits.update(self._load({other for pair in candidates for other in pair} - permits.keys()))
+
+            clusters = _Clusters()
+            pairs = 0
+            for a, b in candidates:
+                if self._same_job(permits[a], permits[b]):
+                    clusters.union(a, b)
+                    pairs += 1
+            # Cluster ids in `permits` were read before any merge; a group may name one merged away since
+            merged = {}
+            for group in clusters.groups():
+                existing = {permits[permit_id]['duplicate_cluster_id'] for permit_id in group if permit_id not in ids}
+                self._join(group, existing, merged)
+
+            _insert_buckets([(permit_id, bucket) for permit_id, keys in signed.items() for bucket in keys])
+            # Clusters the batch's permits left may be down to one member
+            left = {_surviving(cluster_id, merged) for cluster_id in left}
+            if left:
+                DuplicateCluster.objects.filter(id__in=left).annotate(size=Count('permits')).filter(size__lt=2).delete()
+        return pairs
+
+    @staticmethod
+    def _join(group, existing, merged):
+        """
+        Put a group of matching permits in one cluster, merging the clusters they were in.
+        merged maps the clusters merged away so far to the cluster they went into, and is updated.
+        """
+        existing = sorted({_surviving(cluster_id, merged) for cluster_id in existing - {None}})
+        if existing:
+            cluster = DuplicateCluster.objects.get(id=existing[0])
+            cluster.save(update_fields=['updated_at'])
+            if existing[1:]:
+                Permit.objects.filter(duplicate_cluster_id__in=existing[1:]).update(duplicate_cluster=cluster)
+                DuplicateCluster.objects.filter(id__in=existing[1:]).delete()
+                merged.update((cluster_id, cluster.id) for cluster_id in existing[1:])
+        else:
+            cluster = DuplicateCluster.objects.create()
+        Permit.objects.filter(id__in=group).update(duplicate_cluster=cluster)
+
+    def index(self, permits):
+        """Index every permit in a queryset, in batches; returns the number of duplicate pairs found"""
+        pairs = 0
+        last_id = 0
+        while True:
+            ids = list(permits.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:DETECT_BATCH_SIZE])
+            if not ids:
+                return pairs
+            last_id = ids[-1]
+            pairs += self._index_batch(set(ids))
+
+
+def find_duplicates(rebuild=False):
+    """Index every permit not in the LSH index yet (all of them with rebuild=True)"""
+    if rebuild:
+        with transaction.atomic():
+            PermitLshBucket.objects.all().delete()
+            Permit.objects.filter(duplicate_cluster__isnull=False).update(duplicate_cluster=None)
+            DuplicateCluster.objects.all().delete()
+    unindexed = Permit.objects.filter(~Exists(PermitLshBucket.objects.filter(permit_id=OuterRef('pk'))))
+    pairs = DuplicateDetector().index(unindexed)
+    logger.info(f"Found {pairs} near-duplicate permit pairs")
+    return pairs
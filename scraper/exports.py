@@ -0,0 +1,272 @@
+"""
+Permit CSV exports for the admin and the API.
+
+Rows are read as plain tuples (values_list) in chunks and written straight
+to the client through a StreamingHttpResponse, so an export never holds more
+than one chunk in memory. Rows keep the admin's order (newest issue date
+first) and each chunk starts after the last (issue_date, created_at, pk) of
+the one before, rather than using QuerySet.iterator(): mysqlclient buffers
+the whole result set on the client, while each keyset chunk is a bounded
+range scan of permits_issue_created_idx.
+
+Under ASGI, astream_permits_csv() streams the same rows from an async
+generator: each chunk is fetched in a worker thread (sync_to_async) and the
+event loop serves other clients while a slow one drains its chunk, so a
+long download no longer holds a whole worker.
+
+Selections larger than EXPORT_BACKGROUND_ROWS, or ones explicitly sent to the
+background, become an ExportJob: a worker thread writes the CSV under
+EXPORT_DIR, prefixed with the job id so two jobs started in the same second
+never share a file, and the file is downloaded from the ExportJob admin once done.
+The thread lives in the web worker, so it dies when the worker is recycled;
+it bumps the job's heartbeat after every chunk, and fail_stale_jobs() marks
+jobs that have gone quiet for EXPORT_JOB_STALE_SECONDS as failed.
+"""
+
+import os
+import csv
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import ExportJob
+
+logger = logging.getLogger('scraper')
+
+# (header, field) in export order; interned names are read through their dimension table
+PERMIT_EXPORT_COLUMNS = [
+    ('Permit ID', 'permit_id'),
+    ('City', 'city__name'),
+    ('Issue Date', 'issue_date'),
+    ('Full Address', 'full_address'),
+    ('Borough/Area', 'borough_area'),
+    ('ZIP Code', 'zip_code'),
+    ('Project Description', 'project_description'),
+    ('Estimated Cost', 'estimated_cost'),
+    ('Contractor Name', 'contractor__name'),
+    ('Contractor License', 'contractor_license'),
+    ('Applicant Name', 'applicant__name'),
+    ('Owner Name', 'owner__name'),
+    ('Architect Name', 'architect__name'),
+    ('License Status', 'license_status'),
+    ('Business Address', 'business_address'),
+    ('Business Phone', 'business_phone'),
+    ('Data Source', 'data_source__name'),
+    ('Scraped At', 'scraped_at'),
+]
+
+
+class Echo:
+    """File-like object whose write() hands the CSV line back to the generator"""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+# Export order, as in the admin change list; pk breaks ties so chunks never skip or repeat a row
+EXPORT_ORDER = ['-issue_date', '-created_at', '-pk']
+KEYSET_FIELDS = ['issue_date', 'created_at', 'pk']
+
+
+def _next_chunk(queryset, fields, last, chunk_size):
+    """Queryset for the chunk after the row whose keyset values are last (None for the first)"""
+    if last is not None:
+        issue_date, created_at, pk = last
+        queryset = queryset.filter(issue_date__lte=issue_date).filter(
+            models.Q(issue_date__lt=issue_date)
+            | models.Q(created_at__lt=created_at)
+            | models.Q(created_at=created_at, pk__lt=pk)
+        )
+    return queryset.order_by(*EXPORT_ORDER).values_list(*KEYSET_FIELDS, *fields)[:chunk_size]
+
+
+def iter_value_rows(queryset, fields, chunk_size=None):
+    """values_list rows of a queryset in export order, one keyset chunk at a time"""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    last = None
+    while True:
+        rows = list(_next_chunk(queryset, fields, last, chunk_size))
+        if not rows:
+            return
+        for row in rows:
+            yield row[len(KEYSET_FIELDS):]
+        last = rows[-1][:len(KEYSET_FIELDS)]
+
+
+async def aiter_value_chunks(queryset, fields, chunk_size=None):
+    """Keyset chunks of iter_value_rows() as lists, each one read in a worker thread"""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    last = None
+    while True:
+        rows = await sync_to_async(list)(_next_chunk(queryset, fields, last, chunk_size))
+        if not rows:
+            return
+        yield [row[len(KEYSET_FIELDS):] for row in rows]
+        last = rows[-1][:len(KEYSET_FIELDS)]
+
+
+def iter_permit_csv_rows(queryset):
+    """Header, then one list of cell values per permit"""
+    yield [header for header, _ in PERMIT_EXPORT_COLUMNS]
+    fields = [field for _, field in PERMIT_EXPORT_COLUMNS]
+    for row in iter_value_rows(queryset, fields):
+        yield [_cell(value) for value in row]
+
+
+def stream_permits_csv(queryset, filename):
+    """StreamingHttpResponse with the permits in queryset as a CSV attachment"""
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in iter_permit_csv_rows(queryset)),
+        content_type='text/csv'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+async def astream_permits_csv(queryset, filename):
+    """stream_permits_csv() for async views: the response iterates an async generator"""
+    writer = csv.writer(Echo())
+    fields = [field for _, field in PERMIT_EXPORT_COLUMNS]
+
+    async def lines():
+        yield writer.writerow([header for header, _ in PERMIT_EXPORT_COLUMNS])
+        # One body message per chunk; a message per row would cost more than the query
+        async for rows in aiter_value_chunks(queryset, fields):
+            yield ''.join(writer.writerow([_cell(value) for value in row]) for row in rows)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def estimate_rows(queryset, limit):
+    """Number of rows in queryset, counting no further than limit + 1"""
+    return queryset.order_by().values('pk')[:limit + 1].count()
+
+
+def write_permits_csv(queryset, path, progress=None):
+    """Write the permits in queryset to a CSV file; returns the number of permits
+
+    progress(rows written) is called after every EXPORT_CHUNK_SIZE rows.
+    """
+    count = -1  # header row
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for row in iter_permit_csv_rows(queryset):
+            writer.writerow(row)
+            count += 1
+            if progress is not None and count and count % settings.EXPORT_CHUNK_SIZE == 0:
+                progress(count)
+    return count
+
+
+def export_path(job):
+    """Where the job's CSV is written; the job id keeps same-named exports apart"""
+    return os.path.join(settings.EXPORT_DIR, f"{job.pk}_{job.filename}")
+
+
+def run_export_job(job_id, queryset):
+    """Body of the export thread: write the CSV and record the outcome on the job"""
+    job = ExportJob.objects.get(pk=job_id)
+    job.status = 'running'
+    job.started_at = job.heartbeat_at = timezone.now()
+    job.save(update_fields=['status', 'started_at', 'heartbeat_at'])
+
+    def heartbeat(rows):
+        ExportJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now(), row_count=rows)
+
+    try:
+        os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+        path = job.file_path = job.file_path or export_path(job)
+        job.row_count = write_permits_csv(queryset, path, progress=heartbeat)
+        job.size_bytes = os.path.getsize(path)
+        job.status = 'completed'
+        logger.info(f"Export job {job.pk} wrote {job.row_count} permits to {path}")
+    except Exception as e:
+        logger.error(f"Export job {job.pk} failed: {e}", exc_info=True)
+        job.status = 'failed'
+        job.error_message = str(e)
+    job.completed_at = timezone.now()
+    # Unless fail_stale_jobs() gave up on it meanwhile (and removed the file)
+    ExportJob.objects.filter(pk=job.pk, status='running').update(
+        status=job.status, row_count=job.row_count, file_path=job.file_path, size_bytes=job.size_bytes,
+        error_message=job.error_message, completed_at=job.completed_at,
+    )
+
+
+def start_export_job(queryset, filename, description='', user=None):
+    """Create an ExportJob and run it in a background thread"""
+    fail_stale_jobs()
+    job = ExportJob.objects.create(
+        filename=filename,
+        description=description,
+        requested_by=user.get_username() if user is not None else '',
+    )
+    # Recorded up front so fail_stale_jobs() can remove a partial file
+    job.file_path = export_path(job)
+    job.save(update_fields=['file_path'])
+
+    def worker():
+        try:
+            run_export_job(job.pk, queryset)
+        finally:
+            # Connections are per thread; close the ones this thread opened
+            connections.close_all()
+
+    def start():
+        thread = threading.Thread(target=worker, name=f'export-job-{job.pk}')
+        thread.daemon = True
+        thread.start()
+
+    # The thread must be able to read the job row
+    transaction.on_commit(start)
+    return job
+
+
+def active_job_count():
+    """Jobs queued or running, once the lost ones are failed"""
+    fail_stale_jobs()
+    return ExportJob.objects.filter(status__in=['pending', 'running']).count()
+
+
+def fail_stale_jobs():
+    """Mark jobs whose thread is gone - lost with a recycled or killed worker - as failed"""
+    cutoff = timezone.now() - timedelta(seconds=settings.EXPORT_JOB_STALE_SECONDS)
+    stale = list(ExportJob.objects.filter(
+        # A pending job's thread starts right after its commit, so an old one never started
+        models.Q(status='running', heartbeat_at__lt=cutoff) | models.Q(status='pending', created_at__lt=cutoff)
+    ))
+    for job in stale:
+        logger.warning(f"Export job {job.pk} stopped while {job.status}; marking it failed")
+        if not job.file_path:
+            continue
+        try:
+            os.remove(job.file_path)
+        except FileNotFoundError:
+            pass
+    if stale:
+        ExportJob.objects.filter(pk__in=[job.pk for job in stale], status__in=['pending', 'running']).update(
+            status='failed', completed_at=timezone.now(),
+            error_message='The worker running this export stopped before it finished; start the export again.',
+        )
+    return len(stale)
@@ -0,0 +1,169 @@
+"""
+Geohash and great-circle helpers (no GIS dependencies).
+
+A geohash interleaves longitude and latitude bits into a base-32 string;
+every extra character narrows the cell, and points in the same cell share
+the prefix, so a B-tree index on the geohash column answers "everything in
+this cell" with a prefix range scan.
+
+within_bbox() and within_radius() use that to prune: the query area is
+covered by at most MAX_COVER_CELLS geohash cells, candidates come from those
+index ranges only, and the exact test (lat/lon bounds, or the haversine
+distance) runs in the same SQL query on that small set.
+"""
+
+import math
+from functools import lru_cache
+
+from django.db.models import Q
+from django.db.models.functions import Cos, Radians, Sin
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: index for index, char in enumerate(BASE32)}
+
+# Precision stored on permits (cells of about 5m x 5m)
+GEOHASH_PRECISION = 9
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = 69.0
+
+# Most geohash cells (index range scans) used to cover a query area
+MAX_COVER_CELLS = 16
+
+
+@lru_cache(maxsize=65536)
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point (cached: geocoded permits share a few thousand centroids)"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def bounds(geohash):
+    """(min_lat, min_lon, max_lat, max_lon) of a geohash cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if value >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def decode(geohash):
+    """Centre (lat, lon) of a geohash cell"""
+    min_lat, min_lon, max_lat, max_lon = bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+
+def cell_size(precision):
+    """(height, width) of a cell in degrees at this precision"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in miles"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+
+def bounding_box(latitude, longitude, miles):
+    """(min_lat, min_lon, max_lat, max_lon) around a point, at least `miles` each way"""
+    dlat = miles / MILES_PER_DEGREE_LAT
+    # Longitude degrees shrink towards the poles; use the widest latitude of the box
+    widest = min(abs(latitude) + dlat, 89.9)
+    dlon = miles / (MILES_PER_DEGREE_LAT * math.cos(math.radians(widest)))
+    return (max(latitude - dlat, -90.0), max(longitude - dlon, -180.0),
+            min(latitude + dlat, 90.0), min(longitude + dlon, 180.0))
+
+
+def covering_cells(min_lat, min_lon, max_lat, max_lon, max_cells=MAX_COVER_CELLS, max_precision=GEOHASH_PRECISION):
+    """Geohash cells covering a box, at the finest precision (up to max_precision) needing at most max_cells"""
+    for precision in range(max_precision, 0, -1):
+        height, width = cell_size(precision)
+        rows = range(math.floor((min_lat + 90) / height), math.floor((min(max_lat, 89.999999) + 90) / height) + 1)
+        cols = range(math.floor((min_lon + 180) / width), math.floor((min(max_lon, 179.999999) + 180) / width) + 1)
+        if len(rows) * len(cols) <= max_cells:
+            break
+    return sorted({
+        encode(-90 + (row + 0.5) * height, -180 + (col + 0.5) * width, precision)
+        for row in rows for col in cols
+    })
+
+
+def next_prefix(prefix):
+    """Smallest geohash prefix sorting after every hash starting with `prefix` ('' if none)"""
+    prefix = prefix.rstrip(BASE32[-1])
+    if not prefix:
+        return ''
+    return prefix[:-1] + BASE32[_DECODE[prefix[-1]] + 1]
+
+
+def prefix_ranges(cells):
+    """[(low, high)] geohash ranges for cells, adjacent cells merged into one range"""
+    ranges = []
+    for cell in sorted(cells):
+        high = next_prefix(cell)
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1] = (ranges[-1][0], high)
+        else:
+            ranges.append((cell, high))
+    return ranges
+
+
+def in_cells(min_lat, min_lon, max_lat, max_lon, field='geohash', max_precision=GEOHASH_PRECISION):
+    """Q for rows whose geohash lies in the cells covering the box (index range scans)
+
+    Rows holding coarser geohashes (heatmap grid cells) need max_precision
+    no finer than theirs, so their cells sort inside the ranges.
+    """
+    condition = Q()
+    cells = covering_cells(min_lat, min_lon, max_lat, max_lon, max_precision=max_precision)
+    for low, high in prefix_ranges(cells):
+        # Range instead of startswith: LIKE 'x%' only uses the index under some collations
+        condition |= Q(**{f'{field}__gte': low, f'{field}__lt': high}) if high else Q(**{f'{field}__gte': low})
+    return condition
+
+
+def within_bbox(queryset, min_lat, min_lon, max_lat, max_lon):
+    """Rows of a geocoded queryset inside a latitude/longitude box"""
+    return queryset.filter(
+        in_cells(min_lat, min_lon, max_lat, max_lon),
+        latitude__gte=min_lat, latitude__lte=max_lat, longitude__gte=min_lon, longitude__lte=max_lon,
+    )
+
+
+def within_radius(queryset, latitude, longitude, miles):
+    """Rows of a geocoded queryset within `miles` of a point (great-circle distance, in SQL)"""
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    half_dlat = Sin((Radians('latitude') - lat1) / 2)
+    half_dlon = Sin((Radians('longitude') - lon1) / 2)
+    # Haversine term: distance <= miles exactly when it is <= sin^2(miles / 2R), so no asin/sqrt per row
+    haversine = half_dlat * half_dlat + math.cos(lat1) * Cos(Radians('latitude')) * half_dlon * half_dlon
+    limit = math.sin(min(miles / (2 * EARTH_RADIUS_MILES), math.pi / 2)) ** 2
+    return within_bbox(queryset, *bounding_box(latitude, longitude, miles)).alias(
+        near_haversine=haversine
+    ).filter(near_haversine__lte=limit)
@@ -0,0 +1,183 @@
+"""
+Offline geocoding of permit addresses against a local gazetteer.
+
+Permits only carry full_address, zip_code and borough_area. The geocoder
+looks them up, most precise first, in gazetteer files on disk (no network):
+
+    street  street centroid within the permit's ZIP, then within the city
+    zip     ZIP code centroid
+    area    borough / area centroid of the city
+
+and Permit stores latitude, longitude, their geohash and which of those
+levels matched (geocode_precision). Permits nothing matches stay null.
+
+settings.GEOCODER_GAZETTEER_FILES lists the files to load. The bundled
+scraper/data/gazetteer.csv (kind,city,name,zip,latitude,longitude) covers
+the configured cities' areas, central ZIPs and main streets; add a national
+ZIP file such as the Census ZCTA gazetteer (tab-separated GEOID / INTPTLAT /
+INTPTLONG columns, read as-is) for full ZIP coverage.
+
+Address normalization and whole lookups are memoized, so re-ingesting the
+same addresses - every run re-reads recent permits - costs a dict lookup.
+"""
+
+import csv
+import logging
+import re
+from functools import lru_cache
+
+from django.conf import settings
+
+from . import geo
+
+logger = logging.getLogger('scraper')
+
+# Permit fields written by the geocoder
+LOCATION_FIELDS = ['latitude', 'longitude', 'geohash', 'geocode_precision']
+
+STREET_SUFFIXES = {
+    'st': 'street', 'str': 'street', 'ave': 'avenue', 'av': 'avenue', 'blvd': 'boulevard',
+    'dr': 'drive', 'rd': 'road', 'pl': 'place', 'ln': 'lane', 'ct': 'court', 'ter': 'terrace',
+    'pkwy': 'parkway', 'hwy': 'highway', 'sq': 'square', 'cir': 'circle', 'expy': 'expressway',
+}
+DIRECTIONS = {'n': 'north', 's': 'south', 'e': 'east', 'w': 'west'}
+DIRECTION_NAMES = set(DIRECTIONS.values())
+ORDINAL_WORDS = {
+    'first': '1st', 'second': '2nd', 'third': '3rd', 'fourth': '4th', 'fifth': '5th',
+    'sixth': '6th', 'seventh': '7th', 'eighth': '8th', 'ninth': '9th', 'tenth': '10th',
+}
+# Everything from one of these on is a unit, not the street
+UNIT_WORDS = {'apt', 'unit', 'suite', 'ste', 'fl', 'floor', 'rm', 'room', 'bldg'}
+
+_ORDINAL = re.compile(r'^\d+(st|nd|rd|th)$')
+
+
+def _key(text):
+    return ' '.join(str(text).lower().split())
+
+
+@lru_cache(maxsize=262144)
+def normalize_street(address):
+    """Street part of an address: '123-45 W. 3rd St, Apt 4' -> 'west 3rd street'"""
+    words = re.findall(r'[a-z0-9#]+', str(address).lower().replace('.', ''))
+    # House numbers ('123', '123-45', '12a'), but not numbered streets ('3rd')
+    while words and words[0][0].isdigit() and not _ORDINAL.match(words[0]):
+        words.pop(0)
+    street = []
+    for word in words:
+        if word in UNIT_WORDS or word.startswith('#'):
+            break
+        word = ORDINAL_WORDS.get(word, word)
+        if street:
+            word = STREET_SUFFIXES.get(word, word)
+        street.append(DIRECTIONS.get(word, word))
+    return ' '.join(street)
+
+
+def normalize_zip(zip_code):
+    """Five-digit ZIP ('10001-1234' -> '10001'), or '' when there is none"""
+    match = re.match(r'\s*(\d{5})', str(zip_code or ''))
+    return match.group(1) if match else ''
+
+
+class Gazetteer:
+    """Centroids by (city, street, zip), (city, street), zip and (city, area)"""
+
+    def __init__(self):
+        self.streets = {}
+        self.zips = {}
+        self.areas = {}
+
+    def load(self, path):
+        with open(path, newline='', encoding='utf-8') as handle:
+            delimiter = '\t' if '\t' in handle.readline() else ','
+            handle.seek(0)
+            reader = csv.DictReader(handle, delimiter=delimiter)
+            reader.fieldnames = [name.strip() for name in reader.fieldnames]
+            count = 0
+            for row in reader:
+                if 'GEOID' in row:
+                    # Census ZCTA gazetteer
+                    self.zips[row['GEOID'].strip()] = (float(row['INTPTLAT']), float(row['INTPTLONG']))
+                else:
+                    self._add(row)
+                count += 1
+        logger.info(f"Loaded {count} gazetteer entries from {path}")
+
+    def _add(self, row):
+        point = (float(row['latitude']), float(row['longitude']))
+        kind, city = row['kind'].strip(), _key(row.get('city') or '')
+        if kind == 'zip':
+            self.zips[normalize_zip(row['zip'])] = point
+        elif kind == 'street':
+            self.streets[(city, normalize_street(row['name']), normalize_zip(row.get('zip')))] = point
+        elif kind == 'area':
+            self.areas[(city, _key(row['name']))] = point
+
+    def _street(self, city, street, zip_code):
+        point = self.streets.get((city, street, zip_code))
+        if point is None and street.split(' ', 1)[0] in DIRECTION_NAMES:
+            # 'north michigan avenue' is on 'michigan avenue' unless the gazetteer splits it
+            point = self.streets.get((city, street.split(' ', 1)[-1], zip_code))
+        return point
+
+    def locate(self, city, street, zip_code, area):
+        """(latitude, longitude, precision) of the most precise match, or None"""
+        if street:
+            point = self._street(city, street, zip_code) if zip_code else None
+            if point:
+                return point + ('street',)
+        if zip_code and zip_code in self.zips:
+            return self.zips[zip_code] + ('zip',)
+        if street:
+            point = self._street(city, street, '')
+            if point:
+                return point + ('street',)
+        point = self.areas.get((city, area))
+        if point:
+            return point + ('area',)
+        return None
+
+
+_gazetteer = None
+
+
+def gazetteer():
+    """The loaded gazetteer (read once per process)"""
+    global _gazetteer
+    if _gazetteer is None:
+        loaded = Gazetteer()
+        for path in settings.GEOCODER_GAZETTEER_FILES:
+            try:
+                loaded.load(path)
+            except Exception as e:
+                logger.error(f"Could not load gazetteer {path}: {e}")
+        _gazetteer = loaded
+    return _gazetteer
+
+
+def reload_gazetteer():
+    """Drop the loaded gazetteer and every memoized lookup (after changing the files)"""
+    global _gazetteer
+    _gazetteer = None
+    geocode.cache_clear()
+
+
+@lru_cache(maxsize=262144)
+def geocode(city, full_address, zip_code, borough_area):
+    """(latitude, longitude, geohash, precision) for a permit address, or None"""
+    located = gazetteer().locate(
+        _key(city or ''), normalize_street(full_address or ''), normalize_zip(zip_code), _key(borough_area or '')
+    )
+    if located is None:
+        return None
+    latitude, longitude, precision = located
+    return latitude, longitude, geo.encode(latitude, longitude), precision
+
+
+def location_fields(city, full_address, zip_code, borough_area):
+    """Permit LOCATION_FIELDS values for an address (nulls when it cannot be placed)"""
+    located = geocode(city, full_address, zip_code, borough_area)
+    if located is None:
+        return {'latitude': None, 'longitude': None, 'geohash': None, 'geocode_precision': ''}
+    return dict(zip(LOCATION_FIELDS, located))
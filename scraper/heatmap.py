@@ -0,0 +1,203 @@
+"""
+Precomputed permit heatmap grid.
+
+PermitGridCell holds the permit count and total estimated cost per geohash
+cell x city x issue month x cost anomaly flag, at every precision in
+GRID_PRECISIONS (cells of roughly 156km, 39km, 4.9km and 1.2km). A map view
+at any zoom reads the cells of one precision for a city and month range - a
+few hundred rows - and never touches the permits table. As in the rollup
+cube, flagged costs land in their own cells so the map can leave them out.
+
+Like the rollup cube (scraper/rollups.py) the grid is kept current
+incrementally: ingestion passes the old and new grid position of every
+permit it inserts, moves or re-prices to apply_changes() inside its own
+transaction, and single-row saves/deletes go through the signal handlers
+below. rebuild_grid() recomputes it for bulk loads that bypass the ORM
+(seed_permits, geocode_permits).
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Substr, TruncMonth
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import geo
+from .models import Permit, PermitGridCell
+from .rollups import PermitDeletes, month_start, next_month
+
+logger = logging.getLogger('scraper')
+
+GRID_PRECISIONS = [3, 4, 5, 6]
+DEFAULT_PRECISION = 5
+
+
+def grid_key(city, issue_date, geohash, cost_anomaly=False):
+    """Grid position of one permit, or None when it has no location"""
+    if not geohash:
+        return None
+    if isinstance(issue_date, str):
+        issue_date = date.fromisoformat(issue_date)
+    return (city, month_start(issue_date), geohash[:max(GRID_PRECISIONS)], bool(cost_anomaly))
+
+
+def _recompute(cell):
+    """Reset a cell from the permits table (when the grid had no row to subtract from)"""
+    upper = geo.next_prefix(cell.geohash)
+    permits = Permit.objects.filter(
+        city__name=cell.city, issue_date__gte=cell.month, issue_date__lt=next_month(cell.month),
+        geohash__gte=cell.geohash, cost_anomaly=cell.cost_anomaly,
+    )
+    if upper:
+        permits = permits.filter(geohash__lt=upper)
+    totals = permits.aggregate(count=Count('id'), total=Sum('estimated_cost'))
+    if not totals['count']:
+        if cell.pk:
+            cell.delete()
+        return
+    cell.permit_count = totals['count']
+    cell.total_cost = totals['total']
+    cell.save()
+
+
+def apply_changes(removed=(), added=()):
+    """Adjust the grid for permits leaving and entering positions
+
+    removed/added are iterables of (grid_key(), cost); None keys (no location)
+    are skipped. Must run inside the transaction that writes the permits.
+    """
+    deltas = defaultdict(lambda: [0, Decimal(0)])
+    for sign, entries in ((-1, removed), (1, added)):
+        for key, cost in entries:
+            if key is None:
+                continue
+            city, month, geohash, cost_anomaly = key
+            for precision in GRID_PRECISIONS:
+                delta = deltas[(precision, geohash[:precision], city, month, cost_anomaly)]
+                delta[0] += sign
+                delta[1] += sign * Decimal(cost)
+    deltas = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    if not deltas:
+        return
+
+    cells = {
+        (c.precision, c.geohash, c.city, c.month, c.cost_anomaly): c
+        for c in PermitGridCell.objects.select_for_update().filter(
+            geohash__in={key[1] for key in deltas}, month__in={key[3] for key in deltas}
+        )
+    }
+    new_cells, changed_cells, stale_cells = [], [], []
+    for key, (count, total) in deltas.items():
+        cell = cells.get(key)
+        if cell is None:
+            precision, geohash, city, month, cost_anomaly = key
+            cell = PermitGridCell(
+                precision=precision, geohash=geohash, city=city, month=month, cost_anomaly=cost_anomaly
+            )
+            if count > 0:
+                cell.permit_count, cell.total_cost = count, total
+                new_cells.append(cell)
+            else:
+                # Removal from a cell that was never gridded - rebuild it from the rows
+                stale_cells.append(cell)
+            continue
+        cell.permit_count += count
+        cell.total_cost += total
+        changed_cells.append(cell)
+
+    PermitGridCell.objects.bulk_create(new_cells, batch_size=1000)
+    empty = [cell.pk for cell in changed_cells if cell.permit_count <= 0]
+    if empty:
+        PermitGridCell.objects.filter(pk__in=empty).delete()
+    PermitGridCell.objects.bulk_update(
+        [cell for cell in changed_cells if cell.permit_count > 0], ['permit_count', 'total_cost'], batch_size=1000
+    )
+    for cell in stale_cells:
+        _recompute(cell)
+
+
+def rebuild_grid():
+    """Recompute the whole grid: one GROUP BY at the finest precision, rolled up in Python"""
+    finest = max(GRID_PRECISIONS)
+    rows = (
+        Permit.objects.filter(geohash__isnull=False)
+        .annotate(grid_city=F('city__name'), grid_month=TruncMonth('issue_date'), grid_cell=Substr('geohash', 1, finest))
+        .values('grid_city', 'grid_month', 'grid_cell', 'cost_anomaly')
+        .annotate(count=Count('id'), total=Sum('estimated_cost'))
+        .order_by()
+    )
+    totals = defaultdict(lambda: [0, Decimal(0)])
+    for row in rows.iterator():
+        for precision in GRID_PRECISIONS:
+            cell = totals[
+                (precision, row['grid_cell'][:precision], row['grid_city'], row['grid_month'], row['cost_anomaly'])
+            ]
+            cell[0] += row['count']
+            cell[1] += row['total']
+    cells = [
+        PermitGridCell(precision=precision, geohash=geohash, city=city, month=month, cost_anomaly=cost_anomaly,
+                       permit_count=count, total_cost=total)
+        for (precision, geohash, city, month, cost_anomaly), (count, total) in totals.items()
+    ]
+    with transaction.atomic():
+        PermitGridCell.objects.all().delete()
+        PermitGridCell.objects.bulk_create(cells, batch_size=1000)
+    logger.info(f"Rebuilt permit heatmap grid: {len(cells)} cells")
+    return len(cells)
+
+
+# Single-row saves and deletes (admin edits, API). Bulk ingestion calls
+# apply_changes() itself - bulk_create/bulk_update send no signals.
+
+@receiver(pre_save, sender=Permit)
+def _remember_position(sender, instance, raw=False, **kwargs):
+    instance._grid_before = None
+    if raw or instance.pk is None:
+        return
+    before = sender.objects.filter(pk=instance.pk).values(
+        'city__name', 'issue_date', 'geohash', 'estimated_cost', 'cost_anomaly'
+    ).first()
+    if before:
+        instance._grid_before = (
+            grid_key(before['city__name'], before['issue_date'], before['geohash'], before['cost_anomaly']),
+            before['estimated_cost'],
+        )
+
+
+@receiver(post_save, sender=Permit)
+def _update_position(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_grid_before', None)
+    after = (
+        grid_key(instance.city.name, instance.issue_date, instance.geohash, instance.cost_anomaly),
+        Decimal(str(instance.estimated_cost)),
+    )
+    if before != after:
+        with transaction.atomic():
+            apply_changes(removed=[before] if before else [], added=[after])
+
+
+def _remove_deleted(permits, city_names):
+    apply_changes(removed=[
+        (grid_key(city_names[p.city_id], p.issue_date, p.geohash, p.cost_anomaly), p.estimated_cost) for p in permits
+    ])
+
+
+# Queryset deletes are applied a whole delete at a time (see rollups.PermitDeletes)
+_deletes = PermitDeletes(_remove_deleted)
+
+
+@receiver(pre_delete, sender=Permit)
+def _delete_starting(sender, **kwargs):
+    _deletes.starting()
+
+
+@receiver(post_delete, sender=Permit)
+def _remove_from_grid(sender, instance, **kwargs):
+    _deletes.deleted(instance)
@@ -0,0 +1,291 @@
+"""
+Bulk permit ingestion with an append-only change log.
+
+save_permits() replaces the per-row update_or_create of a scraper run. For
+each batch it loads the stored versions of the incoming permit ids in one
+query, inserts new permits with bulk_create, rewrites only the permits whose
+data changed with bulk_update, and just bumps scraped_at for the rest.
+
+New and moved permits are applied to the PermitRollup cube and the heatmap
+grid in the same transaction (see scraper/rollups.py, scraper/heatmap.py).
+The engine re-scores every permit it returns for cost anomalies; a stored
+permit whose flag flipped is rewritten (without a version) and moves cells.
+
+Every changed permit gets one PermitVersion row holding the *previous* values
+of the fields that changed ({field: old value}), keyed by permit and run.
+The current row plus the versions after a point in time are enough to
+rebuild the permit as it was then - see permit_as_of().
+
+Contractor names seen for the first time are resolved to a ContractorEntity
+after each batch (see scraper/resolution.py). New and changed permits are
+geocoded from their address (see scraper/geocoding.py), and those whose
+address, description or cost is new are checked for near-duplicates (see
+scraper/duplicates.py).
+"""
+
+import logging
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import heatmap
+from .dimensions import PERMIT_DIMENSIONS, clean_name, dimension_caches, id_for_name
+from .duplicates import DOCUMENT_FIELDS, DuplicateDetector
+from .geocoding import LOCATION_FIELDS, location_fields
+from .models import Party, Permit, PermitVersion
+from .replicas import bump_watermark
+from .resolution import ContractorResolver
+from .rollups import apply_changes, cell_for
+
+logger = logging.getLogger('scraper')
+
+INGEST_BATCH_SIZE = 1000
+
+# Fields compared between runs (permit dict / API names); scraped_at changes on
+# every run and is not history
+TRACKED_FIELDS = [
+    'city', 'issue_date', 'full_address', 'borough_area', 'zip_code',
+    'project_description', 'work_type', 'estimated_cost', 'contractor_name', 'contractor_license',
+    'applicant_name', 'owner_name', 'architect_name', 'license_status',
+    'business_address', 'business_phone', 'data_source',
+]
+
+# Set by the engine's anomaly stage; stored with the permit but not versioned
+ANOMALY_FIELDS = ['cost_anomaly', 'cost_anomaly_score']
+
+# Tracked names stored as foreign keys into dimension tables: key -> (field, model)
+DIMENSION_KEYS = {key: (field, model) for key, field, model in PERMIT_DIMENSIONS}
+PLAIN_FIELDS = [name for name in TRACKED_FIELDS if name not in DIMENSION_KEYS]
+
+
+def permit_fields(permit_data):
+    """Tracked values (dimension names as strings) and scraped_at for one engine permit dict"""
+    fields = {
+        'issue_date': datetime.strptime(permit_data['issue_date'], '%Y-%m-%d').date(),
+        'scraped_at': datetime.strptime(permit_data['scraped_at'], '%Y-%m-%d %H:%M:%S'),
+        'estimated_cost': Decimal(str(permit_data['estimated_cost'])),
+        'cost_anomaly': bool(permit_data.get('cost_anomaly')),
+        'cost_anomaly_score': permit_data.get('cost_anomaly_score'),
+    }
+    for name in TRACKED_FIELDS:
+        if name in DIMENSION_KEYS:
+            fields[name] = clean_name(permit_data.get(name))
+        elif name not in fields:
+            fields[name] = permit_data.get(name)
+    return fields
+
+
+def _json_value(value):
+    """Version diffs are JSON - dates and decimals are stored as strings"""
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _normalize(name, value):
+    """Value as the database would hand it back, so unchanged rows compare equal"""
+    if value is None:
+        return None
+    if name in DIMENSION_KEYS:
+        return clean_name(value)
+    return Permit._meta.get_field(name).to_python(value)
+
+
+def _model_values(fields, caches):
+    """Permit constructor kwargs: dimension names become foreign key ids, plus the geocoded location"""
+    values = location_fields(fields['city'], fields['full_address'], fields['zip_code'], fields['borough_area'])
+    for name, value in fields.items():
+        if name in DIMENSION_KEYS:
+            field, model = DIMENSION_KEYS[name]
+            values[f'{field}_id'] = caches[model].id_for(value)
+        else:
+            values[name] = value
+    return values
+
+
+def _stored_permits(permit_ids, caches):
+    """permit_id -> tracked values of the stored rows, dimension ids turned back into names"""
+    rows = list(Permit.objects.filter(permit_id__in=permit_ids).values(
+        'id', 'permit_id', 'geohash', 'cost_anomaly', *PLAIN_FIELDS, *(f'{field}_id' for field, _ in DIMENSION_KEYS.values())
+    ))
+    for field, model in DIMENSION_KEYS.values():
+        caches[model].load_ids(row[f'{field}_id'] for row in rows)
+    stored = {}
+    for row in rows:
+        for name, (field, model) in DIMENSION_KEYS.items():
+            row[name] = caches[model].name_for(row.pop(f'{field}_id'))
+        stored[row['permit_id']] = row
+    return stored
+
+
+def _grid_position(permit, geohash):
+    """(heatmap grid position, cost) of a permit dict or stored row"""
+    return (
+        heatmap.grid_key(permit['city'], permit['issue_date'], geohash, permit['cost_anomaly']),
+        permit['estimated_cost'],
+    )
+
+
+def _save_batch(batch, scraper_run, now, caches, resolver, detector):
+    # Intern every dimension name of the batch up front (a query or two per table)
+    for name, (field, model) in DIMENSION_KEYS.items():
+        caches[model].resolve(fields[name] for fields in batch.values())
+    existing = _stored_permits(list(batch), caches)
+
+    new_permits, changed_permits, versions = [], [], []
+    reflagged = []  # Unchanged permits whose cost anomaly flag the engine re-scored
+    redocumented = []  # permit_ids to (re-)index for near-duplicate detection
+    touched = {}  # scraped_at -> ids of unchanged permits
+    left_cells, entered_cells = [], []  # (rollup cell, cost) for the rollup cube
+    left_grid, entered_grid = [], []  # (grid position, cost) for the heatmap grid
+    for permit_id, fields in batch.items():
+        cell = cell_for(
+            fields['city'], fields['issue_date'], fields['work_type'], fields['estimated_cost'], fields['cost_anomaly']
+        )
+        stored = existing.get(permit_id)
+        if stored is None:
+            values = _model_values(fields, caches)
+            new_permits.append(Permit(permit_id=permit_id, **values))
+            redocumented.append(permit_id)
+            entered_cells.append((cell, fields['estimated_cost']))
+            entered_grid.append(_grid_position(fields, values['geohash']))
+            continue
+        changes = {
+            name: _json_value(stored[name]) for name in TRACKED_FIELDS
+            if _normalize(name, fields[name]) != stored[name]
+        }
+        if changes:
+            values = _model_values(fields, caches)
+            changed_permits.append(Permit(id=stored['id'], permit_id=permit_id, updated_at=now, **values))
+            versions.append(PermitVersion(
+                permit_id=stored['id'], scraper_run=scraper_run, changed_at=now, changes=changes
+            ))
+            if changes.keys() & set(DOCUMENT_FIELDS):
+                redocumented.append(permit_id)
+            before = (
+                cell_for(stored['city'], stored['issue_date'], stored['work_type'], stored['estimated_cost'],
+                         stored['cost_anomaly']),
+                stored['estimated_cost'],
+            )
+            if before != (cell, fields['estimated_cost']):
+                left_cells.append(before)
+                entered_cells.append((cell, fields['estimated_cost']))
+            before = _grid_position(stored, stored['geohash'])
+            after = _grid_position(fields, values['geohash'])
+            if before != after:
+                left_grid.append(before)
+                entered_grid.append(after)
+        elif fields['cost_anomaly'] != stored['cost_anomaly']:
+            # The engine's cost statistics moved since the permit was stored; not history,
+            # but the cube and grid must follow
+            reflagged.append(Permit(
+                id=stored['id'], cost_anomaly=fields['cost_anomaly'],
+                cost_anomaly_score=fields['cost_anomaly_score'], scraped_at=fields['scraped_at'],
+            ))
+            left_cells.append((
+                cell_for(stored['city'], stored['issue_date'], stored['work_type'], stored['estimated_cost'],
+                         stored['cost_anomaly']),
+                stored['estimated_cost'],
+            ))
+            entered_cells.append((cell, fields['estimated_cost']))
+            left_grid.append(_grid_position(stored, stored['geohash']))
+            entered_grid.append(_grid_position(fields, stored['geohash']))
+        else:
+            touched.setdefault(fields['scraped_at'], []).append(stored['id'])
+
+    update_fields = (
+        PLAIN_FIELDS + [field for field, _ in DIMENSION_KEYS.values()] + LOCATION_FIELDS + ANOMALY_FIELDS
+        + ['scraped_at', 'updated_at']
+    )
+    with transaction.atomic():
+        Permit.objects.bulk_create(new_permits)
+        if changed_permits:
+            Permit.objects.bulk_update(changed_permits, update_fields)
+            PermitVersion.objects.bulk_create(versions)
+        if reflagged:
+            Permit.objects.bulk_update(reflagged, ANOMALY_FIELDS + ['scraped_at'])
+        for scraped_at, ids in touched.items():
+            Permit.objects.filter(id__in=ids).update(scraped_at=scraped_at)
+        apply_changes(removed=left_cells, added=entered_cells)
+        heatmap.apply_changes(removed=left_grid, added=entered_grid)
+
+    try:
+        contractor_ids = {caches[Party].id_for(fields['contractor_name']) for fields in batch.values()}
+        resolver.resolve_parties(Party.objects.filter(id__in=contractor_ids - {None}))
+    except Exception as e:
+        # Unresolved names are picked up by the next run or `manage.py resolve_contractors`
+        logger.warning(f"Could not resolve contractor names: {e}")
+
+    try:
+        detector.index(Permit.objects.filter(permit_id__in=redocumented))
+    except Exception as e:
+        # Missed permits are indexed by `manage.py find_duplicates`
+        logger.warning(f"Could not check permits for duplicates: {e}")
+
+    return {
+        'created': len(new_permits),
+        'updated': len(changed_permits) + len(reflagged),
+        'unchanged': sum(len(ids) for ids in touched.values()),
+    }
+
+
+def save_permits(permits, scraper_run=None, batch_size=INGEST_BATCH_SIZE):
+    """Insert or update engine permit dicts in bulk, logging changed fields as PermitVersions
+
+    Returns (counts, errors): counts of created/updated/unchanged permits and
+    a list of error messages for permits or batches that could not be saved.
+    """
+    counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+    errors = []
+    now = timezone.now()
+    caches = dimension_caches()
+    resolver = ContractorResolver()
+    detector = DuplicateDetector()
+
+    batch = {}
+    pending = list(permits)
+    for index, permit_data in enumerate(pending, 1):
+        try:
+            # Last occurrence wins when a run returns the same permit twice
+            batch[permit_data['permit_id']] = permit_fields(permit_data)
+        except Exception as e:
+            errors.append(f"Error saving permit {permit_data.get('permit_id', 'unknown')}: {str(e)}")
+
+        if len(batch) >= batch_size or (index == len(pending) and batch):
+            try:
+                for key, value in _save_batch(batch, scraper_run, now, caches, resolver, detector).items():
+                    counts[key] += value
+            except Exception as e:
+                error_msg = f"Error saving batch of {len(batch)} permits: {str(e)}"
+                logger.error(error_msg)
+                errors.append(error_msg)
+            batch = {}
+
+    if counts['created'] or counts['updated']:
+        # Read replicas serve these permits once they have replayed this far
+        bump_watermark()
+    return counts, errors
+
+
+def permit_as_of(permit, when):
+    """Unsaved copy of permit with its tracked fields as they were at `when`
+
+    Returns None if the permit did not exist yet. Changes made before the
+    change log existed are not recoverable.
+    """
+    if permit.created_at > when:
+        return None
+    snapshot = Permit(**{f.attname: getattr(permit, f.attname) for f in Permit._meta.concrete_fields})
+    # Undo later changes newest first; each version holds the values it replaced
+    for version in permit.versions.filter(changed_at__gt=when).order_by('-changed_at', '-id'):
+        for name, old_value in version.changes.items():
+            if name in DIMENSION_KEYS:
+                field, model = DIMENSION_KEYS[name]
+                setattr(snapshot, f'{field}_id', id_for_name(model, old_value))
+            else:
+                setattr(snapshot, name, _normalize(name, old_value))
+    return snapshot
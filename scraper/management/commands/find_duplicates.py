@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from scraper.duplicates import find_duplicates
+from scraper.models import DuplicateCluster
+
+
+class Command(BaseCommand):
+    help = 'Check permits not yet in the near-duplicate index for duplicates (all permits with --rebuild)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Drop the LSH index and every cluster and check all permits again (cluster ids change)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        pairs = find_duplicates(rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Found {pairs:,} near-duplicate pairs; {DuplicateCluster.objects.count():,} clusters "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
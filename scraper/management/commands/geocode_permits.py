@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from scraper.geocoding import LOCATION_FIELDS, geocode
+from scraper.heatmap import rebuild_grid
+from scraper.models import Permit
+
+
+class Command(BaseCommand):
+    help = 'Geocode permits from the local gazetteer (those never geocoded, or all of them with --all)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-geocode every permit (after changing the gazetteer)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        queryset = Permit.objects.all() if options['all'] else Permit.objects.filter(geohash__isnull=True)
+        started = time.monotonic()
+        done = located = 0
+        last_pk = 0
+        while True:
+            rows = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', 'city__name', 'full_address', 'zip_code', 'borough_area')[:options['batch_size']]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            # Permits share a few thousand centroids: one UPDATE per distinct location
+            by_location = {}
+            for pk, *address in rows:
+                by_location.setdefault(geocode(*address), []).append(pk)
+            with transaction.atomic():
+                for location, ids in by_location.items():
+                    fields = dict(zip(LOCATION_FIELDS, location or (None, None, None, '')))
+                    for start in range(0, len(ids), 1000):
+                        Permit.objects.filter(pk__in=ids[start:start + 1000]).update(**fields)
+            done += len(rows)
+            located += sum(len(ids) for location, ids in by_location.items() if location)
+            self.stdout.write(f"  {done:,} permits ({done / (time.monotonic() - started):,.0f}/s)")
+
+        if done:
+            # Queryset updates bypass the incremental heatmap grid maintenance
+            rebuild_grid()
+        self.stdout.write(self.style.SUCCESS(
+            f"Geocoded {located:,} of {done:,} permits in {time.monotonic() - started:.1f}s"
+        ))
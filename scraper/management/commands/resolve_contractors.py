@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from scraper.models import ContractorEntity
+from scraper.resolution import resolve_contractors
+
+
+class Command(BaseCommand):
+    help = 'Assign contractor names not yet resolved to canonical contractor entities'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Drop every entity and blocking key and resolve all contractor names again (entity ids change)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        resolved = resolve_contractors(rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Resolved {resolved:,} contractor names to {ContractorEntity.objects.count():,} entities "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
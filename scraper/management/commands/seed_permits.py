@@ -0,0 +1,169 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from scraper.admin_perf import refresh_filter_choices
+from scraper.dimensions import PERMIT_DIMENSIONS, dimension_caches
+from scraper.duplicates import find_duplicates
+from scraper.geocoding import geocode
+from scraper.heatmap import rebuild_grid
+from scraper.models import Permit
+from scraper.replicas import bump_watermark
+from scraper.resolution import resolve_contractors
+from scraper.rollups import rebuild_rollups
+
+from permit_scraper.cities import CITY_REGISTRY
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic permits in bulk (database, CSV or Parquet) for load and scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, required=True, help='Number of permits to generate')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (same seed, same permits)')
+        parser.add_argument('--format', choices=['db', 'csv', 'parquet'], default='db')
+        parser.add_argument('--output', help='Output file for --format csv/parquet')
+        parser.add_argument('--cities', nargs='*', help='City keys to generate (default: all configured)')
+        parser.add_argument('--days', type=int, default=365, help='Spread issue dates over this many days')
+        parser.add_argument('--chunk-rows', type=int, default=250000, help='Rows generated per chunk')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT batch')
+        parser.add_argument('--start', type=int, default=0, help='First number of the permit id sequence')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        if rows <= 0:
+            raise CommandError('--rows must be positive')
+        cities = options['cities']
+        if cities:
+            unknown = [key for key in cities if key not in CITY_REGISTRY]
+            if unknown:
+                raise CommandError(f"Unknown cities: {', '.join(unknown)}")
+        if options['format'] != 'db' and not options['output']:
+            raise CommandError('--output is required for csv and parquet')
+
+        from permit_scraper.synthetic import iter_permit_frames
+
+        frames = iter_permit_frames(
+            rows, seed=options['seed'], chunk_rows=options['chunk_rows'],
+            city_keys=cities, days=options['days'], start=options['start']
+        )
+
+        writer = {
+            'db': self._write_db,
+            'csv': self._write_csv,
+            'parquet': self._write_parquet,
+        }[options['format']]
+
+        started = time.monotonic()
+        written = 0
+        for count in writer(frames, options):
+            written += count
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"  {written:,}/{rows:,} permits ({written / elapsed:,.0f} rows/s)")
+
+        if options['format'] == 'db':
+            # Raw INSERTs bypass the incremental rollup/grid maintenance, contractor resolution and duplicate checks
+            rebuild_rollups()
+            rebuild_grid()
+            resolve_contractors()
+            find_duplicates()
+            refresh_filter_choices()
+            bump_watermark()
+
+        elapsed = time.monotonic() - started
+        target = 'database' if options['format'] == 'db' else options['output']
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {written:,} permits into {target} in {elapsed:.1f}s"
+        ))
+
+    def _write_db(self, frames, options):
+        """Multi-row INSERTs straight from the columns; existing permit ids are skipped"""
+        fields = [
+            Permit._meta.get_field(name) for name in (
+                'city', 'permit_id', 'issue_date', 'scraped_at', 'full_address', 'borough_area',
+                'zip_code', 'latitude', 'longitude', 'geohash', 'geocode_precision',
+                'project_description', 'work_type', 'estimated_cost', 'cost_anomaly', 'cost_anomaly_score', 'contractor',
+                'contractor_license', 'applicant', 'owner', 'architect',
+                'license_status', 'business_address', 'business_phone', 'data_source',
+                'created_at', 'updated_at',
+            )
+        ]
+        ops = connection.ops
+        columns = ', '.join(ops.quote_name(f.column) for f in fields)
+        sql = (
+            f"{ops.insert_statement(on_conflict=OnConflict.IGNORE)} {ops.quote_name(Permit._meta.db_table)} "
+            f"({columns}) VALUES ({', '.join(['%s'] * len(fields))}) "
+            f"{ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None)}"
+        ).strip()
+        now = ops.adapt_datetimefield_value(timezone.now())
+        batch_size = options['batch_size']
+        caches = dimension_caches()
+
+        def interned(frame, name, model):
+            """Dimension ids for a name column (each distinct name resolved once)"""
+            names = frame[name].astype(str)
+            cache = caches[model]
+            cache.resolve(names.unique())
+            return names.map(cache.id_for).tolist()
+
+        for frame in frames:
+            scraped_at = ops.adapt_datetimefield_value(
+                timezone.make_aware(timezone.datetime.fromisoformat(frame['scraped_at'].iloc[0]))
+            )
+            dims = {key: interned(frame, key, model) for key, _, model in PERMIT_DIMENSIONS}
+            located = [
+                geocode(*address) or (None, None, None, '')
+                for address in zip(*(frame[name].astype(str).tolist() for name in (
+                    'city', 'full_address', 'zip_code', 'borough_area')))
+            ]
+            values = list(zip(
+                dims['city'],
+                *(frame[name].astype(str).tolist() for name in ('permit_id', 'issue_date')),
+                [scraped_at] * len(frame),
+                *(frame[name].astype(str).tolist() for name in ('full_address', 'borough_area', 'zip_code')),
+                *zip(*located),
+                *(frame[name].astype(str).tolist() for name in ('project_description', 'work_type')),
+                frame['estimated_cost'].tolist(),
+                [False] * len(frame),
+                [None] * len(frame),
+                dims['contractor_name'],
+                frame['contractor_license'].astype(str).tolist(),
+                dims['applicant_name'], dims['owner_name'], dims['architect_name'],
+                *(frame[name].astype(str).tolist() for name in (
+                    'license_status', 'business_address', 'business_phone')),
+                dims['data_source'],
+                [now] * len(frame),
+                [now] * len(frame),
+            ))
+            with transaction.atomic(), connection.cursor() as cursor:
+                for i in range(0, len(values), batch_size):
+                    cursor.executemany(sql, values[i:i + batch_size])
+            yield len(frame)
+
+    def _write_csv(self, frames, options):
+        path = options['output']
+        for i, frame in enumerate(frames):
+            frame.to_csv(path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+            yield len(frame)
+
+    def _write_parquet(self, frames, options):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise CommandError('Parquet output needs pyarrow (pip install pyarrow)')
+
+        writer = None
+        try:
+            for frame in frames:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(options['output'], table.schema)
+                writer.write_table(table)
+                yield len(frame)
+        finally:
+            if writer is not None:
+                writer.close()
@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from scraper.replicas import watermark
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database over the SQLite replica stand-in '
+        '(DATABASE_SQLITE_PATH / DATABASE_REPLICA_SQLITE_PATH): "replication" for local testing'
+    )
+
+    def handle(self, *args, **options):
+        alias = settings.DATABASE_READ_ALIAS
+        if alias == DEFAULT_DB_ALIAS:
+            raise CommandError('No read replica is configured (DATABASE_REPLICA_SQLITE_PATH or DATABASE_REPLICA_HOST)')
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('Only SQLite stand-ins are copied; a MySQL replica follows its primary by itself')
+
+        started = time.monotonic()
+        before = watermark(alias) if self._has_schema(replica) else None
+        primary.ensure_connection()
+        replica.ensure_connection()
+        # SQLite online backup: a consistent snapshot even while the primary is being written
+        primary.connection.backup(replica.connection)
+        self.stdout.write(self.style.SUCCESS(
+            f"Read replica '{alias}' at watermark {watermark(alias)} (was {before if before is not None else 'empty'}) "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
+
+    @staticmethod
+    def _has_schema(connection):
+        return 'replication_watermark' in connection.introspection.table_names()
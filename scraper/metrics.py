@@ -0,0 +1,326 @@
+"""
+In-process Prometheus metrics for the API and scraper hot paths.
+
+Counters and histograms live in a small registry inside each process and are
+rendered in the Prometheus text format at /metrics. No client library or
+push gateway is needed.
+
+Under gunicorn every worker has its own registry. When METRICS_MULTIPROC_DIR
+is set, each worker periodically writes a snapshot of its values to
+<dir>/metrics_<pid>.json, and /metrics sums the snapshots of all workers.
+Snapshots left by workers that have exited are merged into one archive file,
+so counters stay monotonic across worker restarts (--max-requests).
+"""
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from bisect import bisect_left
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines run a single process anyway
+    fcntl = None
+
+from django.conf import settings
+
+logger = logging.getLogger('scraper')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{_escape(v)}"' for n, v in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    @property
+    def family_name(self):
+        """Name of the metric family in the # HELP / # TYPE lines"""
+        return self.name
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def snapshot(self):
+        """JSON-ready list of [label values, value] pairs"""
+        with self._lock:
+            return [[list(k), v if not isinstance(v, list) else list(v)] for k, v in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    @property
+    def family_name(self):
+        # The text format wants the family named like its samples
+        return f'{self.name}_total'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    @staticmethod
+    def merge(a, b):
+        return a + b
+
+    def render(self, values):
+        lines = []
+        for key, value in sorted(values.items()):
+            lines.append(f'{self.family_name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            # Per-bucket counts (last slot is +Inf), then sum and count
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @staticmethod
+    def merge(a, b):
+        return [x + y for x, y in zip(a, b)]
+
+    def render(self, values):
+        lines = []
+        for key, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(state[-2])}')
+            lines.append(f'{self.name}_count{labels} {state[-1]}')
+        return lines
+
+
+class Registry:
+    """Named metrics of one process, with optional multi-worker aggregation"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._last_flush = 0.0
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def _merge_into(self, totals, snapshot):
+        for name, items in snapshot.items():
+            metric = self._metrics.get(name)
+            if metric is None:
+                continue
+            values = totals.setdefault(name, {})
+            for key, value in items:
+                key = tuple(key)
+                values[key] = metric.merge(values[key], value) if key in values else value
+
+    # Multi-worker support
+
+    @staticmethod
+    def _multiproc_dir():
+        directory = getattr(settings, 'METRICS_MULTIPROC_DIR', '')
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return directory
+
+    @staticmethod
+    def _write_json(path, data):
+        tmp_path = f'{path}.tmp{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def flush(self, force=False):
+        """Write this worker's snapshot to the shared directory (rate limited)"""
+        directory = self._multiproc_dir()
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < settings.METRICS_FLUSH_SECONDS:
+            return
+        self._last_flush = now
+        try:
+            self._write_json(os.path.join(directory, f'metrics_{os.getpid()}.json'), self.snapshot())
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot: {e}")
+
+    def _collect_multiprocess(self, directory):
+        """Sum every worker snapshot, folding those of exited workers into the archive"""
+        archive_path = os.path.join(directory, 'metrics_archive.json')
+        with open(os.path.join(directory, '.lock'), 'w') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            totals = {}
+            archive = {}
+            if os.path.exists(archive_path):
+                with open(archive_path) as f:
+                    self._merge_into(archive, json.load(f))
+
+            dead = []
+            for filename in os.listdir(directory):
+                if not (filename.startswith('metrics_') and filename.endswith('.json')):
+                    continue
+                pid = filename[len('metrics_'):-len('.json')]
+                if not pid.isdigit():
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    with open(path) as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if _pid_alive(int(pid)):
+                    self._merge_into(totals, snapshot)
+                else:
+                    self._merge_into(archive, snapshot)
+                    dead.append(path)
+
+            if dead:
+                self._write_json(archive_path, {
+                    name: [[list(k), v] for k, v in values.items()] for name, values in archive.items()
+                })
+                for path in dead:
+                    os.remove(path)
+
+        for name, values in archive.items():
+            target = totals.setdefault(name, {})
+            metric = self._metrics[name]
+            for key, value in values.items():
+                target[key] = metric.merge(target[key], value) if key in target else value
+        return totals
+
+    def collect(self):
+        """Metric values of this process, or of all workers in multiprocess mode"""
+        directory = self._multiproc_dir()
+        if directory:
+            self.flush(force=True)
+            return self._collect_multiprocess(directory)
+        totals = {}
+        self._merge_into(totals, self.snapshot())
+        return totals
+
+    def render(self):
+        """Prometheus text exposition of every registered metric"""
+        totals = self.collect()
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f'# HELP {metric.family_name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.family_name} {metric.kind}')
+            lines.extend(metric.render(totals.get(name, {})))
+        return '\n'.join(lines) + '\n'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+REGISTRY = Registry()
+atexit.register(lambda: REGISTRY.flush(force=True))
+
+# API
+http_request_seconds = REGISTRY.histogram(
+    'permit_http_request_duration_seconds', 'Django view latency',
+    ['view', 'method', 'status']
+)
+http_request_queries = REGISTRY.histogram(
+    'permit_http_request_queries', 'Database queries issued per request',
+    ['view'], buckets=QUERY_BUCKETS
+)
+
+# Scraper
+rows_ingested = REGISTRY.counter(
+    'permit_rows_ingested', 'Permit rows saved to the database', ['city']
+)
+city_fetch_seconds = REGISTRY.histogram(
+    'permit_city_fetch_duration_seconds', 'Latency of one HTTP request to a city API', ['city']
+)
+city_fetch_bytes = REGISTRY.counter(
+    'permit_city_fetch_bytes', 'Bytes received from a city API', ['city']
+)
+
+# ZIP pipeline
+zip_cache_requests = REGISTRY.counter(
+    'permit_zip_cache_requests', 'Processed ZIP cache lookups', ['result']
+)
+zip_processed_bytes = REGISTRY.counter(
+    'permit_zip_processed_bytes', 'Uploaded ZIP bytes processed', ['result']
+)
+zip_processed_files = REGISTRY.counter(
+    'permit_zip_processed_files', 'Files combined into processed ZIPs', ['result']
+)
+zip_processing_seconds = REGISTRY.histogram(
+    'permit_zip_processing_seconds', 'Time to produce a processed ZIP', ['result']
+)
+
+
+def record_stage_timings(spans):
+    """Feed a scraper run's RunTimer spans into the scraper metrics (one fetch span per HTTP request)"""
+    for span in spans:
+        if span['stage'] == 'fetch':
+            city_fetch_seconds.observe(span['seconds'], city=span['city'])
+            if span.get('bytes'):
+                city_fetch_bytes.inc(span['bytes'], city=span['city'])
+        elif span['stage'] == 'db_write' and span.get('rows'):
+            rows_ingested.inc(span['rows'], city=span['city'])
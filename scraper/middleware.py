@@ -0,0 +1,164 @@
+import time
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics, replicas
+from .querycount import QueryRecorder, budget_for
+
+logger = logging.getLogger('scraper')
+
+
+class HybridMiddleware:
+    """Middleware that runs natively under both WSGI and ASGI
+
+    A sync-only middleware makes Django run everything below it in a thread
+    per request, which would undo the async views; subclasses implement
+    __call__ for WSGI and __acall__ for ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """Record per-view latency and database query counts for /metrics"""
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.monotonic()
+        with recorder.record():
+            response = self.get_response(request)
+        self._observe(request, response, recorder, started)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.monotonic()
+        async with recorder.arecord():
+            response = await self.get_response(request)
+        self._observe(request, response, recorder, started)
+        return response
+
+    @staticmethod
+    def _observe(request, response, recorder, started):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else '<unresolved>'
+        if view != 'metrics':
+            metrics.http_request_seconds.observe(
+                time.monotonic() - started,
+                view=view, method=request.method, status=response.status_code
+            )
+            metrics.http_request_queries.observe(recorder.count, view=view)
+        # Rate limited: a small file write every METRICS_FLUSH_SECONDS at most
+        metrics.REGISTRY.flush()
+
+
+class QueryBudgetMiddleware(HybridMiddleware):
+    """Log requests that exceed their query budget or repeat a query shape (N+1)"""
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        return self._check(request, response, recorder)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        async with recorder.arecord():
+            response = await self.get_response(request)
+        return self._check(request, response, recorder)
+
+    @staticmethod
+    def _check(request, response, recorder):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else None
+        if view is None:
+            return response
+
+        max_queries, max_seconds = budget_for(view)
+        label = f"{request.method} {request.path} ({view})"
+        if max_queries is not None and recorder.count > max_queries:
+            logger.warning(f"Query budget exceeded: {label} ran {recorder.count} queries (budget {max_queries})")
+        if max_seconds is not None and recorder.seconds > max_seconds:
+            logger.warning(f"DB time budget exceeded: {label} spent {recorder.seconds:.3f}s (budget {max_seconds}s)")
+        for shape, n in recorder.repeated_shapes(settings.QUERY_BUDGET['n_plus_one_threshold']):
+            logger.warning(f"Possible N+1 in {label}: {n}x {shape[:300]}")
+
+        if settings.DEBUG:
+            response['X-DB-Queries'] = str(recorder.count)
+            response['X-DB-Time'] = f"{recorder.seconds:.4f}"
+        return response
+
+
+class ReadReplicaMiddleware(HybridMiddleware):
+    """Open the read-replica routing context of each request (see scraper/replicas.py)
+
+    A request that wrote pins its client to the primary for REPLICA_PIN_SECONDS.
+    """
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = replicas.begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            state = replicas.end(token)
+        return self._pin(response, state)
+
+    async def __acall__(self, request):
+        token = replicas.begin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = replicas.end(token)
+        return self._pin(response, state)
+
+    @staticmethod
+    def _pin(response, state):
+        if state.wrote and replicas.read_alias() != DEFAULT_DB_ALIAS:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoiseMiddleware that stays on the event loop under ASGI
+
+    WhiteNoise's middleware is sync-only; static files are looked up (and,
+    with autorefresh, found on disk) and opened in a worker thread instead.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
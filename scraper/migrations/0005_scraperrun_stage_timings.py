@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-19 01:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0004_zip_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scraperrun',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.26 on 2026-10-19 01:49
+
+from django.db import migrations, models
+
+# Must match PermitAdmin.fulltext_fields (MATCH needs the exact column list of one index)
+FULLTEXT_COLUMNS = ['full_address', 'project_description', 'contractor_name', 'applicant_name']
+
+
+def add_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        f"CREATE FULLTEXT INDEX permits_search_ft ON permits ({', '.join(FULLTEXT_COLUMNS)})"
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute("DROP INDEX permits_search_ft ON permits")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0005_scraperrun_stage_timings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='permit',
+            index=models.Index(fields=['issue_date', 'created_at'], name='permits_issue_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='permit',
+            index=models.Index(fields=['city', 'issue_date', 'created_at'], name='permits_city_issue_idx'),
+        ),
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.26 on 2026-10-19 01:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0007_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PermitVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('changes', models.JSONField()),
+                ('permit', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='scraper.permit')),
+                ('scraper_run', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='permit_versions', to='scraper.scraperrun')),
+            ],
+            options={
+                'db_table': 'permit_versions',
+                'ordering': ['-changed_at'],
+                'indexes': [models.Index(fields=['changed_at'], name='permit_versions_changed_idx'), models.Index(fields=['permit', 'changed_at'], name='permit_versions_permit_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.26 on 2026-10-19 01:56
+
+from django.db import migrations, models
+from django.db.models import Case, Count, IntegerField, Max, Min, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncMonth
+
+# scraper.rollups as of this migration, frozen so later changes to it cannot break a fresh migrate
+COST_BUCKETS = [0, 100_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000, 100_000_000]
+
+
+def build_rollups(apps, schema_editor):
+    """The initial cube, in one GROUP BY over the permits (city is still a plain name here)"""
+    Permit = apps.get_model('scraper', 'Permit')
+    PermitRollup = apps.get_model('scraper', 'PermitRollup')
+    db = schema_editor.connection.alias
+    bucket = Case(
+        *[When(estimated_cost__gte=low, then=Value(i)) for i, low in reversed(list(enumerate(COST_BUCKETS)))],
+        default=Value(0), output_field=IntegerField()
+    )
+    rows = (
+        Permit.objects.using(db)
+        .annotate(rollup_month=TruncMonth('issue_date'), rollup_work_type=Coalesce('work_type', Value('')),
+                  rollup_bucket=bucket)
+        .values('city', 'rollup_month', 'rollup_work_type', 'rollup_bucket')
+        .annotate(count=Count('id'), total=Sum('estimated_cost'), low=Min('estimated_cost'), high=Max('estimated_cost'))
+        .order_by()
+    )
+    PermitRollup.objects.using(db).bulk_create([
+        PermitRollup(
+            city=row['city'], month=row['rollup_month'], work_type=row['rollup_work_type'],
+            cost_bucket=row['rollup_bucket'], permit_count=row['count'], total_cost=row['total'],
+            min_cost=row['low'], max_cost=row['high'],
+        )
+        for row in rows.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0008_permitversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='permit',
+            name='work_type',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.CreateModel(
+            name='PermitRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=100)),
+                ('month', models.DateField()),
+                ('work_type', models.CharField(blank=True, max_length=100)),
+                ('cost_bucket', models.SmallIntegerField()),
+                ('permit_count', models.BigIntegerField(default=0)),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('min_cost', models.DecimalField(decimal_places=2, max_digits=15, null=True)),
+                ('max_cost', models.DecimalField(decimal_places=2, max_digits=15, null=True)),
+            ],
+            options={
+                'db_table': 'permit_rollups',
+                'ordering': ['city', 'month', 'work_type', 'cost_bucket'],
+                'indexes': [models.Index(fields=['month'], name='permit_rollups_month_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='permitrollup',
+            constraint=models.UniqueConstraint(fields=('city', 'month', 'work_type', 'cost_bucket'), name='permit_rollups_cell_uniq'),
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,219 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Collate, Trim
+import django.db.models.deletion
+
+# (old string column, new foreign key, dimension model)
+INTERNED = [
+    ('city', 'city_ref', 'City'),
+    ('contractor_name', 'contractor', 'Party'),
+    ('applicant_name', 'applicant', 'Party'),
+    ('owner_name', 'owner', 'Party'),
+    ('architect_name', 'architect', 'Party'),
+    ('data_source', 'data_source_ref', 'DataSource'),
+]
+
+DIMENSION_TABLES = ['dim_cities', 'dim_parties', 'dim_data_sources']
+
+# MySQL's default collation would make "ABC Construction Corp" and "ABC CONSTRUCTION CORP" one unique name
+BINARY_COLLATION = 'utf8mb4_bin'
+
+
+def use_binary_collation(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table in DIMENSION_TABLES:
+        schema_editor.execute(
+            f"ALTER TABLE {schema_editor.quote_name(table)} "
+            f"MODIFY name varchar(200) CHARACTER SET utf8mb4 COLLATE {BINARY_COLLATION} NOT NULL"
+        )
+
+
+def intern_names(apps, schema_editor):
+    """Move every distinct string into its dimension table and point the permits at it
+
+    Set-based (one INSERT of the distinct names and one correlated UPDATE per
+    column) so it does not issue a statement per name on large tables.
+    """
+    Permit = apps.get_model('scraper', 'Permit')
+    mysql = schema_editor.connection.vendor == 'mysql'
+    for old, new, dimension in INTERNED:
+        Model = apps.get_model('scraper', dimension)
+        clean, source = Trim(old), Trim(OuterRef(old))
+        if mysql:
+            # Permit columns keep the default case-insensitive collation; group and match in the dimension's
+            clean, source = Collate(clean, BINARY_COLLATION), Collate(source, BINARY_COLLATION)
+        names = Permit.objects.exclude(**{f'{old}__isnull': True}).annotate(
+            clean=clean
+        ).values_list('clean', flat=True).distinct()
+        names = {name or 'Unknown' for name in names if name or old == 'city'}
+        names -= set(Model.objects.filter(name__in=names).values_list('name', flat=True))
+        Model.objects.bulk_create([Model(name=name) for name in names], batch_size=1000)
+        if old == 'city':
+            Permit.objects.filter(city='').update(city='Unknown')
+        Permit.objects.exclude(**{f'{old}__isnull': True}).update(**{
+            new: Subquery(Model.objects.filter(name=source).values('id')[:1])
+        })
+
+
+def restore_names(apps, schema_editor):
+    Permit = apps.get_model('scraper', 'Permit')
+    for old, new, dimension in INTERNED:
+        Model = apps.get_model('scraper', dimension)
+        for row in Model.objects.all():
+            Permit.objects.filter(**{new: row}).update(**{old: row.name})
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute("DROP INDEX permits_search_ft ON permits")
+
+
+def add_old_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            "CREATE FULLTEXT INDEX permits_search_ft ON permits "
+            "(full_address, project_description, contractor_name, applicant_name)"
+        )
+
+
+def add_fulltext_index(apps, schema_editor):
+    # Party names are searched through dim_parties now (see PermitAdmin.prefix_search_fields)
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute("CREATE FULLTEXT INDEX permits_search_ft ON permits (full_address, project_description)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0009_permit_work_type_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='City',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'cities',
+                'db_table': 'dim_cities',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DataSource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+            ],
+            options={
+                'db_table': 'dim_data_sources',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Party',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'parties',
+                'db_table': 'dim_parties',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RunPython(use_binary_collation, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='permit',
+            name='permits_city_a07ec9_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='permit',
+            name='permits_city_issue_idx',
+        ),
+        # Nullable while it is being replaced, so reversing can re-add it before restore_names fills it
+        migrations.AlterField(
+            model_name='permit',
+            name='city',
+            field=models.CharField(max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='permit',
+            name='city_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='scraper.city'),
+        ),
+        migrations.AddField(
+            model_name='permit',
+            name='contractor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='scraper.party'),
+        ),
+        migrations.AddField(
+            model_name='permit',
+            name='applicant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='scraper.party'),
+        ),
+        migrations.AddField(
+            model_name='permit',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='scraper.party'),
+        ),
+        migrations.AddField(
+            model_name='permit',
+            name='architect',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='scraper.party'),
+        ),
+        migrations.AddField(
+            model_name='permit',
+            name='data_source_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='scraper.datasource'),
+        ),
+        migrations.RunPython(intern_names, restore_names),
+        migrations.RunPython(drop_fulltext_index, add_old_fulltext_index),
+        migrations.RemoveField(
+            model_name='permit',
+            name='city',
+        ),
+        migrations.RemoveField(
+            model_name='permit',
+            name='contractor_name',
+        ),
+        migrations.RemoveField(
+            model_name='permit',
+            name='applicant_name',
+        ),
+        migrations.RemoveField(
+            model_name='permit',
+            name='owner_name',
+        ),
+        migrations.RemoveField(
+            model_name='permit',
+            name='architect_name',
+        ),
+        migrations.RemoveField(
+            model_name='permit',
+            name='data_source',
+        ),
+        migrations.RenameField(
+            model_name='permit',
+            old_name='city_ref',
+            new_name='city',
+        ),
+        migrations.RenameField(
+            model_name='permit',
+            old_name='data_source_ref',
+            new_name='data_source',
+        ),
+        migrations.AlterField(
+            model_name='permit',
+            name='city',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='permits', to='scraper.city'),
+        ),
+        migrations.AddIndex(
+            model_name='permit',
+            index=models.Index(fields=['city', 'issue_date', 'created_at'], name='permits_city_issue_idx'),
+        ),
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.26 on 2026-10-19 02:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0010_permit_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractorEntity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('normalized_name', models.CharField(max_length=200, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'contractor entities',
+                'db_table': 'contractor_entities',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='party',
+            name='normalized_name',
+            field=models.CharField(blank=True, db_index=True, max_length=200, null=True),
+        ),
+        migrations.CreateModel(
+            name='ContractorBlockKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='block_keys', to='scraper.contractorentity')),
+            ],
+            options={
+                'db_table': 'contractor_block_keys',
+            },
+        ),
+        migrations.AddField(
+            model_name='party',
+            name='entity',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='parties', to='scraper.contractorentity'),
+        ),
+        migrations.AddConstraint(
+            model_name='contractorblockkey',
+            constraint=models.UniqueConstraint(fields=('key', 'entity'), name='contractor_block_keys_uniq'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.26 on 2026-10-19 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0011_contractor_entities'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='permit',
+            name='geocode_precision',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='permit',
+            name='geohash',
+            field=models.CharField(blank=True, max_length=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='permit',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='permit',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='permit',
+            index=models.Index(fields=['geohash'], name='permits_geohash_idx'),
+        ),
+    ]
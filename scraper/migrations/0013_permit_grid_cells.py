@@ -0,0 +1,68 @@
+# Generated by Django 4.2.26 on 2026-10-19 02:21
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Substr, TruncMonth
+
+# scraper.heatmap as of this migration, frozen so later changes to it cannot break a fresh migrate
+GRID_PRECISIONS = [3, 4, 5, 6]
+
+
+def build_grid(apps, schema_editor):
+    """The initial grid: one GROUP BY at the finest precision, rolled up to the coarser ones"""
+    Permit = apps.get_model('scraper', 'Permit')
+    PermitGridCell = apps.get_model('scraper', 'PermitGridCell')
+    db = schema_editor.connection.alias
+    finest = max(GRID_PRECISIONS)
+    rows = (
+        Permit.objects.using(db).filter(geohash__isnull=False)
+        .annotate(grid_city=F('city__name'), grid_month=TruncMonth('issue_date'), grid_cell=Substr('geohash', 1, finest))
+        .values('grid_city', 'grid_month', 'grid_cell')
+        .annotate(count=Count('id'), total=Sum('estimated_cost'))
+        .order_by()
+    )
+    totals = defaultdict(lambda: [0, Decimal(0)])
+    for row in rows.iterator():
+        for precision in GRID_PRECISIONS:
+            cell = totals[(precision, row['grid_cell'][:precision], row['grid_city'], row['grid_month'])]
+            cell[0] += row['count']
+            cell[1] += row['total']
+    PermitGridCell.objects.using(db).bulk_create([
+        PermitGridCell(precision=precision, geohash=geohash, city=city, month=month, permit_count=count, total_cost=total)
+        for (precision, geohash, city, month), (count, total) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0012_permit_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PermitGridCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precision', models.SmallIntegerField()),
+                ('geohash', models.CharField(max_length=12)),
+                ('city', models.CharField(max_length=100)),
+                ('month', models.DateField()),
+                ('permit_count', models.BigIntegerField(default=0)),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+            ],
+            options={
+                'db_table': 'permit_grid_cells',
+                'ordering': ['precision', 'geohash'],
+                'indexes': [models.Index(fields=['precision', 'city', 'month'], name='permit_grid_city_month_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='permitgridcell',
+            constraint=models.UniqueConstraint(fields=('precision', 'geohash', 'city', 'month'), name='permit_grid_cells_uniq'),
+        ),
+        migrations.RunPython(build_grid, migrations.RunPython.noop),
+    ]
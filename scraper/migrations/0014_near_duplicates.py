@@ -0,0 +1,43 @@
+# Generated by Django 4.2.26 on 2026-10-19 02:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0013_permit_grid_cells'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'duplicate_clusters',
+                'ordering': ['-updated_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='permit',
+            name='duplicate_cluster',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='permits', to='scraper.duplicatecluster'),
+        ),
+        migrations.CreateModel(
+            name='PermitLshBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField()),
+                ('permit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='scraper.permit')),
+            ],
+            options={
+                'db_table': 'permit_lsh_buckets',
+                'indexes': [models.Index(fields=['bucket'], name='permit_lsh_bucket_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.26 on 2026-10-19 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0014_near_duplicates'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='permitrollup',
+            name='permit_rollups_cell_uniq',
+        ),
+        migrations.AddField(
+            model_name='permit',
+            name='cost_anomaly',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='permit',
+            name='cost_anomaly_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='permitrollup',
+            name='cost_anomaly',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='scraperrun',
+            name='anomalous_permits_found',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='permitrollup',
+            constraint=models.UniqueConstraint(fields=('city', 'month', 'work_type', 'cost_bucket', 'cost_anomaly'), name='permit_rollups_cell_uniq'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.26 on 2026-10-19 02:40
+
+from django.db import migrations, models
+
+
+def create_watermark(apps, schema_editor):
+    apps.get_model('scraper', 'ReplicationWatermark').objects.using(schema_editor.connection.alias).get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0015_cost_anomalies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplicationWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'replication_watermark',
+            },
+        ),
+        migrations.RunPython(create_watermark, migrations.RunPython.noop),
+    ]
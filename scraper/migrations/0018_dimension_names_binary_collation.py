@@ -0,0 +1,32 @@
+from django.db import migrations
+
+DIMENSION_TABLES = ['dim_cities', 'dim_parties', 'dim_data_sources']
+
+BINARY_COLLATION = 'utf8mb4_bin'
+
+
+def use_binary_collation(apps, schema_editor):
+    """Dimension names are unique byte for byte, not case- and accent-insensitively
+
+    0010 now does this when it creates the tables; this covers databases
+    migrated past 0010 before it did.
+    """
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table in DIMENSION_TABLES:
+        schema_editor.execute(
+            f"ALTER TABLE {schema_editor.quote_name(table)} "
+            f"MODIFY name varchar(200) CHARACTER SET utf8mb4 COLLATE {BINARY_COLLATION} NOT NULL"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0017_exportjob_heartbeat'),
+    ]
+
+    operations = [
+        # Not reversed: names differing only in case or accents would collide again
+        migrations.RunPython(use_binary_collation, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.26 on 2026-10-19 03:23
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Substr, TruncMonth
+
+# scraper.heatmap as of this migration, frozen so later changes to it cannot break a fresh migrate
+GRID_PRECISIONS = [3, 4, 5, 6]
+
+
+def _rebuild(apps, schema_editor, split_anomalies):
+    Permit = apps.get_model('scraper', 'Permit')
+    PermitGridCell = apps.get_model('scraper', 'PermitGridCell')
+    db = schema_editor.connection.alias
+    finest = max(GRID_PRECISIONS)
+    rows = (
+        Permit.objects.using(db).filter(geohash__isnull=False)
+        .annotate(grid_city=F('city__name'), grid_month=TruncMonth('issue_date'), grid_cell=Substr('geohash', 1, finest),
+                  grid_anomaly=F('cost_anomaly') if split_anomalies else Value(False))
+        .values('grid_city', 'grid_month', 'grid_cell', 'grid_anomaly')
+        .annotate(count=Count('id'), total=Sum('estimated_cost'))
+        .order_by()
+    )
+    totals = defaultdict(lambda: [0, Decimal(0)])
+    for row in rows.iterator():
+        for precision in GRID_PRECISIONS:
+            cell = totals[(precision, row['grid_cell'][:precision], row['grid_city'], row['grid_month'], row['grid_anomaly'])]
+            cell[0] += row['count']
+            cell[1] += row['total']
+    PermitGridCell.objects.using(db).all().delete()
+    PermitGridCell.objects.using(db).bulk_create([
+        PermitGridCell(precision=precision, geohash=geohash, city=city, month=month,
+                       **({'cost_anomaly': anomaly} if split_anomalies else {}),
+                       permit_count=count, total_cost=total)
+        for (precision, geohash, city, month, anomaly), (count, total) in totals.items()
+    ], batch_size=1000)
+
+
+def split_flagged_costs(apps, schema_editor):
+    """Move permits the engine already flagged into their own cells"""
+    _rebuild(apps, schema_editor, split_anomalies=True)
+
+
+def merge_flagged_costs(apps, schema_editor):
+    _rebuild(apps, schema_editor, split_anomalies=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0018_dimension_names_binary_collation'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='permitgridcell',
+            name='permit_grid_cells_uniq',
+        ),
+        # Reversed after the flag is gone: flagged and unflagged cells fold back together before the old constraint
+        migrations.RunPython(migrations.RunPython.noop, merge_flagged_costs),
+        migrations.AddField(
+            model_name='permitgridcell',
+            name='cost_anomaly',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddConstraint(
+            model_name='permitgridcell',
+            constraint=models.UniqueConstraint(fields=('precision', 'geohash', 'city', 'month', 'cost_anomaly'), name='permit_grid_cells_uniq'),
+        ),
+        migrations.RunPython(split_flagged_costs, migrations.RunPython.noop),
+    ]
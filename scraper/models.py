@@ -17,14 +17,157 @@ class FileProcessor(models.Model):
     output_file = models.CharField(max_length=255, blank=True)
     error_message = models.TextField(blank=True)
     
+    # Dedup cache metrics (see scraper/zip_cache.py)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    cache_hit = models.BooleanField(null=True, blank=True)
+    processing_seconds = models.FloatField(null=True, blank=True)
+    
     class Meta:
         db_table = 'file_processor'
         ordering = ['-uploaded_at']
 
 
+class ZipCacheEntry(models.Model):
+    """Processed ZIP output cached under the content hash of its upload"""
+    content_hash = models.CharField(max_length=64, unique=True)
+    output_file = models.CharField(max_length=255)
+    size_bytes = models.BigIntegerField()
+    files_count = models.IntegerField(default=0)
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        db_table = 'zip_cache_entries'
+        ordering = ['-last_used_at']
+    
+    def __str__(self):
+        return f"{self.content_hash[:12]} - {self.files_count} files - {self.hits} hits"
+
+
+class UploadSession(models.Model):
+    """Track a chunked, resumable ZIP upload until it is assembled"""
+    
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    ]
+    
+    upload_id = models.CharField(max_length=32, unique=True)
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    
+    # Contiguous number of bytes written and verified - the resume offset
+    received_bytes = models.BigIntegerField(default=0)
+    # SHA-256 of every received 4MB block, combined into the content hash
+    block_digests = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    
+    # Set once the assembled file has been handed to the ZIP pipeline
+    file_processor = models.ForeignKey(
+        FileProcessor, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'upload_sessions'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Upload {self.upload_id} - {self.received_bytes}/{self.total_size} bytes"
+
+
+class City(models.Model):
+    """City dimension - permits reference it by integer key"""
+    name = models.CharField(max_length=200, unique=True)
+    
+    class Meta:
+        db_table = 'dim_cities'
+        ordering = ['name']
+        verbose_name_plural = 'cities'
+    
+    def __str__(self):
+        return self.name
+
+
+class ContractorEntity(models.Model):
+    """One contractor firm; every spelling of its name points here (see scraper/resolution.py)"""
+    name = models.CharField(max_length=200)  # First spelling seen
+    normalized_name = models.CharField(max_length=200, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'contractor_entities'
+        ordering = ['name']
+        verbose_name_plural = 'contractor entities'
+    
+    def __str__(self):
+        return self.name
+
+
+class ContractorBlockKey(models.Model):
+    """Blocking index: a new name is only compared with entities sharing one of its keys"""
+    key = models.CharField(max_length=64)
+    entity = models.ForeignKey(ContractorEntity, on_delete=models.CASCADE, related_name='block_keys')
+    
+    class Meta:
+        db_table = 'contractor_block_keys'
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'entity'], name='contractor_block_keys_uniq'),
+        ]
+
+
+class Party(models.Model):
+    """Contractor, applicant, owner and architect names (one vocabulary for all roles)"""
+    name = models.CharField(max_length=200, unique=True)
+    
+    # Set by contractor resolution; null until the name has been resolved
+    normalized_name = models.CharField(max_length=200, null=True, blank=True, db_index=True)
+    entity = models.ForeignKey(
+        ContractorEntity, on_delete=models.SET_NULL, null=True, blank=True, related_name='parties'
+    )
+    
+    class Meta:
+        db_table = 'dim_parties'
+        ordering = ['name']
+        verbose_name_plural = 'parties'
+    
+    def __str__(self):
+        return self.name
+
+
+class DataSource(models.Model):
+    """Data source dimension (e.g. "NYC DOB NOW API")"""
+    name = models.CharField(max_length=200, unique=True)
+    
+    class Meta:
+        db_table = 'dim_data_sources'
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
+class DuplicateCluster(models.Model):
+    """Permits that look like the same job filed more than once (see scraper/duplicates.py)"""
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'duplicate_clusters'
+        ordering = ['-updated_at']
+    
+    def __str__(self):
+        return f"Duplicate cluster {self.pk}"
+
+
 class Permit(models.Model):
     # Identification fields
-    city = models.CharField(max_length=100)
+    city = models.ForeignKey(City, on_delete=models.PROTECT, related_name='permits')
     permit_id = models.CharField(max_length=50, unique=True)
     
     # Date fields
@@ -36,16 +179,26 @@ class Permit(models.Model):
     borough_area = models.CharField(max_length=100, blank=True, null=True)
     zip_code = models.CharField(max_length=20, blank=True, null=True)
     
+    # Set from the address by the offline geocoder (see scraper/geocoding.py)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, null=True, blank=True)
+    geocode_precision = models.CharField(max_length=10, blank=True, default='')  # street, zip or area
+    
     # Project details
     project_description = models.TextField()
+    work_type = models.CharField(max_length=100, blank=True, null=True)
     estimated_cost = models.DecimalField(max_digits=15, decimal_places=2)
+    # Set by the engine's anomaly stage (permit_scraper/anomaly.py); flagged costs stay out of headline totals
+    cost_anomaly = models.BooleanField(default=False)
+    cost_anomaly_score = models.FloatField(null=True, blank=True)  # Robust z-score of log cost
     
-    # Parties involved
-    contractor_name = models.CharField(max_length=200, blank=True, null=True)
+    # Parties involved (interned in dim_parties; see scraper/dimensions.py)
+    contractor = models.ForeignKey(Party, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
     contractor_license = models.CharField(max_length=100, blank=True, null=True)
-    applicant_name = models.CharField(max_length=200, blank=True, null=True)
-    owner_name = models.CharField(max_length=200, blank=True, null=True)
-    architect_name = models.CharField(max_length=200, blank=True, null=True)
+    applicant = models.ForeignKey(Party, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    owner = models.ForeignKey(Party, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    architect = models.ForeignKey(Party, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
     
     # Status and contact
     license_status = models.CharField(max_length=50, blank=True, null=True)
@@ -53,7 +206,11 @@ class Permit(models.Model):
     business_phone = models.CharField(max_length=20, blank=True, null=True)
     
     # Metadata
-    data_source = models.CharField(max_length=200, blank=True, null=True)
+    data_source = models.ForeignKey(DataSource, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    # Set by near-duplicate detection; null unless another permit looks like the same job
+    duplicate_cluster = models.ForeignKey(
+        DuplicateCluster, on_delete=models.SET_NULL, null=True, blank=True, related_name='permits'
+    )
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -63,16 +220,56 @@ class Permit(models.Model):
         db_table = 'permits'
         ordering = ['-issue_date', '-created_at']
         indexes = [
-            models.Index(fields=['city']),
             models.Index(fields=['issue_date']),
             models.Index(fields=['permit_id']),
             models.Index(fields=['scraped_at']),
+            # Admin change list order (-issue_date, -created_at), alone and within a city
+            models.Index(fields=['issue_date', 'created_at'], name='permits_issue_created_idx'),
+            models.Index(fields=['city', 'issue_date', 'created_at'], name='permits_city_issue_idx'),
+            # Location queries scan geohash prefix ranges
+            models.Index(fields=['geohash'], name='permits_geohash_idx'),
         ]
+        # MySQL also has a FULLTEXT index for admin search (migration 0006)
     
     def __str__(self):
         return f"{self.permit_id} - {self.city} - ${self.estimated_cost:,}"
 
 
+
+class PermitLshBucket(models.Model):
+    """MinHash LSH index: one row per permit and band; permits sharing a bucket are duplicate candidates"""
+    permit = models.ForeignKey(Permit, on_delete=models.CASCADE, related_name='lsh_buckets')
+    bucket = models.BigIntegerField()  # Hash of city, band number and the band's signature values
+    
+    class Meta:
+        db_table = 'permit_lsh_buckets'
+        indexes = [
+            models.Index(fields=['bucket'], name='permit_lsh_bucket_idx'),
+        ]
+
+
+class PermitVersion(models.Model):
+    """Append-only change log: the previous values of the fields a run changed"""
+    # Indexed through (permit, changed_at) below
+    permit = models.ForeignKey(Permit, on_delete=models.CASCADE, related_name='versions', db_index=False)
+    scraper_run = models.ForeignKey(
+        'ScraperRun', on_delete=models.SET_NULL, null=True, blank=True, related_name='permit_versions'
+    )
+    changed_at = models.DateTimeField(default=timezone.now)
+    # {field: value before this change}; dates and decimals as strings
+    changes = models.JSONField()
+    
+    class Meta:
+        db_table = 'permit_versions'
+        ordering = ['-changed_at']
+        indexes = [
+            models.Index(fields=['changed_at'], name='permit_versions_changed_idx'),
+            models.Index(fields=['permit', 'changed_at'], name='permit_versions_permit_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.permit_id} @ {self.changed_at:%Y-%m-%d %H:%M} - {', '.join(self.changes)}"
+
 class ScraperRun(models.Model):
     """Track scraper execution runs"""
     
@@ -93,10 +290,14 @@ class ScraperRun(models.Model):
     
     # Results
     total_permits_found = models.IntegerField(default=0)
-    total_project_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    total_project_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)  # Excludes cost anomalies
+    anomalous_permits_found = models.IntegerField(default=0)
     cities_processed = models.JSONField(default=list)
     errors = models.JSONField(default=list)
     
+    # Per-city, per-stage spans: [{"city", "stage", "start", "seconds", "rows", "bytes"}]
+    stage_timings = models.JSONField(default=list, blank=True)
+    
     # Summary
     summary_report = models.TextField(blank=True, null=True)
     
@@ -106,3 +307,109 @@ class ScraperRun(models.Model):
     
     def __str__(self):
         return f"Run {self.run_id} - {self.status} - {self.total_permits_found} permits"
+
+
+class ExportJob(models.Model):
+    """Permit CSV export written in the background (see scraper/exports.py)"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    filename = models.CharField(max_length=255)
+    description = models.CharField(max_length=255, blank=True)
+    requested_by = models.CharField(max_length=150, blank=True)
+    
+    row_count = models.IntegerField(null=True, blank=True)
+    file_path = models.CharField(max_length=500, blank=True)
+    size_bytes = models.BigIntegerField(null=True, blank=True)
+    error_message = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Bumped by the export thread after every chunk; a running job that stops bumping it died with its worker
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'export_jobs'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Export {self.pk} - {self.filename} - {self.status}"
+
+
+class PermitRollup(models.Model):
+    """Permit count and cost totals per city x issue month x work type x cost bucket x anomaly flag (see scraper/rollups.py)"""
+    city = models.CharField(max_length=100)
+    month = models.DateField()  # First day of the issue month
+    work_type = models.CharField(max_length=100, blank=True)  # '' when the permit has none
+    cost_bucket = models.SmallIntegerField()  # Index into rollups.COST_BUCKETS
+    cost_anomaly = models.BooleanField(default=False)  # Totals exclude these cells by default
+    
+    permit_count = models.BigIntegerField(default=0)
+    total_cost = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    min_cost = models.DecimalField(max_digits=15, decimal_places=2, null=True)
+    max_cost = models.DecimalField(max_digits=15, decimal_places=2, null=True)
+    
+    class Meta:
+        db_table = 'permit_rollups'
+        ordering = ['city', 'month', 'work_type', 'cost_bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['city', 'month', 'work_type', 'cost_bucket', 'cost_anomaly'], name='permit_rollups_cell_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['month'], name='permit_rollups_month_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.city} {self.month:%Y-%m} {self.work_type or '-'} bucket {self.cost_bucket}: {self.permit_count}"
+
+
+class PermitGridCell(models.Model):
+    """Permit count and total cost per geohash cell x city x issue month x anomaly flag, at each heatmap precision (see scraper/heatmap.py)"""
+    precision = models.SmallIntegerField()  # Length of geohash
+    geohash = models.CharField(max_length=12)
+    city = models.CharField(max_length=100)
+    month = models.DateField()  # First day of the issue month
+    cost_anomaly = models.BooleanField(default=False)  # Cells of flagged costs, left out of the map by default
+    
+    permit_count = models.BigIntegerField(default=0)
+    total_cost = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    
+    class Meta:
+        db_table = 'permit_grid_cells'
+        ordering = ['precision', 'geohash']
+        constraints = [
+            # Also the index for the heatmap query (precision, then a geohash range)
+            models.UniqueConstraint(
+                fields=['precision', 'geohash', 'city', 'month', 'cost_anomaly'], name='permit_grid_cells_uniq'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['precision', 'city', 'month'], name='permit_grid_city_month_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.geohash} {self.city} {self.month:%Y-%m}: {self.permit_count}"
+
+
+class ReplicationWatermark(models.Model):
+    """Single row whose version the primary bumps after each ingest (see scraper/replicas.py)
+    
+    A replica showing the primary's version has replayed everything written before the bump.
+    """
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'replication_watermark'
+    
+    def __str__(self):
+        return f"Watermark {self.version}"
@@ -0,0 +1,133 @@
+"""
+Live scraper run progress for the runs/<run_id>/events/ stream.
+
+A client following a run keeps its connection open for the whole scrape, so
+a waiting stream must cost next to nothing. Streams never query the
+database themselves: they subscribe to their event loop's RunWatcher, which
+reads every watched run in one query per RUN_EVENTS_POLL_SECONDS and hands
+each subscriber the latest state of its run. Hundreds of open streams cost
+one small query per interval and no threads; a stream only writes when its
+run changed, plus a keep-alive comment every RUN_EVENTS_KEEPALIVE_SECONDS.
+
+Events are server-sent events (text/event-stream): "progress" with the run's
+PROGRESS_FIELDS whenever they change, then "done" once the run is no longer
+running.
+"""
+
+import json
+import asyncio
+import logging
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+
+from .models import ScraperRun
+
+logger = logging.getLogger('scraper')
+
+# ScraperRun fields sent with every progress event
+PROGRESS_FIELDS = [
+    'run_id', 'status', 'started_at', 'completed_at', 'duration_seconds',
+    'total_permits_found', 'anomalous_permits_found', 'cities_processed', 'errors',
+]
+
+
+def run_states(run_ids):
+    """{run_id: PROGRESS_FIELDS dict} for the runs that exist"""
+    return {row['run_id']: row for row in ScraperRun.objects.filter(run_id__in=run_ids).values(*PROGRESS_FIELDS)}
+
+
+class RunWatcher:
+    """Polls the watched runs for every subscriber of one event loop"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.subscribers = {}  # run_id -> set of asyncio.Queue
+        self.task = None
+
+    def subscribe(self, run_id):
+        queue = asyncio.Queue(maxsize=1)
+        self.subscribers.setdefault(run_id, set()).add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._poll())
+        return queue
+
+    def unsubscribe(self, run_id, queue):
+        queues = self.subscribers.get(run_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[run_id]
+
+    @staticmethod
+    def _read(run_ids):
+        try:
+            return run_states(run_ids)
+        finally:
+            # Runs in a pool thread outside any request; don't leave its connection open
+            connection.close()
+
+    async def _poll(self):
+        while self.subscribers:
+            await asyncio.sleep(self.interval)
+            if not self.subscribers:
+                break
+            try:
+                states = await sync_to_async(self._read, thread_sensitive=False)(list(self.subscribers))
+            except Exception as e:
+                logger.error(f"Failed to poll scraper run progress: {e}")
+                continue
+            for run_id, queues in list(self.subscribers.items()):
+                state = states.get(run_id)
+                for queue in queues:
+                    # Only the newest state matters; replace one the stream has not read yet
+                    if queue.full():
+                        queue.get_nowait()
+                    queue.put_nowait(state)
+
+
+_watchers = weakref.WeakKeyDictionary()
+
+
+def run_watcher():
+    """The RunWatcher of the running event loop"""
+    loop = asyncio.get_running_loop()
+    watcher = _watchers.get(loop)
+    if watcher is None:
+        watcher = _watchers[loop] = RunWatcher(settings.RUN_EVENTS_POLL_SECONDS)
+    return watcher
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def run_events(run_id, state):
+    """Server-sent events for a run, starting from its current state"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.RUN_EVENTS_MAX_SECONDS
+    watcher = run_watcher()
+    queue = watcher.subscribe(run_id)
+    try:
+        yield _event('progress', state)
+        while state['status'] == 'running':
+            timeout = min(settings.RUN_EVENTS_KEEPALIVE_SECONDS, deadline - loop.time())
+            if timeout <= 0:
+                return
+            try:
+                latest = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if latest is None:
+                yield _event('error', {'error': f'Scraper run {run_id} no longer exists'})
+                return
+            if latest != state:
+                state = latest
+                yield _event('progress', state)
+        yield _event('done', state)
+    finally:
+        watcher.unsubscribe(run_id, queue)
@@ -0,0 +1,126 @@
+"""
+Per-request SQL accounting: query counts, DB time and N+1 detection.
+
+QueryRecorder hooks every database connection for the duration of a block and
+keeps the SQL and timing of each query. Queries are also reduced to a "shape"
+(literals and parameter lists collapsed), so a loop that issues the same
+statement for every row - the classic N+1 - shows up as one shape repeated
+many times.
+
+QueryBudgetMiddleware (scraper/middleware.py) logs requests that go over the
+budgets in settings.QUERY_BUDGET. QueryBudgetTestMixin gives endpoint tests
+assertions that pin a view's query count.
+"""
+
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def query_shape(sql):
+    """SQL with literals and IN (...) lists collapsed, so repeats of one statement compare equal"""
+    shape = _STRING_LITERAL.sub('?', sql)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = shape.replace('%s', '?')
+    shape = _PLACEHOLDER_LIST.sub('(...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class QueryRecorder:
+    """Record every query run on any connection while the recorder is active"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'seconds': time.monotonic() - started,
+                'alias': context['connection'].alias,
+            })
+
+    def _hook(self, stack):
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(self))
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            self._hook(stack)
+            yield self
+
+    @asynccontextmanager
+    async def arecord(self):
+        """record() for async views, whose ORM calls run in the request's sync thread
+
+        Connections are per thread, so the wrappers are installed (and removed)
+        from that thread rather than the event loop's.
+        """
+        stack = ExitStack()
+        await sync_to_async(self._hook)(stack)
+        try:
+            yield self
+        finally:
+            await sync_to_async(stack.close)()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def seconds(self):
+        return sum(q['seconds'] for q in self.queries)
+
+    def repeated_shapes(self, threshold):
+        """[(shape, count)] of statements issued at least threshold times, most repeated first"""
+        shapes = Counter(query_shape(q['sql']) for q in self.queries)
+        return [(shape, n) for shape, n in shapes.most_common() if n >= threshold]
+
+
+def budget_for(view_name):
+    """(max queries, max DB seconds) for a view, from settings.QUERY_BUDGET"""
+    budget = settings.QUERY_BUDGET
+    override = budget.get('views', {}).get(view_name, {})
+    return (
+        override.get('max_queries', budget.get('max_queries')),
+        override.get('max_seconds', budget.get('max_seconds')),
+    )
+
+
+class QueryBudgetTestMixin:
+    """Assertions for TestCase subclasses that pin an endpoint's query behaviour"""
+
+    @contextmanager
+    def assertMaxQueries(self, max_queries, n_plus_one_threshold=None):
+        """Fail if the block runs more than max_queries queries or repeats a query shape"""
+        recorder = QueryRecorder()
+        with recorder.record():
+            yield recorder
+        details = '\n'.join(f"  {q['sql']}" for q in recorder.queries)
+        self.assertLessEqual(
+            recorder.count, max_queries,
+            f"{recorder.count} queries executed, at most {max_queries} expected:\n{details}"
+        )
+        if n_plus_one_threshold is not None:
+            self.assertNoRepeatedQueries(recorder, n_plus_one_threshold)
+
+    def assertNoRepeatedQueries(self, recorder, threshold=2):
+        repeated = recorder.repeated_shapes(threshold)
+        self.assertFalse(
+            repeated,
+            'Repeated query shapes (possible N+1):\n' + '\n'.join(f'  {n}x {s}' for s, n in repeated)
+        )
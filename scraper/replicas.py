@@ -0,0 +1,177 @@
+"""
+Read-replica routing for the heavy read endpoints.
+
+Large exports, dashboard aggregates and admin change lists would otherwise
+compete with ingestion on the primary. settings.DATABASE_READ_ALIAS names
+the database they may read from instead (a replica; 'default' when none is
+configured, which turns all of this off).
+
+ReadReplicaMiddleware (scraper/middleware.py) opens a routing context for
+every request, and ReadReplicaRouter sends a read to the replica only when:
+
+- the request is a GET/HEAD to a view in settings.REPLICA_READ_VIEWS (URL
+  names, fnmatch patterns such as 'admin:*_changelist');
+- it has not written anything itself, and the client is not pinned: a
+  request that writes sets a cookie that keeps the client on the primary for
+  REPLICA_PIN_SECONDS, so it reads its own writes while replication catches
+  up;
+- the replica is current. Ingestion bumps the version of the single
+  ReplicationWatermark row on the primary once its rows are committed;
+  replication replays in commit order, so a replica showing the primary's
+  version (within REPLICA_MAX_VERSION_LAG) has every row written before the
+  bump. Both versions are compared at most every
+  REPLICA_WATERMARK_CHECK_SECONDS per process, and a replica that is behind
+  or unreachable sends reads to the primary.
+
+Everything else - writes, sessions, other views, background threads - uses
+the primary. The routing state lives in a contextvar, so it follows async
+views into sync_to_async; a response streamed after the view returns should
+bind its queryset with .using(queryset.db) while the context is open.
+"""
+
+import time
+import logging
+import threading
+from contextvars import ContextVar
+from fnmatch import fnmatchcase
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger('scraper')
+
+# Always read from the primary: the session must see what the last request wrote
+PRIMARY_ONLY_APPS = {'sessions'}
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class RoutingState:
+    """Where one request's reads may go"""
+
+    def __init__(self, request, pinned=False):
+        self.request = request
+        self.pinned = pinned  # The client wrote recently (pin cookie)
+        self.wrote = False  # This request wrote
+        self.replica_view = None  # Decided once the URL is resolved
+
+    def wants_replica(self):
+        if self.replica_view is None:
+            request = self.request
+            match = getattr(request, 'resolver_match', None)
+            if match is None:
+                # Not resolved yet (middleware reading early); ask again later
+                return False
+            self.replica_view = request.method in SAFE_METHODS and any(
+                fnmatchcase(match.view_name, pattern) for pattern in settings.REPLICA_READ_VIEWS
+            )
+        return self.replica_view and not (self.pinned or self.wrote)
+
+
+_state = ContextVar('replica_routing', default=None)
+
+
+def begin(request):
+    """Open the routing context of a request; returns the token for end()"""
+    pinned = settings.REPLICA_PIN_COOKIE in request.COOKIES
+    return _state.set(RoutingState(request, pinned=pinned))
+
+
+def end(token):
+    """Close the routing context; returns its RoutingState"""
+    state = _state.get()
+    _state.reset(token)
+    return state
+
+
+def read_alias():
+    return settings.DATABASE_READ_ALIAS
+
+
+def watermark(alias):
+    """Watermark version as seen by one database (0 before the first bump)"""
+    from .models import ReplicationWatermark
+
+    return ReplicationWatermark.objects.using(alias).filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+_checked = {'at': None, 'current': False}
+_check_lock = threading.Lock()
+
+
+def replica_current():
+    """Whether the replica has caught up with the primary's watermark (cached briefly)"""
+    now = time.monotonic()
+    with _check_lock:
+        if _checked['at'] is not None and now - _checked['at'] < settings.REPLICA_WATERMARK_CHECK_SECONDS:
+            return _checked['current']
+        was_current = _checked['current']
+    # Outside the lock: an unreachable replica must not hold up every other thread
+    try:
+        primary, replica = watermark(DEFAULT_DB_ALIAS), watermark(read_alias())
+        current = replica >= primary - settings.REPLICA_MAX_VERSION_LAG
+        if current != was_current:
+            logger.info(
+                f"Read replica {read_alias()} {'caught up' if current else 'is behind'} "
+                f"(watermark {replica}, primary {primary})"
+            )
+    except Exception as e:
+        logger.warning(f"Could not read the watermark of {read_alias()}, reading from the primary: {e}")
+        current = False
+    with _check_lock:
+        _checked.update(at=now, current=current)
+    return current
+
+
+def bump_watermark():
+    """Advance the primary's watermark; call once the rows it covers are committed"""
+    from .models import ReplicationWatermark
+
+    try:
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            updated = ReplicationWatermark.objects.using(DEFAULT_DB_ALIAS).filter(pk=1).update(
+                version=F('version') + 1, updated_at=timezone.now()
+            )
+            if not updated:
+                ReplicationWatermark.objects.using(DEFAULT_DB_ALIAS).create(pk=1, version=1)
+    except Exception as e:
+        # Replicas may then serve reads before they have these rows, but ingestion goes on
+        logger.error(f"Could not advance the replication watermark: {e}")
+    # This process knows the replica is behind now; don't wait for the next check
+    with _check_lock:
+        _checked.update(at=None, current=False)
+
+
+class ReadReplicaRouter:
+    """Reads of REPLICA_READ_VIEWS to DATABASE_READ_ALIAS when safe; everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        # Never None: Django would then follow an object read from the replica
+        # back to the replica, even outside a replica request
+        alias = read_alias()
+        if alias == DEFAULT_DB_ALIAS or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        state = _state.get()
+        if state is not None and state.wants_replica() and replica_current():
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            state.wrote = True
+        # Explicitly: Django would otherwise write an instance back to the database it was read from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, read_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication
+        if db != DEFAULT_DB_ALIAS and db == read_alias():
+            return False
+        return None
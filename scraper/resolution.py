@@ -0,0 +1,238 @@
+"""
+Contractor entity resolution.
+
+The same firm is scraped as "ABC Construction Corp", "ABC CONSTRUCTION CORP."
+and "Abc Construction Corporation". Every contractor Party (one spelling) is
+assigned a ContractorEntity (the firm), and the entity id is stable across
+runs, so contractor analytics can group by it.
+
+Names are first normalized (case, accents, punctuation, '&', common
+abbreviations, trailing legal suffixes such as Inc/Corp/LLC). Equal
+normalized names are the same entity. Anything else is only compared with
+the entities sharing one of its blocking keys - its first and last
+characters (n-grams of its non-generic words run together) and its two
+longest non-generic words - instead of with every known name. Within a block the best trigram
+similarity above settings.CONTRACTOR_MATCH_THRESHOLD wins; otherwise the name
+starts a new entity.
+
+The blocking keys are persisted (ContractorBlockKey), and parties keep their
+entity, so each run only resolves names it has not seen before and only
+loads the blocks those names fall into.
+"""
+
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import ContractorBlockKey, ContractorEntity, Party, Permit
+
+logger = logging.getLogger('scraper')
+
+RESOLVE_BATCH_SIZE = 10000
+
+# Dropped from the end of a name ("abc construction corp" -> "abc construction")
+LEGAL_SUFFIXES = {
+    'inc', 'incorporated', 'corp', 'corporation', 'co', 'company', 'llc', 'lc', 'ltd', 'limited',
+    'lp', 'llp', 'pc', 'pllc', 'plc', 'pa',
+}
+
+ABBREVIATIONS = {
+    'bros': 'brothers', 'const': 'construction', 'constr': 'construction', 'cnstr': 'construction',
+    'contr': 'contractors', 'contrs': 'contractors', 'svc': 'services', 'svcs': 'services',
+    'intl': 'international', 'mgmt': 'management', 'elec': 'electric', 'mech': 'mechanical',
+    'gen': 'general', 'dev': 'development', 'assoc': 'associates', 'grp': 'group', 'bldrs': 'builders',
+    'ent': 'enterprises', 'natl': 'national', 'amer': 'american',
+}
+
+# Words too common in contractor names to identify a block
+GENERIC_WORDS = {
+    'and', 'the', 'of', 'construction', 'contractors', 'contractor', 'contracting', 'builders',
+    'building', 'build', 'general', 'group', 'services', 'service', 'development', 'company',
+    'associates', 'enterprises', 'solutions', 'systems', 'home', 'homes', 'design', 'management',
+    'electric', 'electrical', 'plumbing', 'roofing', 'mechanical', 'restoration', 'renovation',
+    'renovations', 'improvement', 'improvements', 'new', 'york', 'city', 'national', 'american',
+}
+
+# Length of the leading/trailing character n-gram keys
+NGRAM_KEY_SIZE = 5
+
+
+def normalize_name(name):
+    """Comparable form of a firm name: 'ABC Construction Corp.' -> 'abc construction'"""
+    text = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode().lower()
+    text = text.split(' dba ')[0].split(' d/b/a ')[0]
+    # 'L.L.C.' -> 'llc', "o'brien" -> 'obrien'
+    text = text.replace('&', ' and ').replace('.', '').replace("'", '')
+    words = [ABBREVIATIONS.get(word, word) for word in re.findall(r'[a-z0-9]+', text)]
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    if len(words) > 1 and words[0] == 'the':
+        words.pop(0)
+    return ' '.join(words)[:200]
+
+
+def block_keys(normalized):
+    """Blocking keys of a normalized name; similar names share at least one"""
+    words = [word for word in normalized.split() if word not in GENERIC_WORDS] or normalized.split()
+    # N-grams of the distinctive words only - "...construction" would put half the names in one block
+    compact = ''.join(words)
+    keys = {f"n:{compact[:NGRAM_KEY_SIZE]}", f"n:{compact[-NGRAM_KEY_SIZE:]}"}
+    # Longer words are rarer, so make smaller blocks
+    keys.update(f"w:{word}" for word in sorted({w for w in words if len(w) >= 3}, key=lambda w: (-len(w), w))[:2])
+    return keys
+
+
+def trigrams(normalized):
+    padded = f"  {normalized} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class ContractorResolver:
+    """Resolves names to entity ids for one run, loading only the blocks it needs"""
+
+    def __init__(self, threshold=None, max_block_size=None):
+        self.threshold = threshold if threshold is not None else settings.CONTRACTOR_MATCH_THRESHOLD
+        self.max_block_size = max_block_size or settings.CONTRACTOR_MAX_BLOCK_SIZE
+        self.entity_ids = {}  # entity normalized name -> id (None until inserted)
+        self.matches = {}  # any normalized name -> its entity's normalized name
+        self.blocks = defaultdict(set)  # block key -> entity normalized names
+        self.loaded_keys = set()
+        self._grams = {}
+
+    def _similarity(self, a, b):
+        grams_a = self._grams.get(a) or self._grams.setdefault(a, trigrams(a))
+        grams_b = self._grams.get(b) or self._grams.setdefault(b, trigrams(b))
+        # Jaccard >= t needs the smaller set to be at least t times the larger
+        small, large = sorted((len(grams_a), len(grams_b)))
+        if small < self.threshold * large:
+            return 0.0
+        shared = len(grams_a & grams_b)
+        return shared / (len(grams_a) + len(grams_b) - shared)
+
+    def _add_entity(self, normalized, entity_id):
+        self.entity_ids[normalized] = entity_id
+        self.matches[normalized] = normalized
+        for key in block_keys(normalized):
+            self.blocks[key].add(normalized)
+
+    def _load(self, normalized_names):
+        """Known exact matches and the blocks of the names still unmatched"""
+        unknown = [name for name in normalized_names if name not in self.matches]
+        for start in range(0, len(unknown), 1000):
+            chunk = unknown[start:start + 1000]
+            for entity_id, normalized in ContractorEntity.objects.filter(
+                normalized_name__in=chunk
+            ).values_list('id', 'normalized_name'):
+                self._add_entity(normalized, entity_id)
+            # Spellings resolved by earlier runs
+            for normalized, entity_id, entity_name in Party.objects.filter(
+                normalized_name__in=chunk, entity__isnull=False
+            ).values_list('normalized_name', 'entity_id', 'entity__normalized_name'):
+                self.entity_ids.setdefault(entity_name, entity_id)
+                self.matches.setdefault(normalized, entity_name)
+
+        keys = set()
+        for name in unknown:
+            if name not in self.matches:
+                keys.update(block_keys(name))
+        keys -= self.loaded_keys
+        self.loaded_keys |= keys
+        keys = sorted(keys)
+        for start in range(0, len(keys), 1000):
+            for key, entity_id, normalized in ContractorBlockKey.objects.filter(
+                key__in=keys[start:start + 1000]
+            ).values_list('key', 'entity_id', 'entity__normalized_name'):
+                self.entity_ids.setdefault(normalized, entity_id)
+                self.matches.setdefault(normalized, normalized)
+                self.blocks[key].add(normalized)
+
+    def _match(self, normalized):
+        """Entity normalized name for an unseen name, creating the entity if nothing is close enough"""
+        candidates = set()
+        for key in block_keys(normalized):
+            block = self.blocks.get(key)
+            # A huge block means a key too common to tell firms apart
+            if block and len(block) <= self.max_block_size:
+                candidates |= block
+        best, best_score = None, self.threshold
+        for candidate in candidates:
+            score = self._similarity(normalized, candidate)
+            if score >= best_score and (best is None or score > best_score or candidate < best):
+                best, best_score = candidate, score
+        if best is None:
+            self._add_entity(normalized, None)
+            return normalized
+        self.matches[normalized] = best
+        return best
+
+    def resolve(self, names):
+        """{name: entity id} for raw names; blank names are left out"""
+        normalized = {name: normalize_name(name) for name in names}
+        normalized = {name: value for name, value in normalized.items() if value}
+        self._load(sorted(set(normalized.values())))
+
+        created = {}  # entity normalized name -> first spelling
+        for name in sorted(normalized, key=lambda n: normalized[n]):
+            value = normalized[name]
+            entity = self.matches.get(value) or self._match(value)
+            if self.entity_ids[entity] is None:
+                created.setdefault(entity, name)
+        if created:
+            self._insert(created)
+        return {name: self.entity_ids[self.matches[value]] for name, value in normalized.items()}
+
+    def _insert(self, created):
+        with transaction.atomic():
+            # ignore_conflicts: a concurrent run may create the same entity first
+            ContractorEntity.objects.bulk_create([
+                ContractorEntity(name=name[:200], normalized_name=normalized)
+                for normalized, name in created.items()
+            ], batch_size=1000, ignore_conflicts=True)
+            names = list(created)
+            for start in range(0, len(names), 1000):
+                self.entity_ids.update({
+                    normalized: entity_id for entity_id, normalized in ContractorEntity.objects.filter(
+                        normalized_name__in=names[start:start + 1000]
+                    ).values_list('id', 'normalized_name')
+                })
+            ContractorBlockKey.objects.bulk_create([
+                ContractorBlockKey(key=key, entity_id=self.entity_ids[normalized])
+                for normalized in created for key in block_keys(normalized)
+            ], batch_size=1000, ignore_conflicts=True)
+
+    def resolve_parties(self, parties=None):
+        """Assign an entity to every unresolved party in `parties` (default: all of them)
+
+        Returns the number of parties resolved.
+        """
+        parties = (Party.objects.all() if parties is None else parties).filter(entity__isnull=True)
+        resolved = 0
+        last_id = 0
+        while True:
+            batch = list(parties.filter(id__gt=last_id).order_by('id').only('id', 'name')[:RESOLVE_BATCH_SIZE])
+            if not batch:
+                return resolved
+            last_id = batch[-1].id
+            entity_ids = self.resolve(party.name for party in batch)
+            for party in batch:
+                party.normalized_name = normalize_name(party.name) or None
+                party.entity_id = entity_ids.get(party.name)
+            Party.objects.bulk_update(batch, ['normalized_name', 'entity'], batch_size=1000)
+            resolved += len(batch)
+
+
+def resolve_contractors(rebuild=False):
+    """Resolve every contractor party not yet assigned an entity (all of them with rebuild=True)"""
+    if rebuild:
+        with transaction.atomic():
+            Party.objects.update(entity=None, normalized_name=None)
+            ContractorBlockKey.objects.all().delete()
+            ContractorEntity.objects.all().delete()
+    contractor_ids = Permit.objects.filter(contractor__entity__isnull=True).values('contractor_id')
+    resolved = ContractorResolver().resolve_parties(Party.objects.filter(id__in=contractor_ids))
+    logger.info(f"Resolved {resolved} contractor names to {ContractorEntity.objects.count()} entities")
+    return resolved
@@ -0,0 +1,290 @@
+"""
+Permit rollup cube: count, sum, min and max of estimated cost per
+city x issue month x work type x cost bucket x cost anomaly flag.
+
+Permits the engine flagged as cost anomalies (permit_scraper/anomaly.py)
+land in their own cells, so totals can leave them out with one filter
+(HEADLINE, the default of the dashboard and the /rollups/ API).
+
+Aggregates (dashboard totals, export page, the /rollups/ API) read the
+PermitRollup cells instead of scanning the permits table, so they cost
+O(cells) rather than O(rows).
+
+The cube is kept current incrementally: ingestion passes the old and new
+cell of every permit it inserts or changes to apply_changes() inside its own
+transaction, and single-row saves/deletes (admin, API) go through the
+signal handlers below. Count and sum are adjusted directly; a cell only
+gets recomputed from the permits table when a removed cost was its min or
+max. rebuild_rollups() recomputes everything in one GROUP BY, for bulk loads
+that bypass the ORM (seed_permits).
+"""
+
+import bisect
+import logging
+import threading
+from datetime import date
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncMonth
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import City, Permit, PermitRollup
+
+logger = logging.getLogger('scraper')
+
+# Lower bound of each cost bucket; a permit falls in the last bound <= its cost
+COST_BUCKETS = [0, 100_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000, 100_000_000]
+
+DIMENSIONS = ['city', 'month', 'work_type', 'cost_bucket', 'cost_anomaly']
+
+# Cells counted in headline totals
+HEADLINE = {'cost_anomaly': False}
+
+
+def cost_bucket(cost):
+    return max(bisect.bisect_right(COST_BUCKETS, cost) - 1, 0)
+
+
+def _money(amount):
+    if amount >= 1_000_000:
+        return f"${amount // 1_000_000}M"
+    if amount >= 1_000:
+        return f"${amount // 1_000}K"
+    return f"${amount}"
+
+
+def cost_bucket_label(index):
+    low = COST_BUCKETS[index]
+    if index + 1 < len(COST_BUCKETS):
+        return f"{_money(low)}-{_money(COST_BUCKETS[index + 1])}"
+    return f"{_money(low)}+"
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def cell_for(city, issue_date, work_type, cost, cost_anomaly=False):
+    """Rollup key of one permit"""
+    return (city, month_start(issue_date), work_type or '', cost_bucket(cost), bool(cost_anomaly))
+
+
+def _cell_permits(key, permit_model=Permit):
+    """Permits falling in one rollup cell"""
+    city, month, work_type, bucket, cost_anomaly = key
+    queryset = permit_model.objects.filter(
+        city__name=city, issue_date__gte=month, issue_date__lt=next_month(month),
+        estimated_cost__gte=COST_BUCKETS[bucket], cost_anomaly=cost_anomaly
+    )
+    if bucket + 1 < len(COST_BUCKETS):
+        queryset = queryset.filter(estimated_cost__lt=COST_BUCKETS[bucket + 1])
+    if work_type:
+        return queryset.filter(work_type=work_type)
+    return queryset.filter(Q(work_type='') | Q(work_type__isnull=True))
+
+
+def _recompute(cell):
+    totals = _cell_permits((cell.city, cell.month, cell.work_type, cell.cost_bucket, cell.cost_anomaly)).aggregate(
+        count=Count('id'), total=Sum('estimated_cost'), low=Min('estimated_cost'), high=Max('estimated_cost')
+    )
+    if not totals['count']:
+        if cell.pk:
+            cell.delete()
+        return
+    cell.permit_count = totals['count']
+    cell.total_cost = totals['total']
+    cell.min_cost = totals['low']
+    cell.max_cost = totals['high']
+    cell.save()
+
+
+def apply_changes(removed=(), added=()):
+    """Adjust the cube for permits leaving and entering cells
+
+    removed/added are iterables of (cell key, cost). Must run inside the
+    transaction that writes the permits, so the cube and the rows commit together.
+    """
+    deltas = {}
+    for sign, entries in ((-1, removed), (1, added)):
+        for key, cost in entries:
+            cost = Decimal(cost)
+            delta = deltas.setdefault(key, {'count': 0, 'total': Decimal(0), 'low': None, 'high': None, 'removed': []})
+            delta['count'] += sign
+            delta['total'] += sign * cost
+            if sign > 0:
+                delta['low'] = cost if delta['low'] is None else min(delta['low'], cost)
+                delta['high'] = cost if delta['high'] is None else max(delta['high'], cost)
+            else:
+                delta['removed'].append(cost)
+    if not deltas:
+        return
+
+    cells = {
+        (c.city, c.month, c.work_type, c.cost_bucket, c.cost_anomaly): c
+        for c in PermitRollup.objects.select_for_update().filter(
+            city__in={key[0] for key in deltas}, month__in={key[1] for key in deltas}
+        )
+    }
+    new_cells, changed_cells, stale_cells = [], [], []
+    for key, delta in deltas.items():
+        cell = cells.get(key)
+        if cell is None:
+            if delta['count'] > 0 and not delta['removed']:
+                city, month, work_type, bucket, cost_anomaly = key
+                new_cells.append(PermitRollup(
+                    city=city, month=month, work_type=work_type, cost_bucket=bucket, cost_anomaly=cost_anomaly,
+                    permit_count=delta['count'], total_cost=delta['total'],
+                    min_cost=delta['low'], max_cost=delta['high'],
+                ))
+            else:
+                # Removal from a cell that was never rolled up - rebuild it from the rows
+                stale_cells.append(PermitRollup(**dict(zip(DIMENSIONS, key))))
+            continue
+        # A removed extreme means min/max can only be found again from the rows
+        if any(cost in (cell.min_cost, cell.max_cost) for cost in delta['removed']):
+            stale_cells.append(cell)
+            continue
+        cell.permit_count += delta['count']
+        cell.total_cost += delta['total']
+        if delta['low'] is not None:
+            cell.min_cost = delta['low'] if cell.min_cost is None else min(cell.min_cost, delta['low'])
+            cell.max_cost = delta['high'] if cell.max_cost is None else max(cell.max_cost, delta['high'])
+        changed_cells.append(cell)
+
+    PermitRollup.objects.bulk_create(new_cells)
+    empty = [cell.pk for cell in changed_cells if cell.permit_count <= 0]
+    if empty:
+        PermitRollup.objects.filter(pk__in=empty).delete()
+    PermitRollup.objects.bulk_update(
+        [cell for cell in changed_cells if cell.permit_count > 0],
+        ['permit_count', 'total_cost', 'min_cost', 'max_cost']
+    )
+    for cell in stale_cells:
+        _recompute(cell)
+
+
+def rebuild_rollups():
+    """Recompute the whole cube from the permits table (one GROUP BY)"""
+    bucket = Case(
+        *[When(estimated_cost__gte=low, then=Value(i)) for i, low in reversed(list(enumerate(COST_BUCKETS)))],
+        default=Value(0), output_field=IntegerField()
+    )
+    rows = (
+        Permit.objects
+        .annotate(rollup_city=F('city__name'), rollup_month=TruncMonth('issue_date'),
+                  rollup_work_type=Coalesce('work_type', Value('')), rollup_bucket=bucket)
+        .values('rollup_city', 'rollup_month', 'rollup_work_type', 'rollup_bucket', 'cost_anomaly')
+        .annotate(count=Count('id'), total=Sum('estimated_cost'),
+                  low=Min('estimated_cost'), high=Max('estimated_cost'))
+        .order_by()
+    )
+    cells = [
+        PermitRollup(
+            city=row['rollup_city'], month=row['rollup_month'], work_type=row['rollup_work_type'],
+            cost_bucket=row['rollup_bucket'], cost_anomaly=row['cost_anomaly'], permit_count=row['count'],
+            total_cost=row['total'], min_cost=row['low'], max_cost=row['high'],
+        )
+        for row in rows.iterator()
+    ]
+    with transaction.atomic():
+        PermitRollup.objects.all().delete()
+        PermitRollup.objects.bulk_create(cells, batch_size=1000)
+    logger.info(f"Rebuilt permit rollups: {len(cells)} cells")
+    return len(cells)
+
+
+# Single-row saves and deletes (admin edits, API). Bulk ingestion calls
+# apply_changes() itself - bulk_create/bulk_update send no signals.
+
+@receiver(pre_save, sender=Permit)
+def _remember_cell(sender, instance, raw=False, **kwargs):
+    instance._rollup_before = None
+    if raw or instance.pk is None:
+        return
+    before = sender.objects.filter(pk=instance.pk).values(
+        'city__name', 'issue_date', 'work_type', 'estimated_cost', 'cost_anomaly'
+    ).first()
+    if before:
+        instance._rollup_before = (
+            cell_for(before['city__name'], before['issue_date'], before['work_type'], before['estimated_cost'],
+                     before['cost_anomaly']),
+            before['estimated_cost'],
+        )
+
+
+@receiver(post_save, sender=Permit)
+def _update_cell(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_rollup_before', None)
+    issue_date = instance.issue_date
+    if isinstance(issue_date, str):
+        issue_date = date.fromisoformat(issue_date)
+    cost = Decimal(str(instance.estimated_cost))
+    after = (cell_for(instance.city.name, issue_date, instance.work_type, cost, instance.cost_anomaly), cost)
+    if before != after:
+        with transaction.atomic():
+            apply_changes(removed=[before] if before else [], added=[after])
+
+
+class PermitDeletes:
+    """
+    Hands the permits removed by each delete to apply(permits, city_names) once it commits.
+
+    A queryset delete sends pre_delete for every row, then post_delete for every
+    row once they are all gone, so a cell recomputed for one row would already
+    miss the others: the rows of one delete are applied together, from an
+    on_commit hook of their own. A delete that rolls back drops its hook and
+    its rows with it, and the next delete starts afresh.
+    """
+
+    def __init__(self, apply):
+        self.apply = apply
+        self._local = threading.local()
+
+    def starting(self):
+        """pre_delete: the next post_delete belongs to a new delete"""
+        self._local.batch = None
+
+    def deleted(self, instance):
+        """post_delete"""
+        batch = getattr(self._local, 'batch', None)
+        if batch is None:
+            batch = self._local.batch = []
+            transaction.on_commit(partial(self._flush, batch))
+        batch.append(instance)
+
+    def _flush(self, permits):
+        # City names in one query for the whole delete, not instance.city per row
+        city_names = dict(City.objects.filter(id__in={p.city_id for p in permits}).values_list('id', 'name'))
+        with transaction.atomic():
+            self.apply(permits, city_names)
+
+
+def _remove_deleted(permits, city_names):
+    apply_changes(removed=[
+        (cell_for(city_names[p.city_id], p.issue_date, p.work_type, p.estimated_cost, p.cost_anomaly),
+         p.estimated_cost)
+        for p in permits
+    ])
+
+
+_deletes = PermitDeletes(_remove_deleted)
+
+
+@receiver(pre_delete, sender=Permit)
+def _delete_starting(sender, **kwargs):
+    _deletes.starting()
+
+
+@receiver(post_delete, sender=Permit)
+def _remove_from_cell(sender, instance, **kwargs):
+    _deletes.deleted(instance)
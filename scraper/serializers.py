@@ -1,11 +1,46 @@
 from rest_framework import serializers
-from .models import Permit, ScraperRun
+from .models import DuplicateCluster, ExportJob, Permit, PermitVersion, ScraperRun
 
 
 class PermitSerializer(serializers.ModelSerializer):
+    # Interned in dimension tables, exposed as the plain strings
+    city = serializers.CharField(source='city.name', read_only=True)
+    contractor_name = serializers.CharField(source='contractor.name', read_only=True, allow_null=True)
+    # Canonical firm id shared by every spelling of the contractor name (see scraper/resolution.py)
+    contractor_entity = serializers.IntegerField(source='contractor.entity_id', read_only=True, allow_null=True)
+    applicant_name = serializers.CharField(source='applicant.name', read_only=True, allow_null=True)
+    owner_name = serializers.CharField(source='owner.name', read_only=True, allow_null=True)
+    architect_name = serializers.CharField(source='architect.name', read_only=True, allow_null=True)
+    data_source = serializers.CharField(source='data_source.name', read_only=True, allow_null=True)
+    
     class Meta:
         model = Permit
-        fields = '__all__'
+        fields = [
+            'id', 'city', 'permit_id', 'issue_date', 'scraped_at', 'full_address', 'borough_area',
+            'zip_code', 'latitude', 'longitude', 'geohash', 'geocode_precision', 'project_description',
+            'work_type', 'estimated_cost', 'cost_anomaly', 'cost_anomaly_score', 'contractor_name', 'contractor_entity', 'contractor_license',
+            'applicant_name', 'owner_name', 'architect_name', 'license_status', 'business_address', 'business_phone', 'data_source', 'duplicate_cluster', 'created_at', 'updated_at',
+        ]
+
+
+class DuplicateClusterSerializer(serializers.ModelSerializer):
+    """Permits that look like the same job filed under different permit numbers"""
+    permit_count = serializers.IntegerField(read_only=True)
+    permits = PermitSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = DuplicateCluster
+        fields = ['id', 'permit_count', 'created_at', 'updated_at', 'permits']
+
+
+class PermitVersionSerializer(serializers.ModelSerializer):
+    """One change log entry: the values the change replaced"""
+    permit_number = serializers.CharField(source='permit.permit_id', read_only=True)
+    run_id = serializers.CharField(source='scraper_run.run_id', read_only=True, default=None)
+    
+    class Meta:
+        model = PermitVersion
+        fields = ['id', 'permit', 'permit_number', 'run_id', 'changed_at', 'changes']
 
 
 class ScraperRunSerializer(serializers.ModelSerializer):
@@ -14,12 +49,23 @@ class ScraperRunSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class ExportJobSerializer(serializers.ModelSerializer):
+    """Background CSV export; the file itself is downloaded from the admin"""
+    
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'status', 'filename', 'description', 'requested_by', 'row_count', 'size_bytes',
+            'error_message', 'created_at', 'started_at', 'completed_at', 'heartbeat_at',
+        ]
+
+
 class ScraperRunCreateSerializer(serializers.Serializer):
     """Serializer for starting a new scraper run"""
     cities = serializers.ListField(
         child=serializers.CharField(max_length=50),
         required=False,
-        help_text="List of cities to scrape (nyc, chicago, la, sf). If empty, all cities will be scraped."
+        help_text="List of city keys to scrape (see city_adapters.json). If empty, all cities will be scraped."
     )
     force_rescrape = serializers.BooleanField(
         default=False,
@@ -1,3 +1,1140 @@
-from django.test import TestCase
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import zlib
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import combinations
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+
+import MAIN_permit_scraper as engine
+import permit_scraper
+from benchmarks import api_load, import_time
+from permit_scraper import cli, master
+from permit_scraper.anomaly import CostStats, flag_cost_anomalies
+from permit_scraper.config import Config
+from permit_scraper.synthetic import generate_permit_frame
+
+from . import (
+    admin_perf, dimensions, duplicates, exports, geo, geocoding, metrics, replicas, resolution, uploads, zip_cache,
+)
+from .heatmap import DEFAULT_PRECISION, rebuild_grid
+from .ingest import permit_as_of, save_permits
+from .models import (
+    City, ContractorEntity, DuplicateCluster, ExportJob, Party, Permit, PermitGridCell, PermitLshBucket, PermitRollup,
+    PermitVersion, UploadSession, ZipCacheEntry,
+)
+from .querycount import QueryBudgetTestMixin
+from .rollups import rebuild_rollups
+
+
+class UploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = override_settings(
+            MEDIA_ROOT=media, UPLOAD_SESSION_DIR=os.path.join(media, 'uploads', 'partial'),
+            ZIP_CACHE_DIR=os.path.join(media, 'zip_cache'), UPLOAD_CHUNK_SIZE=10
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Small hash blocks, so a few bytes span several of them
+        for module in (zip_cache, uploads):
+            patch = mock.patch.object(module, 'BLOCK_SIZE', 4)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def send(self, session, data, offset, checksum=None):
+        chunk = data[offset:offset + session.chunk_size]
+        return uploads.write_chunk(session, offset, io.BytesIO(chunk), len(chunk), checksum or f'{zlib.crc32(chunk):08x}')
+
+    def test_resumable_upload(self):
+        data = b'permit bundle bytes, 30 long!!'
+        session = uploads.create_session('bundle.zip', len(data))
+        self.assertEqual(os.path.getsize(uploads.session_path(session)), len(data))
+        self.assertEqual(session.chunk_size, 12)  # Rounded up to whole hash blocks
+
+        self.send(session, data, 0)
+        with self.assertRaises(uploads.UploadError) as raised:
+            self.send(session, data, 12, checksum='00000000')
+        self.assertEqual(raised.exception.status, 422)
+        with self.assertRaises(uploads.UploadError) as raised:
+            self.send(session, data, 24)
+        self.assertEqual(raised.exception.status, 409)
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.complete_session(session)
+        self.assertEqual(raised.exception.status, 409)
+
+        # Resume from the offset the session reports
+        session.refresh_from_db()
+        self.assertEqual(session.received_bytes, 12)
+        self.send(session, data, 12)
+        self.send(session, data, 24)
+        processor = uploads.complete_session(session)
+
+        with open(processor.upload_file.path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(processor.content_hash, zip_cache.hash_file(processor.upload_file.path))
+        self.assertFalse(os.path.exists(uploads.session_path(session)))
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).status, 'complete')
+
+    def test_stale_sessions_are_purged(self):
+        stale = uploads.create_session('stale.zip', 10)
+        UploadSession.objects.filter(pk=stale.pk).update(
+            updated_at=timezone.now() - timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS + 1)
+        )
+        fresh = uploads.create_session('fresh.zip', 10)
+        self.assertEqual(list(UploadSession.objects.values_list('pk', flat=True)), [fresh.pk])
+        self.assertFalse(os.path.exists(uploads.session_path(stale)))
+
+
+class ZipCacheTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings_override = override_settings(ZIP_CACHE_DIR=os.path.join(self.media, 'zip_cache'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patch = mock.patch.object(zip_cache, 'BLOCK_SIZE', 4)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_content_hash_does_not_depend_on_pieces(self):
+        data = os.urandom(50)
+        whole, pieces = zip_cache.ContentHasher(), zip_cache.ContentHasher()
+        whole.update(data)
+        for start in range(0, len(data), 7):
+            pieces.update(data[start:start + 7])
+        self.assertEqual(whole.hexdigest(), pieces.hexdigest())
+        self.assertEqual(len(whole.block_digests), 13)
+        self.assertEqual(whole.hexdigest(), zip_cache.combine_block_digests(whole.block_digests))
+
+    def cached_output(self, content_hash, size=10):
+        path = os.path.join(self.media, f'{content_hash}.out')
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        return zip_cache.store(content_hash, path, files_count=1)
+
+    def test_lookup_and_eviction(self):
+        self.assertIsNone(zip_cache.lookup('a' * 64))
+        path = self.cached_output('a' * 64)
+        self.assertTrue(zip_cache.is_cache_path(path))
+        self.assertEqual(zip_cache.lookup('a' * 64).content_hash, 'a' * 64)
+        self.assertEqual(ZipCacheEntry.objects.get(content_hash='a' * 64).hits, 1)
+
+        with override_settings(ZIP_CACHE_MAX_ENTRIES=1):
+            self.cached_output('b' * 64)
+        self.assertEqual(list(ZipCacheEntry.objects.values_list('content_hash', flat=True)), ['b' * 64])
+        self.assertFalse(os.path.exists(path))
+
+        # An entry whose file is gone is dropped
+        os.remove(zip_cache.entry_path(ZipCacheEntry.objects.get()))
+        self.assertIsNone(zip_cache.lookup('b' * 64))
+        self.assertFalse(ZipCacheEntry.objects.exists())
+
+
+class CityFrameTests(TestCase):
+    def rows(self):
+        recent = (datetime.now() - timedelta(days=3)).strftime('%Y-%m-%dT00:00:00.000')
+        old = (datetime.now() - timedelta(days=400)).strftime('%Y-%m-%dT00:00:00.000')
+        base = {'house_no': '10', 'street_name': 'MAIN ST', 'borough': 'Manhattan', 'work_type': 'NB',
+                'zip_code': '10001', 'unused_blob': 'x' * 50}
+        return [
+            dict(base, job_filing_number='A1', estimated_job_costs='2500000', issued_date=recent),
+            dict(base, job_filing_number='A2', estimated_job_costs='900000', issued_date=recent),
+            dict(base, job_filing_number='A3', estimated_job_costs='3000000', issued_date=old),
+            dict(base, job_filing_number='A4', estimated_job_costs='not a number', issued_date=recent),
+            dict(base, job_filing_number='A5', estimated_job_costs='4000000', issued_date=recent),
+        ]
+
+    def test_filters_before_materializing_and_keeps_payload_positions(self):
+        df = engine.load_city_frame('nyc', self.rows(), min_cost=1000000, days_back=60)
+        self.assertEqual(list(df['job_filing_number']), ['A1', 'A5'])
+        self.assertEqual(list(df.index), [0, 4])
+
+    def test_projects_used_columns_with_compact_dtypes(self):
+        df = engine.load_city_frame('nyc', self.rows(), min_cost=1000000, days_back=60)
+        self.assertNotIn('unused_blob', df.columns)
+        self.assertEqual(str(df['estimated_job_costs'].dtype), 'Float64')
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df['issued_date']))
+        for column in ('city', 'borough', 'work_type'):
+            self.assertIsInstance(df[column].dtype, pd.CategoricalDtype)
+        self.assertEqual(list(df['city'].unique()), ['New York City'])
+
+    def test_unparseable_dates_skip_the_date_filter(self):
+        rows = self.rows() + [dict(self.rows()[0], job_filing_number='A6', issued_date='sometime soon')]
+        with self.assertLogs(level='WARNING') as logs:
+            df = engine.load_city_frame('nyc', rows, min_cost=1000000, days_back=60)
+        self.assertEqual(list(df['job_filing_number']), ['A1', 'A5', 'A6'])
+        self.assertTrue(pd.isna(df['issued_date'].iloc[-1]))
+        self.assertIn('1 New York City permits have no parseable issued_date', logs.output[0])
+
+    def test_missing_cost_column_returns_none(self):
+        self.assertIsNone(engine.load_city_frame('nyc', [{'job_filing_number': 'A1'}]))
+
+
+class FakeResponse:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def raise_for_status(self):
+        pass
+
+    @property
+    def content(self):
+        return json.dumps(self.rows).encode()
+
+    def json(self):
+        return self.rows
+
+
+class FakeSession:
+    def __init__(self, total):
+        self.rows = [{'permit_id': str(i)} for i in range(total)]
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(params)
+        offset, limit = params['$offset'], params['$limit']
+        return FakeResponse(self.rows[offset:offset + limit])
+
+
+class CityAdapterTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def registry(self, cities, defaults=None):
+        path = os.path.join(self.tmp, 'cities.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'defaults': defaults or {}, 'cities': cities}, f)
+        return engine.CityRegistry(path)
+
+    def adapter(self, **settings):
+        config = {'name': 'Testville', 'endpoint': 'https://example.test/permits.json',
+                  'fields': {'id': 'permit_id', 'cost': 'cost', 'date': 'issued'}}
+        config.update(settings)
+        return engine.CityAdapter('test', config)
+
+    def test_registry_merges_defaults_and_reloads(self):
+        registry = self.registry({'test': {'name': 'Testville'}}, defaults={'page_size': 50})
+        self.assertEqual(list(registry), ['test'])
+        self.assertEqual(registry['test'].page_size, 50)
+        self.assertIs(registry['test'], registry['test'])
+
+        other = self.registry({'other': {'name': 'Otherton', 'page_size': 10}})
+        registry.reload(other.path)
+        self.assertEqual(list(registry), ['other'])
+        self.assertEqual(registry['other'].page_size, 10)
+
+    def test_unknown_hook_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.adapter(hooks=['no_such_hook'])
+
+    def test_server_side_filters_add_where_clause(self):
+        self.assertNotIn('$where', self.adapter().query_params(1000000, 30, 0))
+        params = self.adapter(server_side_filters=True).query_params(1000000, 30, 0)
+        self.assertIn('cost > 1000000', params['$where'])
+        self.assertIn("issued >= '", params['$where'])
+
+    def test_fetch_pages_until_short_page(self):
+        session = FakeSession(25)
+        rows = engine.fetch_city_rows(self.adapter(page_size=10, max_rows=100, rate_limit=0), 0, 30, session=session)
+        self.assertEqual(len(rows), 25)
+        self.assertEqual([call['$offset'] for call in session.calls], [0, 10, 20])
+
+    def test_fetch_keeps_only_the_fields_read(self):
+        session = FakeSession(3)
+        for row in session.rows:
+            row.update(cost='2000000', issued='2024-03-15', location={'latitude': '41.8'}, unused_blob='x' * 50)
+        rows = engine.fetch_city_rows(self.adapter(page_size=10, rate_limit=0), 0, 30, session=session)
+        self.assertEqual(rows[0], {'permit_id': '0', 'cost': '2000000', 'issued': '2024-03-15'})
+
+    def test_fetch_stops_at_max_rows(self):
+        session = FakeSession(100)
+        rows = engine.fetch_city_rows(self.adapter(page_size=10, max_rows=25, rate_limit=0), 0, 30, session=session)
+        self.assertEqual(len(rows), 25)
+        self.assertEqual([call['$limit'] for call in session.calls], [10, 10, 5])
+
+
+class RunTimerTests(TestCase):
+    def test_spans_record_offsets_and_counts(self):
+        timer = engine.RunTimer()
+        with timer.span('nyc', 'filter') as span:
+            span['rows'] = 3
+        timer.add('nyc', 'fetch', time.monotonic(), 0.5, bytes=100)
+        spans = timer.as_list()
+        self.assertEqual([s['stage'] for s in spans], ['filter', 'fetch'])
+        self.assertEqual(spans[0]['rows'], 3)
+        self.assertGreaterEqual(spans[1]['start'], spans[0]['start'])
+        self.assertEqual(spans[1]['bytes'], 100)
+
+    def test_span_is_recorded_when_block_raises(self):
+        timer = engine.RunTimer()
+        with self.assertRaises(RuntimeError):
+            with timer.span('nyc', 'normalize'):
+                raise RuntimeError('boom')
+        self.assertEqual([s['stage'] for s in timer.as_list()], ['normalize'])
+
+    def test_stage_totals_sum_across_cities(self):
+        timer = engine.RunTimer()
+        timer.add('nyc', 'fetch', time.monotonic(), 1.0, bytes=10)
+        timer.add('chicago', 'fetch', time.monotonic(), 2.0, bytes=5)
+        timer.add('nyc', 'normalize', time.monotonic(), 0.25, rows=4)
+        totals = timer.stage_totals()
+        self.assertEqual(list(totals), ['fetch', 'normalize'])
+        self.assertEqual(totals['fetch'], {'seconds': 3.0, 'rows': 0, 'bytes': 15})
+        self.assertEqual(totals['normalize']['rows'], 4)
+
+    def test_fetch_and_decode_spans_per_request(self):
+        adapter = engine.CityAdapter('test', {'name': 'Testville', 'endpoint': 'https://example.test/permits.json',
+                                              'page_size': 10, 'max_rows': 100, 'rate_limit': 0,
+                                              'fields': {'id': 'permit_id', 'cost': 'cost', 'date': 'issued'}})
+        session = FakeSession(15)
+        timer = engine.RunTimer()
+        engine.fetch_city_rows(adapter, 0, 30, session=session, timer=timer)
+        spans = timer.as_list()
+        self.assertEqual([s['rows'] for s in spans if s['stage'] == 'decode'], [10, 5])
+        pages = (session.rows[:10], session.rows[10:])
+        self.assertEqual([s['bytes'] for s in spans if s['stage'] == 'fetch'],
+                         [len(json.dumps(page).encode()) for page in pages])
+
+
+class ApiLoadReportTests(TestCase):
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(api_load.percentile(values, 50), 50)
+        self.assertEqual(api_load.percentile(values, 95), 95)
+        self.assertEqual(api_load.percentile(values, 99), 99)
+        self.assertIsNone(api_load.percentile([], 95))
+
+    def test_summary_checks_each_endpoint_against_its_slo(self):
+        samples = [('detail', 200, 0.05, 300)] * 19 + [('detail', 500, 0.5, 0)]
+        samples += [('list', 200, 0.1, 2000)] * 10
+        slos = {'detail': {'p95_ms': 100, 'error_rate': 0.01}, 'list': {'p95_ms': 300, 'error_rate': 0.01}}
+        report = api_load.summarize(samples, 10.0, slos)
+
+        self.assertEqual(report['detail']['requests'], 20)
+        self.assertEqual(report['detail']['errors'], 1)
+        self.assertEqual(report['detail']['error_rate'], 0.05)
+        self.assertEqual(report['detail']['p95_ms'], 50.0)
+        self.assertFalse(report['detail']['slo_met'])
+        self.assertTrue(report['list']['slo_met'])
+        self.assertEqual(report['list']['rps'], 1.0)
+        self.assertEqual(report['list']['mean_bytes'], 2000)
+
+    def test_compare_flags_regressions_beyond_tolerance(self):
+        baseline = {'endpoints': {
+            'list': {'p95_ms': 100.0, 'rps': 50.0, 'error_rate': 0.0},
+            'detail': {'p95_ms': 20.0, 'rps': 100.0, 'error_rate': 0.0},
+        }}
+        report = {
+            'list': {'p95_ms': 105.0, 'rps': 49.0, 'error_rate': 0.0},
+            'detail': {'p95_ms': 30.0, 'rps': 80.0, 'error_rate': 0.05},
+            'search': {'p95_ms': 500.0, 'rps': 1.0, 'error_rate': 0.0},
+        }
+        regressions = api_load.compare(report, baseline, 0.10)
+        self.assertEqual([(kind, metric) for kind, metric, *_ in regressions],
+                         [('detail', 'p95_ms'), ('detail', 'rps'), ('detail', 'error_rate')])
+
+    def test_traffic_mix_only_emits_weighted_kinds(self):
+        mix = api_load.TrafficMix({'detail': 1, 'dashboard': 1}, [7], random.Random(0))
+        for _ in range(20):
+            kind, path = mix.next()
+            self.assertIn(kind, ('detail', 'dashboard'))
+            self.assertTrue(path.startswith(api_load.API))
+            if kind == 'detail':
+                self.assertEqual(path, f'{api_load.API}/permits/7/')
+
+
+class PackageImportTests(TestCase):
+    def test_worker_boot_does_not_load_scraping_dependencies(self):
+        loaded = {name for name, *_ in import_time.measure()}
+        self.assertIn('permit_scraper.cities', loaded)
+        self.assertFalse(loaded & set(import_time.HEAVY_MODULES))
+
+    def test_package_names_resolve_on_first_access(self):
+        self.assertIs(permit_scraper.RunTimer, engine.RunTimer)
+        self.assertIs(permit_scraper.load_city_frame, engine.load_city_frame)
+        self.assertIn('process_city', dir(permit_scraper))
+        with self.assertRaises(AttributeError):
+            permit_scraper.no_such_name
+
+
+class AdminPerfTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        city = City.objects.create(name='Chicago')
+        for i in range(7):
+            Permit.objects.create(
+                permit_id=f'ADM-{i}', city=city, issue_date=date(2024, 1, 1) + timedelta(days=i),
+                full_address=f'{i} Main St', project_description='Office renovation',
+                estimated_cost=Decimal('2000000'), license_status='ACTIVE' if i % 2 else 'EXPIRED',
+            )
+
+    def test_pages_keep_the_list_ordering(self):
+        paginator = admin_perf.EstimatedCountPaginator(Permit.objects.order_by('-issue_date'), 3)
+        self.assertEqual(paginator.count, 7)
+        pages = [[p.permit_id for p in paginator.page(n)] for n in paginator.page_range]
+        self.assertEqual(pages, [['ADM-6', 'ADM-5', 'ADM-4'], ['ADM-3', 'ADM-2', 'ADM-1'], ['ADM-0']])
+
+    def test_page_offsets_over_keys_only(self):
+        paginator = admin_perf.EstimatedCountPaginator(Permit.objects.order_by('-issue_date'), 3)
+        self.assertEqual(paginator.num_pages, 3)
+        with CaptureQueriesContext(connection) as queries:
+            list(paginator.page(3))
+        offset_query, rows_query = [query['sql'] for query in queries]
+        # The OFFSET reads only the primary key; full rows are fetched by key afterwards
+        self.assertIn('OFFSET', offset_query)
+        self.assertNotIn('project_description', offset_query)
+        self.assertNotIn('OFFSET', rows_query)
+
+    @override_settings(ADMIN_FILTERED_COUNT_LIMIT=2)
+    def test_filtered_count_is_bounded(self):
+        paginator = admin_perf.EstimatedCountPaginator(Permit.objects.filter(license_status='ACTIVE'), 10)
+        self.assertEqual(paginator.count, 2)
+
+    def test_filter_choices_come_from_the_cache_until_refreshed(self):
+        list_filter = admin_perf.cached_values_filter(Permit, 'license_status')
+        self.assertEqual(list_filter.parameter_name, 'license_status')
+        self.assertEqual(admin_perf.filter_choices(Permit, 'license_status'), ['ACTIVE', 'EXPIRED'])
+
+        Permit.objects.filter(permit_id='ADM-0').update(license_status='REVOKED')
+        with self.assertNumQueries(0):
+            self.assertEqual(admin_perf.filter_choices(Permit, 'license_status'), ['ACTIVE', 'EXPIRED'])
+        admin_perf.refresh_filter_choices()
+        self.assertEqual(admin_perf.filter_choices(Permit, 'license_status'), ['ACTIVE', 'EXPIRED', 'REVOKED'])
+
+    def test_boolean_mode_query_requires_every_indexable_word(self):
+        self.assertEqual(admin_perf.boolean_mode_query('smith roof'), '+smith* +roof*')
+        self.assertEqual(admin_perf.boolean_mode_query('a to Main-St'), '+Main*')
+        self.assertEqual(admin_perf.boolean_mode_query('!!'), '')
+
+
+def permit_data(permit_id, **fields):
+    """An engine permit dict as save_permits receives it"""
+    data = {
+        'permit_id': permit_id,
+        'city': 'Chicago',
+        'issue_date': '2024-03-15',
+        'scraped_at': '2024-03-16 08:00:00',
+        'full_address': '1200 W Madison St',
+        'zip_code': '60607',
+        'project_description': 'Interior renovation of office floor, new partitions and lighting',
+        'work_type': 'Renovation',
+        'estimated_cost': 1500000,
+        'contractor_name': 'Acme Builders LLC',
+        'data_source': 'Chicago Data Portal',
+    }
+    data.update(fields)
+    return data
+
+
+class IngestVersionTests(QueryBudgetTestMixin, TestCase):
+    def test_changed_fields_are_versioned(self):
+        original = permit_data('V1')
+        changed = permit_data('V1', estimated_cost=1750000, project_description='Gut renovation')
+        save_permits([original])
+        permit = Permit.objects.get(permit_id='V1')
+        before_change = timezone.now()
+
+        counts, errors = save_permits([changed])
+        self.assertEqual((counts, errors), ({'created': 0, 'updated': 1, 'unchanged': 0}, []))
+        version = PermitVersion.objects.get(permit=permit)
+        self.assertEqual(set(version.changes), {'estimated_cost', 'project_description'})
+        self.assertEqual(version.changes['project_description'], original['project_description'])
+
+        # The same data again changes nothing and logs nothing
+        counts, errors = save_permits([changed])
+        self.assertEqual(counts, {'created': 0, 'updated': 0, 'unchanged': 1})
+        self.assertEqual(PermitVersion.objects.filter(permit=permit).count(), 1)
+
+        permit.refresh_from_db()
+        then = permit_as_of(permit, before_change)
+        self.assertEqual(then.estimated_cost, Decimal(1500000))
+        self.assertEqual(then.project_description, original['project_description'])
+        self.assertEqual(permit_as_of(permit, timezone.now()).estimated_cost, Decimal(1750000))
+        self.assertIsNone(permit_as_of(permit, permit.created_at - timedelta(seconds=1)))
+
+    def test_ingest_queries_do_not_grow_with_the_batch(self):
+        def batch(first, size):
+            # No two alike, so no duplicate clusters to form
+            return [
+                permit_data(f'B{i}', full_address=f'{i} W Madison St', project_description=f'Unrelated job number {i}')
+                for i in range(first, first + size)
+            ]
+
+        save_permits(batch(100, 5))
+        with self.assertMaxQueries(1000) as small:
+            save_permits(batch(200, 5))
+        # Small enough for one INSERT under SQLite's variable limit
+        with self.assertMaxQueries(small.count, n_plus_one_threshold=3):
+            save_permits(batch(300, 25))
+
+
+class UpkeepConsistencyTests(TestCase):
+    """Incremental rollup and grid upkeep ends where a full rebuild would"""
+
+    def setUp(self):
+        save_permits([
+            permit_data(f'U{i}', estimated_cost=600000 * (i + 1), issue_date=f'2024-0{1 + i % 3}-15',
+                        full_address=f'{100 + i} W Madison St', zip_code=['60607', '60611'][i % 2],
+                        project_description=f'Unrelated job number {i}')
+            for i in range(6)
+        ])
+
+    @staticmethod
+    def state():
+        rollups = sorted(PermitRollup.objects.exclude(permit_count=0).values_list(
+            'city', 'month', 'work_type', 'cost_bucket', 'cost_anomaly', 'permit_count', 'total_cost', 'min_cost', 'max_cost'
+        ))
+        grid = sorted(PermitGridCell.objects.exclude(permit_count=0).values_list(
+            'precision', 'geohash', 'city', 'month', 'cost_anomaly', 'permit_count', 'total_cost'
+        ))
+        return rollups, grid
+
+    def assertMatchesRebuild(self):
+        incremental = self.state()
+        rebuild_rollups()
+        rebuild_grid()
+        self.assertEqual(incremental, self.state())
+
+    def test_ingest_update(self):
+        # Other cost bucket, month, work type and position
+        save_permits([
+            permit_data('U0', estimated_cost=25000000, issue_date='2024-05-02', work_type='New Building', zip_code='60611'),
+            permit_data('U1', estimated_cost=650000, project_description='Unrelated job number 1'),
+            # Unchanged but re-flagged by the engine
+            permit_data('U2', estimated_cost=1800000, issue_date='2024-03-15', full_address='102 W Madison St',
+                        project_description='Unrelated job number 2', cost_anomaly=True, cost_anomaly_score=4.0),
+        ])
+        self.assertTrue(Permit.objects.get(permit_id='U2').cost_anomaly)
+        self.assertMatchesRebuild()
+
+    def test_model_save_and_delete(self):
+        permit = Permit.objects.get(permit_id='U2')
+        permit.estimated_cost = Decimal(9000000)
+        permit.issue_date = date(2023, 12, 1)
+        permit.cost_anomaly = True
+        permit.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Permit.objects.filter(permit_id__in=['U3', 'U4']).delete()
+        self.assertMatchesRebuild()
+
+
+class DimensionTests(TestCase):
+    def test_cache_resolves_a_batch_at_once(self):
+        Party.objects.create(name='Acme Builders LLC')
+        parties = dimensions.DimensionCache(Party)
+        with self.assertNumQueries(3):  # Lookup, insert of the new names, lookup of their ids
+            parties.resolve(['Acme Builders LLC', ' Crown Contractors ', None, '', 'Crown Contractors'])
+        with self.assertNumQueries(0):
+            parties.resolve(['Acme Builders LLC', 'Crown Contractors'])
+        self.assertEqual(parties.name_for(parties.id_for('  Crown Contractors')), 'Crown Contractors')
+        self.assertIsNone(parties.id_for(' '))
+        self.assertEqual(Party.objects.count(), 2)
+
+    def test_case_variants_are_separate_names(self):
+        # Two spellings in one batch; a case-insensitive unique name would drop one and lose the batch
+        counts, errors = save_permits([
+            permit_data('D1', contractor_name='ABC Construction Corp'),
+            permit_data('D2', contractor_name='ABC CONSTRUCTION CORP'),
+            permit_data('D3', contractor_name='Abc Construction Corp', city='CHICAGO'),
+        ])
+        self.assertEqual((counts['created'], errors), (3, []))
+        contractors = dict(Permit.objects.values_list('permit_id', 'contractor__name'))
+        self.assertEqual(contractors, {
+            'D1': 'ABC Construction Corp', 'D2': 'ABC CONSTRUCTION CORP', 'D3': 'Abc Construction Corp',
+        })
+        self.assertEqual(sorted(City.objects.values_list('name', flat=True)), ['CHICAGO', 'Chicago'])
+
+    def test_save_permits_interns_names(self):
+        counts, errors = save_permits([
+            permit_data('D1', contractor_name='Acme Builders LLC'),
+            permit_data('D2', contractor_name='Acme Builders LLC', data_source=None),
+        ])
+        self.assertEqual((counts['created'], errors), (2, []))
+        self.assertEqual(City.objects.count(), 1)
+        self.assertEqual(Party.objects.count(), 1)
+        first, second = Permit.objects.order_by('permit_id')
+        self.assertEqual(first.contractor_id, second.contractor_id)
+        self.assertEqual(first.city.name, 'Chicago')
+        self.assertIsNone(second.data_source_id)
+
+    def test_api_still_returns_names(self):
+        save_permits([permit_data('D1', contractor_name='Acme Builders LLC')])
+        permit = self.client.get('/api/scraper/permits/').json()['results'][0]
+        self.assertEqual(permit['city'], 'Chicago')
+        self.assertEqual(permit['contractor_name'], 'Acme Builders LLC')
+        self.assertEqual(permit['data_source'], 'Chicago Data Portal')
+
+
+class ContractorResolutionTests(TestCase):
+    def test_normalize_name(self):
+        self.assertEqual(resolution.normalize_name('ABC Construction Corp.'), 'abc construction')
+        self.assertEqual(resolution.normalize_name('Abc Const. Corporation'), 'abc construction')
+        self.assertEqual(resolution.normalize_name('Smith & Sons, L.L.C.'), 'smith and sons')
+        self.assertEqual(resolution.normalize_name("The O'Brien Bros Inc"), 'obrien brothers')
+        self.assertEqual(resolution.normalize_name('Bellé Builders dba Belle Homes'), 'belle builders')
+
+    def test_similar_names_share_a_block_key(self):
+        keys = resolution.block_keys
+        self.assertTrue(keys('skyline construction') & keys('skylines builders'))
+        self.assertIn('w:skyline', keys('skyline construction group'))
+        self.assertFalse(keys('skyline construction') & keys('metro building systems'))
+
+    def test_variants_resolve_to_one_stable_entity(self):
+        names = ['ABC Construction Corp', 'ABC CONSTRUCTION CORP.', 'Abc Construction Corporation',
+                 'ABC Constructions', 'Metro Building Systems']
+        resolved = resolution.ContractorResolver(threshold=0.6).resolve(names)
+        self.assertEqual(len({resolved[name] for name in names[:4]}), 1)
+        self.assertNotEqual(resolved['ABC Construction Corp'], resolved['Metro Building Systems'])
+        self.assertEqual(ContractorEntity.objects.count(), 2)
+
+        # A later run reuses the stored entities
+        again = resolution.ContractorResolver(threshold=0.6).resolve(['abc construction co', 'ABC Constructions'])
+        self.assertEqual(set(again.values()), {resolved['ABC Construction Corp']})
+        self.assertEqual(ContractorEntity.objects.count(), 2)
+
+    def test_save_permits_resolves_new_contractors(self):
+        save_permits([
+            permit_data('R1', contractor_name='Acme Builders LLC'),
+            permit_data('R2', contractor_name='ACME BUILDERS, L.L.C.'),
+        ])
+        first, second = Permit.objects.order_by('permit_id').select_related('contractor')
+        self.assertNotEqual(first.contractor_id, second.contractor_id)
+        self.assertIsNotNone(first.contractor.entity_id)
+        self.assertEqual(first.contractor.entity_id, second.contractor.entity_id)
+
+
+class GeocodingTests(TestCase):
+    def test_geohash_round_trip(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        latitude, longitude = geo.decode('u4pruydqqvj')
+        height, width = geo.cell_size(11)
+        self.assertLessEqual(abs(latitude - 57.64911), height / 2)
+        self.assertLessEqual(abs(longitude - 10.40744), width / 2)
+        self.assertTrue(geo.encode(57.64911, 10.40744).startswith('u4pruydqq'))
+        self.assertAlmostEqual(geo.haversine_miles(40.7128, -74.0060, 41.8781, -87.6298), 711, delta=5)
+
+    def test_normalize_street_and_zip(self):
+        self.assertEqual(geocoding.normalize_street('123-45 W. 3rd St, Apt 4'), 'west 3rd street')
+        self.assertEqual(geocoding.normalize_street('875 N Michigan Ave #2'), 'north michigan avenue')
+        self.assertEqual(geocoding.normalize_zip('60611-1234'), '60611')
+        self.assertEqual(geocoding.normalize_zip(None), '')
+
+    def test_lookup_prefers_the_most_precise_match(self):
+        def precision(*address):
+            return geocoding.location_fields(*address)['geocode_precision']
+
+        self.assertEqual(precision('Chicago', '875 N Michigan Ave', '60611', 'Downtown'), 'street')
+        self.assertEqual(precision('Chicago', '1200 W Madison St', '60607', 'Downtown'), 'zip')
+        self.assertEqual(precision('Chicago', '1 N Wacker Dr', '', 'Downtown'), 'street')
+        self.assertEqual(precision('Chicago', '1 Nowhere Ln', '', 'Downtown'), 'area')
+        self.assertEqual(geocoding.location_fields('Chicago', '1 Nowhere Ln', '', '')['latitude'], None)
+
+    def test_ingest_stores_the_location(self):
+        save_permits([permit_data('L1')])
+        permit = Permit.objects.get(permit_id='L1')
+        self.assertEqual(permit.geocode_precision, 'zip')
+        self.assertEqual((permit.latitude, permit.longitude), (41.8740, -87.6510))
+        self.assertEqual(permit.geohash, geo.encode(41.8740, -87.6510))
+
+
+class DuplicateClusterTests(TestCase):
+    def test_refiled_permit_joins_a_cluster(self):
+        save_permits([
+            permit_data('C1'),
+            # Re-filed: same job, address spelled out, cost revised a little
+            permit_data('C2', full_address='1200 West Madison Street', estimated_cost=1550000),
+            # Same address and description, but a different job by cost
+            permit_data('C3', estimated_cost=4000000),
+            permit_data('C4', full_address='1300 W Madison St'),
+        ])
+        clusters = dict(Permit.objects.values_list('permit_id', 'duplicate_cluster_id'))
+        self.assertIsNotNone(clusters['C1'])
+        self.assertEqual(clusters['C1'], clusters['C2'])
+        self.assertIsNone(clusters['C3'])
+        self.assertIsNone(clusters['C4'])
+        self.assertEqual(DuplicateCluster.objects.count(), 1)
+    def test_merge_then_join_in_one_batch(self):
+        # Two clusters already exist; the next batch merges them and then joins one by its old id
+        save_permits([permit_data('D1', estimated_cost=100000), permit_data('D2', estimated_cost=100000)])
+        save_permits([permit_data('D3', estimated_cost=118000), permit_data('D4', estimated_cost=128000)])
+        self.assertEqual(DuplicateCluster.objects.count(), 2)
+
+        counts, errors = save_permits([permit_data('D5', estimated_cost=109000), permit_data('D6', estimated_cost=139000)])
+        self.assertEqual(errors, [])
+        self.assertEqual(DuplicateCluster.objects.count(), 1)
+        clusters = set(Permit.objects.values_list('duplicate_cluster_id', flat=True))
+        self.assertEqual(len(clusters), 1)
+        self.assertNotIn(None, clusters)
+        # The batch made it into the LSH index, so find_duplicates has nothing left to retry
+        self.assertEqual(Permit.objects.exclude(id__in=PermitLshBucket.objects.values('permit_id')).count(), 0)
+
+    def test_synthetic_permits_are_not_duplicates(self):
+        # Seeded load-test data must not cluster: no two permits at one house number are the same job
+        frame = generate_permit_frame(20000, seed=7, city_keys=['chicago'])
+        detector = duplicates.DuplicateDetector()
+        by_house = defaultdict(list)
+        for address, description, cost in zip(frame['full_address'], frame['project_description'], frame['estimated_cost']):
+            text = duplicates.document(address, description)
+            by_house[duplicates.house_number(address)].append({'shingles': duplicates.shingles(text), 'estimated_cost': cost})
+        pairs = sum(detector._same_job(a, b) for rows in by_house.values() for a, b in combinations(rows, 2))
+        self.assertEqual(pairs, 0)
+
+
+@override_settings(DATABASE_READ_ALIAS='replica', REPLICA_READ_VIEWS=['scraper:dashboard-stats', 'admin:*_changelist'])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = replicas.ReadReplicaRouter()
+        current = mock.patch.object(replicas, 'replica_current', return_value=True)
+        self.replica_current = current.start()
+        self.addCleanup(current.stop)
+
+    def read_alias(self, path, method='get', cookies=None, model=Permit, write_first=False):
+        request = getattr(RequestFactory(), method)(path)
+        request.COOKIES.update(cookies or {})
+        token = replicas.begin(request)
+        try:
+            request.resolver_match = resolve(path)
+            if write_first:
+                self.router.db_for_write(Permit)
+            return self.router.db_for_read(model)
+        finally:
+            replicas.end(token)
+
+    def test_replica_view_reads_from_replica(self):
+        self.assertEqual(self.read_alias('/api/scraper/dashboard/'), 'replica')
+        self.assertEqual(self.read_alias('/admin/scraper/permit/'), 'replica')
+
+    def test_everything_else_reads_from_primary(self):
+        self.assertEqual(self.read_alias('/api/scraper/rollups/'), 'default')
+        self.assertEqual(self.read_alias('/api/scraper/dashboard/', method='post'), 'default')
+        self.assertEqual(self.read_alias('/api/scraper/dashboard/', model=Session), 'default')
+        self.assertEqual(self.read_alias('/api/scraper/dashboard/', cookies={settings.REPLICA_PIN_COOKIE: '1'}), 'default')
+        self.assertEqual(self.read_alias('/api/scraper/dashboard/', write_first=True), 'default')
+        # Outside a request
+        self.assertEqual(self.router.db_for_read(Permit), 'default')
+
+    def test_lagging_replica_reads_from_primary(self):
+        self.replica_current.return_value = False
+        self.assertEqual(self.read_alias('/api/scraper/dashboard/'), 'default')
+
+    def test_writes_and_migrations_stay_on_primary(self):
+        self.assertEqual(self.router.db_for_write(Permit), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'scraper'))
+        self.assertIsNone(self.router.allow_migrate('default', 'scraper'))
+
+
+class DeleteUpkeepTests(TestCase):
+    def setUp(self):
+        save_permits([
+            permit_data(f'R{i}', estimated_cost=1000 * (i + 1), full_address=f'{100 + i} W Madison St',
+                        project_description=f'Unrelated job number {i}')
+            for i in range(5)
+        ])
+
+    def totals(self):
+        rollups = PermitRollup.objects.aggregate(count=Sum('permit_count'), total=Sum('total_cost'))
+        grid = PermitGridCell.objects.filter(precision=DEFAULT_PRECISION).aggregate(
+            count=Sum('permit_count'), total=Sum('total_cost')
+        )
+        return rollups['count'], rollups['total'], grid['count'], grid['total']
+
+    def test_rolled_back_delete_is_forgotten(self):
+        self.assertEqual(self.totals(), (5, 15000, 5, 15000))
+        with self.assertRaises(RuntimeError), self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Permit.objects.get(permit_id='R0').delete()
+                raise RuntimeError('roll back')
+        self.assertEqual(self.totals(), (5, 15000, 5, 15000))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Permit.objects.get(permit_id='R4').delete()
+        self.assertEqual(self.totals(), (4, 10000, 4, 10000))
+
+    def test_queryset_delete(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Permit.objects.filter(permit_id__in=['R0', 'R1', 'R2']).delete()
+        # One flush per delete for the cube and one for the grid, not one per row
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual(self.totals(), (2, 9000, 2, 9000))
+
+
+class ExportJobTests(TestCase):
+    def setUp(self):
+        self.export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.export_dir)
+        self.settings_override = override_settings(EXPORT_DIR=self.export_dir, EXPORT_CHUNK_SIZE=2)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_run_export_job(self):
+        save_permits([permit_data(f'E{i}', project_description=f'Export job {i}') for i in range(5)])
+        job = ExportJob.objects.create(filename='permits.csv')
+        exports.run_export_job(job.pk, Permit.objects.all())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.row_count), ('completed', 5))
+        self.assertIsNotNone(job.heartbeat_at)
+        with open(job.file_path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 6)
+
+    def test_rows_keep_the_admin_order(self):
+        dates = ['2024-03-15', '2024-05-01', '2024-03-15', '2024-01-02', '2024-05-01', '2024-03-15', '2024-03-15']
+        save_permits([
+            permit_data(f'O{i}', issue_date=day, project_description=f'Ordered export {i}')
+            for i, day in enumerate(dates)
+        ])
+        # Ties on (issue_date, created_at) fall back to pk
+        Permit.objects.filter(permit_id__in=['O0', 'O2', 'O5']).update(created_at=timezone.now())
+        expected = list(Permit.objects.order_by('-issue_date', '-created_at', '-pk').values_list('permit_id'))
+
+        self.assertEqual(list(exports.iter_value_rows(Permit.objects.all(), ['permit_id'], chunk_size=2)), expected)
+
+        async def collect():
+            return [row async for rows in exports.aiter_value_chunks(Permit.objects.all(), ['permit_id'], chunk_size=3)
+                    for row in rows]
+        self.assertEqual(async_to_sync(collect)(), expected)
+
+    def test_lost_jobs_fail(self):
+        old = timezone.now() - timedelta(seconds=settings.EXPORT_JOB_STALE_SECONDS + 1)
+        lost = ExportJob.objects.create(filename='lost.csv', status='running', started_at=old, heartbeat_at=old)
+        lost.file_path = exports.export_path(lost)
+        lost.save()
+        never_started = ExportJob.objects.create(filename='never.csv')
+        ExportJob.objects.filter(pk=never_started.pk).update(created_at=old)
+        ExportJob.objects.create(filename='alive.csv', status='running', heartbeat_at=timezone.now())
+        open(lost.file_path, 'w').close()
+
+        self.assertEqual(exports.fail_stale_jobs(), 2)
+        statuses = dict(ExportJob.objects.values_list('filename', 'status'))
+        self.assertEqual(statuses, {'lost.csv': 'failed', 'never.csv': 'failed', 'alive.csv': 'running'})
+        self.assertFalse(os.path.exists(lost.file_path))
+        self.assertIn('stopped', ExportJob.objects.get(pk=lost.pk).error_message)
+        self.assertEqual(exports.fail_stale_jobs(), 0)
+
+    def test_same_second_jobs_get_their_own_files(self):
+        save_permits([permit_data('E1')])
+        first = exports.start_export_job(Permit.objects.all(), 'permits_20240101_120000.csv')
+        second = exports.start_export_job(Permit.objects.none(), 'permits_20240101_120000.csv')
+        self.assertNotEqual(first.file_path, second.file_path)
+        exports.run_export_job(first.pk, Permit.objects.all())
+        exports.run_export_job(second.pk, Permit.objects.none())
+        first.refresh_from_db()
+        with open(first.file_path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+
+@override_settings(EXPORT_MAX_ACTIVE_JOBS=1)
+class ExportJobApiTests(TestCase):
+    url = '/api/scraper/permits/export-jobs/'
+
+    def setUp(self):
+        self.export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.export_dir)
+        self.settings_override = override_settings(EXPORT_DIR=self.export_dir)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.post(self.url).status_code, 403)
+        User.objects.create_user('viewer', password='pw')
+        self.client.login(username='viewer', password='pw')
+        self.assertEqual(self.client.post(self.url).status_code, 403)
+        self.assertEqual(ExportJob.objects.count(), 0)
+
+    def test_active_jobs_are_capped(self):
+        User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.login(username='staff', password='pw')
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 202)
+        # The job's thread only starts on commit, so it is still pending
+        self.assertEqual(self.client.post(self.url).status_code, 429)
+        self.assertEqual(ExportJob.objects.count(), 1)
+        self.assertEqual(self.client.get(f"{self.url}{response.json()['id']}/").json()['status'], 'pending')
+
+
+class CostAnomalyTests(TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.state_dir)
+        self.stats = CostStats(path=os.path.join(self.state_dir, 'cost_stats.json'))
+
+    def flag(self, costs):
+        permits = [{'estimated_cost': cost, 'work_type': 'New Building'} for cost in costs]
+        flag_cost_anomalies('Heavy Tail City', permits, stats=self.stats, save=False)
+        return [p['estimated_cost'] for p in permits if p['cost_anomaly']]
+
+    def test_recurring_high_end_is_learned(self):
+        rng = np.random.default_rng(7)
+        cheapest_high = []
+        for _ in range(20):
+            # Median about $2.4M with a heavy tail
+            costs = (10 ** (np.log10(2.4e6) + 0.35 * rng.standard_t(3, 1000))).round().tolist()
+            flagged = self.flag(costs + [2.4e9])
+            self.assertIn(2.4e9, flagged)  # An extra three zeros stays an anomaly
+            cheapest_high.append(min(cost for cost in flagged if cost > 2.4e6))
+        # With no history ~$50M permits are flagged; once the city has shown a few, they are not
+        self.assertLess(cheapest_high[0], 80e6)
+        self.assertGreater(min(cheapest_high[-5:]), 80e6)
+
+    def test_save_keeps_the_old_file_when_interrupted(self):
+        self.flag([1e6] * 50)
+        self.stats.save()
+        with mock.patch('permit_scraper.anomaly.json.dump', side_effect=OSError('disk full')):
+            self.stats.save()
+        self.assertEqual(os.listdir(self.state_dir), ['cost_stats.json'])
+        reloaded = CostStats(path=self.stats.path).load()
+        self.assertEqual(reloaded.histogram(CostStats.key('Heavy Tail City', None)).sum().round(2), 50)
+
+    def test_reflagged_permits_move_cells(self):
+        def grid_flags():
+            return set(PermitGridCell.objects.values_list('cost_anomaly', flat=True))
+
+        save_permits([permit_data('A1', estimated_cost=90_000_000, cost_anomaly=True, cost_anomaly_score=4.1)])
+        self.assertEqual(PermitRollup.objects.get().cost_anomaly, True)
+        self.assertEqual(grid_flags(), {True})
+        counts, _ = save_permits([permit_data('A1', estimated_cost=90_000_000, cost_anomaly=False, cost_anomaly_score=3.6)])
+        self.assertEqual(counts['updated'], 1)
+        self.assertEqual(PermitRollup.objects.get().cost_anomaly, False)
+        self.assertEqual(grid_flags(), {False})
+        self.assertEqual(Permit.objects.get().cost_anomaly_score, 3.6)
+        self.assertFalse(PermitVersion.objects.exists())
+
+    def test_heatmap_leaves_flagged_costs_out(self):
+        save_permits([
+            permit_data('A1', estimated_cost=2_000_000),
+            permit_data('A2', estimated_cost=900_000_000, cost_anomaly=True, cost_anomaly_score=5.2,
+                        project_description='Unrelated job number 2'),
+        ])
+
+        def heatmap(**params):
+            cells = self.client.get('/api/scraper/heatmap/', params).json()['cells']
+            return [(cell['permit_count'], Decimal(cell['total_cost'])) for cell in cells]
+
+        self.assertEqual(heatmap(), [(1, Decimal(2_000_000))])
+        self.assertEqual(heatmap(include_anomalies=1), [(2, Decimal(902_000_000))])
+
+
+class DataMigrationTests(TransactionTestCase):
+    """The cube and grid migrations build from the permits already stored"""
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('scraper', target)])
+        return executor.loader.project_state([('scraper', target)]).apps
+
+    def test_fresh_migrate_builds_rollups_and_grid(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes('scraper')[0][1]
+        try:
+            apps = self.migrate('0008_permitversion')
+            apps.get_model('scraper', 'Permit').objects.create(
+                permit_id='M1', city='Chicago', issue_date=date(2024, 3, 15), full_address='1200 W Madison St',
+                project_description='Office renovation', estimated_cost=Decimal('2500000'),
+            )
+            apps = self.migrate('0012_permit_location')
+            apps.get_model('scraper', 'Permit').objects.update(geohash='dp3wjztvtk')
+            self.migrate(latest)
+
+            cell = PermitRollup.objects.get()
+            self.assertEqual((cell.city, cell.month, cell.permit_count, cell.total_cost),
+                             ('Chicago', date(2024, 3, 1), 1, Decimal('2500000')))
+            self.assertEqual(sorted(PermitGridCell.objects.values_list('geohash', flat=True)),
+                             ['dp3', 'dp3w', 'dp3wj', 'dp3wjz'])
+        finally:
+            self.migrate(latest)
+
+
+class MasterDatasetTests(TestCase):
+    def setUp(self):
+        self.master_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.master_dir)
+        patcher = mock.patch.multiple(
+            Config, MASTER_DIR=self.master_dir, MASTER_CSV=os.path.join(self.master_dir, 'none.csv')
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def permits(self):
+        df = master.load_master_permits()
+        return sorted(zip(df['permit_id'], df['issue_date'], df['estimated_cost']))
+
+    def test_upserts_and_moves(self):
+        master.update_master_dataset([
+            permit_data('P1', issue_date='2024-03-01'), permit_data('P2', issue_date='2024-03-02'),
+        ])
+        master.update_master_dataset([
+            permit_data('P1', issue_date='2024-03-01', estimated_cost=2000000),  # Updated in place
+            permit_data('P2', issue_date='2024-04-02'),  # Moved to another month
+            permit_data('P3', issue_date='2024-04-03'),
+        ])
+        self.assertEqual(self.permits(), [
+            ('P1', '2024-03-01', '2000000'), ('P2', '2024-04-02', '1500000'), ('P3', '2024-04-03', '1500000'),
+        ])
+        conn = master._open_key_index('chicago')
+        self.addCleanup(conn.close)
+        self.assertEqual(master._lookup_keys(conn, ['P1', 'P2', 'P4']), {'P1': '2024-03', 'P2': '2024-04'})
+
+    def test_rerun_after_a_crash_before_the_index_commit(self):
+        master.update_master_dataset([
+            permit_data('P1', issue_date='2024-03-01'), permit_data('P2', issue_date='2024-03-02'),
+        ])
+        index_path = os.path.join(self.master_dir, 'city=chicago', master.MASTER_KEY_INDEX)
+        shutil.copyfile(index_path, f'{index_path}.before')
+        batch = [
+            permit_data('P2', issue_date='2024-04-02', estimated_cost=3000000),  # Moved to another month
+            permit_data('P3', issue_date='2024-03-03'),
+        ]
+        master.update_master_dataset(batch)
+        # Partitions written, key index as it was before the run
+        os.replace(f'{index_path}.before', index_path)
+
+        master.update_master_dataset(batch)
+        self.assertEqual(self.permits(), [
+            ('P1', '2024-03-01', '1500000'), ('P2', '2024-04-02', '3000000'), ('P3', '2024-03-03', '1500000'),
+        ])
+
+    def test_imports_the_legacy_csv_index(self):
+        master.update_master_dataset([permit_data('P1', issue_date='2024-03-01')])
+        city_dir = os.path.join(self.master_dir, 'city=chicago')
+        os.remove(os.path.join(city_dir, master.MASTER_KEY_INDEX))
+        with open(os.path.join(city_dir, master.LEGACY_KEY_INDEX), 'w', encoding='utf-8') as f:
+            f.write('permit_id,month\nP1,2024-03\n')
+
+        master.update_master_dataset([permit_data('P1', issue_date='2024-03-01', estimated_cost=7)])
+        self.assertEqual(self.permits(), [('P1', '2024-03-01', '7')])
+        self.assertFalse(os.path.exists(os.path.join(city_dir, master.LEGACY_KEY_INDEX)))
+
+
+class GeoFilterTests(TestCase):
+    def test_within_radius_matches_haversine(self):
+        save_permits([permit_data(f'G{i}', project_description=f'Geo job {i}') for i in range(40)])
+        rng = np.random.default_rng(3)
+        center = (40.7128, -74.0060)
+        for permit in Permit.objects.all():
+            latitude, longitude = center[0] + rng.uniform(-0.2, 0.2), center[1] + rng.uniform(-0.25, 0.25)
+            Permit.objects.filter(pk=permit.pk).update(
+                latitude=latitude, longitude=longitude, geohash=geo.encode(latitude, longitude)
+            )
+
+        expected = {
+            permit_id for permit_id, latitude, longitude in Permit.objects.values_list('permit_id', 'latitude', 'longitude')
+            if geo.haversine_miles(*center, latitude, longitude) <= 8
+        }
+        self.assertTrue(0 < len(expected) < 40)
+        with self.assertNumQueries(1):
+            found = set(geo.within_radius(Permit.objects.all(), *center, 8).values_list('permit_id', flat=True))
+        self.assertEqual(found, expected)
+
+
+class MetricsTests(TestCase):
+    @override_settings(METRICS_MULTIPROC_DIR='')
+    def test_counter_family_named_like_its_samples(self):
+        registry = metrics.Registry()
+        rows = registry.counter('permit_rows_ingested', 'Permit rows saved', ['city'])
+        latency = registry.histogram('permit_latency_seconds', 'Latency', buckets=(1,))
+        rows.inc(3, city='Chicago')
+        latency.observe(0.5)
+
+        lines = registry.render().splitlines()
+        self.assertEqual(lines[:3], [
+            '# HELP permit_rows_ingested_total Permit rows saved',
+            '# TYPE permit_rows_ingested_total counter',
+            'permit_rows_ingested_total{city="Chicago"} 3',
+        ])
+        self.assertIn('# TYPE permit_latency_seconds histogram', lines)
+        self.assertIn('permit_latency_seconds_count 1', lines)
+
+    @override_settings(METRICS_MULTIPROC_DIR='')
+    def test_fetch_latency_is_observed_per_request(self):
+        spans = [
+            {'city': 'nyc', 'stage': 'fetch', 'start': 0.0, 'seconds': 0.2, 'rows': None, 'bytes': 100},
+            {'city': 'nyc', 'stage': 'fetch', 'start': 0.3, 'seconds': 0.4, 'rows': None, 'bytes': 50},
+            {'city': 'nyc', 'stage': 'decode', 'start': 0.7, 'seconds': 0.1, 'rows': 15, 'bytes': None},
+        ]
+        before = metrics.city_fetch_seconds.snapshot()
+        metrics.record_stage_timings(spans)
+        after = dict((tuple(key), value) for key, value in metrics.city_fetch_seconds.snapshot())
+        earlier = dict((tuple(key), value) for key, value in before).get(('nyc',), [0] * len(after[('nyc',)]))
+        self.assertEqual(after[('nyc',)][-1] - earlier[-1], 2)
+
+    def test_cli_run_records_its_metrics(self):
+        timer = engine.RunTimer()
+        timer.add('nyc', 'fetch', time.monotonic(), 0.2, bytes=100)
+        with mock.patch.object(metrics, 'record_stage_timings') as record:
+            cli.record_run_metrics(timer)
+        record.assert_called_once_with(timer.as_list())
+
+
+class EndpointQueryTests(QueryBudgetTestMixin, TestCase):
+    """Query counts of the read endpoints do not grow with the rows they return"""
+
+    def setUp(self):
+        cache.clear()
+        save_permits([
+            permit_data(f'Q{i}', city=['Chicago', 'New York', 'Los Angeles'][i % 3], estimated_cost=1000000 * (i + 1),
+                        full_address=f'{100 + i} W Madison St', project_description=f'Unrelated job number {i}',
+                        contractor_name=f'Contractor {i % 4} LLC')
+            for i in range(30)
+        ])
+
+    def test_permit_list(self):
+        # Count and page, with the dimensions joined in
+        with self.assertMaxQueries(2, n_plus_one_threshold=2):
+            response = self.client.get('/api/scraper/permits/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 30)
+
+    def test_dashboard(self):
+        with self.assertMaxQueries(4, n_plus_one_threshold=2):
+            response = self.client.get('/api/scraper/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        # Then from the cache
+        with self.assertMaxQueries(0):
+            self.assertEqual(self.client.get('/api/scraper/dashboard/').json(), response.json())
+
+    def test_rollups(self):
+        with self.assertMaxQueries(1, n_plus_one_threshold=2):
+            response = self.client.get('/api/scraper/rollups/', {'group_by': 'city,cost_bucket'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_heatmap(self):
+        with self.assertMaxQueries(1, n_plus_one_threshold=2):
+            response = self.client.get('/api/scraper/heatmap/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_permit_as_of(self):
+        permit = Permit.objects.get(permit_id='Q0')
+        save_permits([permit_data('Q0', estimated_cost=2000000, project_description='Unrelated job number 0, revised')])
+        save_permits([permit_data('Q0', estimated_cost=3000000, project_description='Unrelated job number 0, revised')])
+        # Permit, its later versions, the replaced contractor, then the dimensions of the snapshot
+        with self.assertMaxQueries(6, n_plus_one_threshold=2):
+            response = self.client.get(f'/api/scraper/permits/{permit.pk}/as-of/', {'at': permit.created_at.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (Decimal(response.json()['estimated_cost']), response.json()['contractor_name']),
+            (Decimal(1000000), 'Contractor 0 LLC')
+        )
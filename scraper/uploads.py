@@ -0,0 +1,207 @@
+"""
+Chunked, resumable uploads for the FileProcessor ZIP pipeline.
+
+A client opens an upload session, then sends the file in fixed-size chunks,
+each carrying a CRC32 checksum. Chunks are streamed straight into a
+preallocated file at their offset, so worker memory stays flat and a dropped
+connection only costs the chunk in flight - the client asks the session for
+its offset and resumes from there. The FileProcessor record is only created
+once every byte has arrived and been verified.
+
+Each chunk is also block-hashed on the way in, so the completed upload already
+carries the content hash used by the processed ZIP cache.
+"""
+
+import os
+import uuid
+import zlib
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import FileProcessor, UploadSession
+from .zip_cache import BLOCK_SIZE, ContentHasher, combine_block_digests
+
+logger = logging.getLogger('scraper')
+
+# Size of the reads used to stream a chunk body to disk
+READ_BLOCK_SIZE = 1024 * 64
+
+
+class UploadError(Exception):
+    """Raised when an upload request cannot be accepted"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _session_dir():
+    directory = settings.UPLOAD_SESSION_DIR
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def session_path(session):
+    """Path of the preallocated file a session writes into"""
+    return os.path.join(_session_dir(), f'{session.upload_id}.part')
+
+
+def _preallocate(f, size):
+    """Reserve the full file size up front so chunks can be written in place"""
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except (AttributeError, OSError):
+        # Not available on every platform/filesystem - a sparse file works too
+        f.truncate(size)
+
+
+def session_state(session):
+    """Serializable view of a session used by the upload endpoints"""
+    return {
+        'upload_id': session.upload_id,
+        'filename': session.filename,
+        'status': session.status,
+        'total_size': session.total_size,
+        'chunk_size': session.chunk_size,
+        'received_bytes': session.received_bytes,
+    }
+
+
+def create_session(filename, total_size):
+    """Open a new upload session and preallocate its target file"""
+    filename = os.path.basename(filename or '').strip()
+    if not filename:
+        raise UploadError('A filename is required')
+    if total_size <= 0:
+        raise UploadError('File size must be greater than zero')
+    if total_size > settings.UPLOAD_MAX_SIZE:
+        raise UploadError(
+            f'File too large: {total_size} bytes (max: {settings.UPLOAD_MAX_SIZE} bytes)',
+            status=413
+        )
+
+    purge_stale_sessions()
+
+    # Chunks must cover whole hash blocks so digests can be computed per chunk
+    chunk_size = -(-settings.UPLOAD_CHUNK_SIZE // BLOCK_SIZE) * BLOCK_SIZE
+
+    session = UploadSession.objects.create(
+        upload_id=uuid.uuid4().hex,
+        filename=filename[:255],
+        total_size=total_size,
+        chunk_size=chunk_size,
+    )
+    with open(session_path(session), 'wb') as f:
+        _preallocate(f, total_size)
+
+    logger.info(f"Opened upload session {session.upload_id}: {filename}, {total_size} bytes")
+    return session
+
+
+def write_chunk(session, offset, stream, length, checksum):
+    """
+    Stream one chunk into the session file and advance the resume offset.
+    Chunks must arrive in order; the checksum is the CRC32 of the chunk as hex.
+    """
+    if session.status != 'uploading':
+        raise UploadError(f'Upload is {session.status}', status=409)
+    if offset != session.received_bytes:
+        raise UploadError(
+            f'Expected chunk at offset {session.received_bytes}, got {offset}', status=409
+        )
+
+    expected_length = min(session.chunk_size, session.total_size - offset)
+    if length != expected_length:
+        raise UploadError(f'Expected a chunk of {expected_length} bytes, got {length}')
+
+    crc = 0
+    hasher = ContentHasher()
+    remaining = length
+    with open(session_path(session), 'r+b') as f:
+        f.seek(offset)
+        while remaining:
+            block = stream.read(min(READ_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            crc = zlib.crc32(block, crc)
+            hasher.update(block)
+            f.write(block)
+            remaining -= len(block)
+
+    # Bytes from a bad chunk are simply overwritten by the retry
+    if remaining:
+        raise UploadError('Connection closed before the chunk was fully received')
+    if f'{crc:08x}' != (checksum or '').strip().lower():
+        raise UploadError('Chunk checksum mismatch', status=422)
+
+    # Only advance if nobody else moved the offset in the meantime
+    block_digests = session.block_digests + hasher.finish()
+    updated = UploadSession.objects.filter(
+        pk=session.pk, status='uploading', received_bytes=offset
+    ).update(
+        received_bytes=offset + length,
+        block_digests=block_digests,
+        updated_at=timezone.now()
+    )
+    if not updated:
+        raise UploadError('Upload offset changed while writing the chunk', status=409)
+
+    session.received_bytes = offset + length
+    session.block_digests = block_digests
+    return session
+
+
+def complete_session(session):
+    """Move a fully received upload into media storage and create its FileProcessor"""
+    if session.status != 'uploading':
+        raise UploadError(f'Upload is {session.status}', status=409)
+    if session.received_bytes != session.total_size:
+        raise UploadError(
+            f'Upload incomplete: {session.received_bytes}/{session.total_size} bytes', status=409
+        )
+
+    part_path = session_path(session)
+    if os.path.getsize(part_path) != session.total_size:
+        session.status = 'failed'
+        session.save()
+        raise UploadError('Assembled file size does not match the declared size', status=422)
+
+    # The partial directory lives under MEDIA_ROOT, so this is a cheap rename
+    name = default_storage.get_available_name(os.path.join('uploads', session.filename))
+    os.replace(part_path, default_storage.path(name))
+
+    processor = FileProcessor(
+        status='processing',
+        content_hash=combine_block_digests(session.block_digests),
+    )
+    processor.upload_file.name = name
+    processor.save()
+
+    session.status = 'complete'
+    session.file_processor = processor
+    session.save()
+
+    logger.info(f"Upload session {session.upload_id} assembled as FileProcessor ID: {processor.id}")
+    return processor
+
+
+def discard_session(session):
+    """Remove a session and its partial file"""
+    try:
+        os.remove(session_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def purge_stale_sessions():
+    """Drop abandoned uploads so partial files do not pile up on disk"""
+    cutoff = timezone.now() - timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+    stale = UploadSession.objects.filter(status='uploading', updated_at__lt=cutoff)
+    for session in stale:
+        logger.info(f"Purging stale upload session {session.upload_id}")
+        discard_session(session)
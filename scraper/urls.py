@@ -7,17 +7,26 @@ urlpatterns = [
     # Permit endpoints
     path('permits/', views.PermitListView.as_view(), name='permit-list'),
     path('permits/<int:pk>/', views.PermitDetailView.as_view(), name='permit-detail'),
+    path('permits/<int:pk>/as-of/', views.permit_as_of, name='permit-as-of'),
+    path('permits/changes/', views.PermitChangeListView.as_view(), name='permit-changes'),
     path('permits/export-csv/', views.export_permits_csv, name='export-permits-csv'),
     path('permits/export/', views.export_csv_page, name='export-csv-page'),
+    path('permits/export-jobs/', views.export_jobs, name='export-jobs'),
+    path('permits/export-jobs/<int:pk>/', views.export_job_status, name='export-job-status'),
+    path('duplicates/', views.DuplicateClusterListView.as_view(), name='duplicate-cluster-list'),
+    path('duplicates/<int:pk>/', views.DuplicateClusterDetailView.as_view(), name='duplicate-cluster-detail'),
     
     # Scraper run endpoints
     path('runs/', views.ScraperRunListView.as_view(), name='scraper-run-list'),
     path('runs/<int:pk>/', views.ScraperRunDetailView.as_view(), name='scraper-run-detail'),
     path('runs/<str:run_id>/status/', views.scraper_status, name='scraper-status'),
+    path('runs/<str:run_id>/events/', views.scraper_run_events, name='scraper-run-events'),
     
     # Scraper control endpoints
     path('start/', views.start_scraper, name='start-scraper'),
     
-    # Dashboard endpoint
+    # Dashboard endpoints
     path('dashboard/', views.dashboard_stats, name='dashboard-stats'),
+    path('rollups/', views.rollup_stats, name='rollup-stats'),
+    path('heatmap/', views.permit_heatmap, name='permit-heatmap'),
 ]
\ No newline at end of file
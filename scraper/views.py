@@ -1,25 +1,39 @@
-import os
-import sys
 import json
 import uuid
-import csv
 from datetime import datetime, timezone
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
 from django.utils import timezone as django_timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import status, generics
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import PermissionDenied, Throttled
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 
-from .models import Permit, ScraperRun
-from .serializers import PermitSerializer, ScraperRunSerializer, ScraperRunCreateSerializer
+from .models import DuplicateCluster, ExportJob, Permit, PermitGridCell, PermitRollup, PermitVersion, ScraperRun
+from .rollups import DIMENSIONS as ROLLUP_DIMENSIONS, COST_BUCKETS, HEADLINE, cost_bucket_label
+from . import exports, metrics
+from .admin_perf import refresh_filter_choices
+from .dimensions import PERMIT_DIMENSION_FIELDS
+from . import geo
+from .geo import within_bbox, within_radius
+from .heatmap import DEFAULT_PRECISION, GRID_PRECISIONS
+from .ingest import permit_as_of as rebuild_permit_as_of, save_permits
+from .progress import run_events, run_states
+from .replicas import bump_watermark
+from .serializers import (
+    DuplicateClusterSerializer, ExportJobSerializer, PermitSerializer, PermitVersionSerializer, ScraperRunSerializer,
+    ScraperRunCreateSerializer,
+)
 
-# Add the project root to Python path to import the scraper
-sys.path.append(os.path.dirname(settings.BASE_DIR))
-from MAIN_permit_scraper import main as run_scraper, CITIES
+# City metadata only - the scraping modules (pandas, requests) load on first run
+from permit_scraper.cities import CITIES
 
 
 class PermitPagination(PageNumberPagination):
@@ -28,6 +42,39 @@ class PermitPagination(PageNumberPagination):
     max_page_size = 500
 
 
+# ?near= search radius in miles
+DEFAULT_RADIUS_MILES = 1.0
+MAX_RADIUS_MILES = 50.0
+
+
+def _coordinates(value, count, layout):
+    try:
+        numbers = [float(part) for part in value.split(',')]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count:
+        raise ValueError(f"Expected {layout}, got {value}")
+    return numbers
+
+
+def _filter_location(queryset, params):
+    """?bbox=min_lon,min_lat,max_lon,max_lat and ?near=lat,lon&radius=<miles> (geocoded permits only)"""
+    bbox = params.get('bbox')
+    if bbox:
+        min_lon, min_lat, max_lon, max_lat = _coordinates(bbox, 4, 'bbox=min_lon,min_lat,max_lon,max_lat')
+        if min_lat > max_lat or min_lon > max_lon:
+            raise ValueError("bbox minimums must not exceed its maximums")
+        queryset = within_bbox(queryset, min_lat, min_lon, max_lat, max_lon)
+    near = params.get('near')
+    if near:
+        latitude, longitude = _coordinates(near, 2, 'near=lat,lon')
+        radius = float(params.get('radius') or DEFAULT_RADIUS_MILES)
+        if not 0 < radius <= MAX_RADIUS_MILES:
+            raise ValueError(f"radius must be between 0 and {MAX_RADIUS_MILES:g} miles")
+        queryset = within_radius(queryset, latitude, longitude, radius)
+    return queryset
+
+
 class PermitListView(generics.ListAPIView):
     """List all permits with filtering and pagination"""
     queryset = Permit.objects.all()
@@ -35,12 +82,27 @@ class PermitListView(generics.ListAPIView):
     pagination_class = PermitPagination
     
     def get_queryset(self):
-        queryset = Permit.objects.all()
+        queryset = Permit.objects.select_related(*PERMIT_DIMENSION_FIELDS)
         
         # Filter by city
         city = self.request.query_params.get('city')
         if city:
-            queryset = queryset.filter(city__icontains=city)
+            queryset = queryset.filter(city__name__icontains=city)
+        
+        # Filter by resolved contractor firm (any spelling of its name)
+        contractor_entity = self.request.query_params.get('contractor_entity')
+        if contractor_entity:
+            queryset = queryset.filter(contractor__entity_id=contractor_entity)
+        
+        # Filter by the engine's cost anomaly flag
+        cost_anomaly = self.request.query_params.get('cost_anomaly')
+        if cost_anomaly:
+            queryset = queryset.filter(cost_anomaly=cost_anomaly.lower() in ('1', 'true', 'yes'))
+        
+        # Filter by near-duplicate cluster (see /duplicates/)
+        duplicate_cluster = self.request.query_params.get('duplicate_cluster')
+        if duplicate_cluster:
+            queryset = queryset.filter(duplicate_cluster_id=duplicate_cluster)
         
         # Filter by date range
         start_date = self.request.query_params.get('start_date')
@@ -64,15 +126,115 @@ class PermitListView(generics.ListAPIView):
                 full_address__icontains=search
             )
         
+        # Location last, so the candidate set already has the other filters applied
+        queryset = _filter_location(queryset, self.request.query_params)
+        
         return queryset.order_by('-issue_date', '-created_at')
+    
+    def list(self, request, *args, **kwargs):
+        try:
+            return super().list(request, *args, **kwargs)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class PermitDetailView(generics.RetrieveAPIView):
     """Get a single permit by ID"""
-    queryset = Permit.objects.all()
+    queryset = Permit.objects.select_related(*PERMIT_DIMENSION_FIELDS)
     serializer_class = PermitSerializer
 
 
+def _point_in_time(value):
+    """Aware datetime for a ?at=/?since= value; a bare date means the end of that day"""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date or datetime: {value}")
+        moment = datetime.combine(day, datetime.max.time())
+    if django_timezone.is_naive(moment):
+        moment = django_timezone.make_aware(moment)
+    return moment
+
+
+@api_view(['GET'])
+def permit_as_of(request, pk):
+    """Get a permit as it was at ?at=<date or datetime>, rebuilt from its change log"""
+    try:
+        when = _point_in_time(request.query_params.get('at'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if when is None:
+        return Response({'error': 'The at parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        permit = Permit.objects.get(pk=pk)
+    except Permit.DoesNotExist:
+        return Response({'error': f'Permit {pk} not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    snapshot = rebuild_permit_as_of(permit, when)
+    if snapshot is None:
+        return Response(
+            {'error': f'Permit {pk} was first recorded at {permit.created_at.isoformat()}'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    data = PermitSerializer(snapshot).data
+    data['as_of'] = when.isoformat()
+    return Response(data)
+
+
+class PermitChangeListView(generics.ListAPIView):
+    """Permit changes since ?since=<date or datetime>, oldest first"""
+    serializer_class = PermitVersionSerializer
+    pagination_class = PermitPagination
+    
+    def get_queryset(self):
+        queryset = PermitVersion.objects.select_related('permit', 'scraper_run').order_by('changed_at', 'id')
+        since = _point_in_time(self.request.query_params.get('since'))
+        if since:
+            queryset = queryset.filter(changed_at__gt=since)
+        permit = self.request.query_params.get('permit')
+        if permit:
+            queryset = queryset.filter(permit_id=permit)
+        return queryset
+    
+    def list(self, request, *args, **kwargs):
+        try:
+            return super().list(request, *args, **kwargs)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class DuplicateClusterListView(generics.ListAPIView):
+    """Near-duplicate permit clusters, most recently changed first (?city= to narrow)"""
+    serializer_class = DuplicateClusterSerializer
+    pagination_class = PermitPagination
+    
+    def get_queryset(self):
+        # Deleting permits can leave a cluster of one until its next re-check
+        queryset = DuplicateCluster.objects.annotate(permit_count=models.Count('permits')).filter(
+            permit_count__gte=2
+        ).prefetch_related(
+            models.Prefetch('permits', queryset=Permit.objects.select_related(*PERMIT_DIMENSION_FIELDS))
+        )
+        city = self.request.query_params.get('city')
+        if city:
+            queryset = queryset.filter(id__in=Permit.objects.filter(
+                city__name__icontains=city, duplicate_cluster__isnull=False
+            ).values('duplicate_cluster_id'))
+        return queryset.order_by('-updated_at', '-id')
+
+
+class DuplicateClusterDetailView(generics.RetrieveAPIView):
+    """One near-duplicate cluster with its permits"""
+    queryset = DuplicateCluster.objects.annotate(permit_count=models.Count('permits')).prefetch_related(
+        models.Prefetch('permits', queryset=Permit.objects.select_related(*PERMIT_DIMENSION_FIELDS))
+    )
+    serializer_class = DuplicateClusterSerializer
+
+
 class ScraperRunListView(generics.ListAPIView):
     """List all scraper runs"""
     queryset = ScraperRun.objects.all()
@@ -109,71 +271,57 @@ def start_scraper(request):
             start_time = django_timezone.now()
             
             # Import and run the scraper logic
-            from MAIN_permit_scraper import (
-                setup_logging, ensure_directories, load_state, save_state,
-                process_city, save_city_csv, update_master_csv
-            )
+            from permit_scraper.config import setup_logging, ensure_directories
+            from permit_scraper.scrape import iter_city_results
+            from permit_scraper.timing import RunTimer
             
             # Setup
             logger = setup_logging()
             ensure_directories()
             
-            # Run scraper for each city
+            # Run scraper for the requested cities (all registered cities by default)
+            requested = serializer.validated_data.get('cities') or list(CITIES.keys())
+            city_keys = [key for key in requested if key in CITIES]
+            
+            timer = RunTimer()
             all_permits = []
             city_summaries = []
             errors = []
             cities_processed = []
             
-            for city_key in CITIES.keys():
+            # Cities are fetched concurrently; permits are saved here as each one finishes
+            for city_key, permits, fetch_error in iter_city_results(city_keys, timer=timer):
                 try:
                     logger.info(f"Processing {city_key}")
-                    permits = process_city(city_key)
+                    if fetch_error:
+                        raise fetch_error
                     
                     if permits:
-                        # Save to database
-                        for permit_data in permits:
-                            try:
-                                # Convert string cost to Decimal
-                                cost = Decimal(str(permit_data['estimated_cost']))
-                                
-                                # Parse date
-                                issue_date = datetime.strptime(permit_data['issue_date'], '%Y-%m-%d').date()
-                                scraped_at = datetime.strptime(permit_data['scraped_at'], '%Y-%m-%d %H:%M:%S')
-                                
-                                # Create or update permit in database
-                                permit, created = Permit.objects.update_or_create(
-                                    permit_id=permit_data['permit_id'],
-                                    defaults={
-                                        'city': permit_data['city'],
-                                        'issue_date': issue_date,
-                                        'scraped_at': scraped_at,
-                                        'full_address': permit_data['full_address'],
-                                        'borough_area': permit_data.get('borough_area'),
-                                        'zip_code': permit_data.get('zip_code'),
-                                        'project_description': permit_data['project_description'],
-                                        'estimated_cost': cost,
-                                        'contractor_name': permit_data.get('contractor_name'),
-                                        'contractor_license': permit_data.get('contractor_license'),
-                                        'applicant_name': permit_data.get('applicant_name'),
-                                        'owner_name': permit_data.get('owner_name'),
-                                        'architect_name': permit_data.get('architect_name'),
-                                        'license_status': permit_data.get('license_status'),
-                                        'business_address': permit_data.get('business_address'),
-                                        'business_phone': permit_data.get('business_phone'),
-                                        'data_source': permit_data.get('data_source'),
-                                    }
-                                )
-                                
-                            except Exception as e:
-                                error_msg = f"Error saving permit {permit_data.get('permit_id', 'unknown')}: {str(e)}"
+                        # Save to database in bulk, logging changed fields (timed as the db_write stage)
+                        with timer.span(city_key, 'db_write') as span:
+                            counts, save_errors = save_permits(permits, scraper_run)
+                            for error_msg in save_errors:
                                 logger.error(error_msg)
-                                errors.append(error_msg)
-                        
+                            errors.extend(save_errors)
+                            span['rows'] = counts['created'] + counts['updated'] + counts['unchanged']
+                        logger.info(
+                            f"{city_key}: {counts['created']} new, {counts['updated']} changed, "
+                            f"{counts['unchanged']} unchanged permits"
+                        )
+
                         all_permits.extend(permits)
                         cities_processed.append(city_key)
+                        # Progress for runs/<run_id>/events/ streams
+                        ScraperRun.objects.filter(pk=scraper_run.pk).update(
+                            cities_processed=cities_processed, total_permits_found=len(all_permits)
+                        )
                         
-                        total_value = sum(int(p["estimated_cost"]) for p in permits)
-                        city_summaries.append(f"SUCCESS {CITIES[city_key]['name']}: {len(permits)} permits (${total_value:,})")
+                        total_value = sum(int(p["estimated_cost"]) for p in permits if not p.get("cost_anomaly"))
+                        flagged = sum(1 for p in permits if p.get("cost_anomaly"))
+                        city_summaries.append(
+                            f"SUCCESS {CITIES[city_key]['name']}: {len(permits)} permits (${total_value:,}"
+                            + (f", {flagged} cost anomalies excluded)" if flagged else ")")
+                        )
                     else:
                         city_summaries.append(f"WARNING {CITIES[city_key]['name']}: No permits found")
                         
@@ -187,7 +335,11 @@ def start_scraper(request):
             end_time = django_timezone.now()
             duration = (end_time - start_time).total_seconds()
             total_permits = len(all_permits)
-            total_value = sum(Decimal(str(p["estimated_cost"])) for p in all_permits) if all_permits else Decimal('0')
+            # Flagged costs (extra zeros and the like) would dominate the total
+            total_value = sum(
+                (Decimal(str(p["estimated_cost"])) for p in all_permits if not p.get("cost_anomaly")), Decimal('0')
+            )
+            anomalous_permits = sum(1 for p in all_permits if p.get("cost_anomaly"))
             
             # Update scraper run record
             scraper_run.status = 'completed' if not errors else ('partial' if total_permits > 0 else 'failed')
@@ -195,10 +347,16 @@ def start_scraper(request):
             scraper_run.duration_seconds = int(duration)
             scraper_run.total_permits_found = total_permits
             scraper_run.total_project_value = total_value
+            scraper_run.anomalous_permits_found = anomalous_permits
             scraper_run.cities_processed = cities_processed
             scraper_run.errors = errors
             scraper_run.summary_report = "\n".join(city_summaries)
+            scraper_run.stage_timings = timer.as_list()
             scraper_run.save()
+            metrics.record_stage_timings(scraper_run.stage_timings)
+            refresh_filter_choices()
+            bump_watermark()
+            cache.delete_many([_dashboard_cache_key(flag) for flag in (False, True)])
             
             # Prepare response
             response_data = {
@@ -207,6 +365,7 @@ def start_scraper(request):
                 'duration_seconds': duration,
                 'total_permits_found': total_permits,
                 'total_project_value': str(total_value),
+                'anomalous_permits_found': anomalous_permits,
                 'cities_processed': cities_processed,
                 'city_summaries': city_summaries,
                 'errors': errors,
@@ -238,163 +397,359 @@ def start_scraper(request):
         )
 
 
-@api_view(['GET'])
-def scraper_status(request, run_id):
+# Async views: under ASGI (see permit_api/asgi.py) these wait on the event
+# loop instead of holding a worker, so long streams and slow clients don't
+# tie up the few workers. ORM calls go through sync_to_async or the async
+# queryset methods. DRF's @api_view is sync-only, so these return plain
+# JsonResponses.
+
+async def scraper_status(request, run_id):
     """Get the status of a specific scraper run"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
     try:
-        scraper_run = ScraperRun.objects.get(run_id=run_id)
-        serializer = ScraperRunSerializer(scraper_run)
-        return Response(serializer.data)
+        scraper_run = await ScraperRun.objects.aget(run_id=run_id)
     except ScraperRun.DoesNotExist:
-        return Response(
+        return JsonResponse(
             {'error': f'Scraper run with ID {run_id} not found'},
             status=status.HTTP_404_NOT_FOUND
         )
+    return JsonResponse(ScraperRunSerializer(scraper_run).data)
+
+
+async def scraper_run_events(request, run_id):
+    """Server-sent events with a run's progress until it finishes (see scraper/progress.py)"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    states = await sync_to_async(run_states)([run_id])
+    if run_id not in states:
+        return JsonResponse(
+            {'error': f'Scraper run with ID {run_id} not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    response = StreamingHttpResponse(run_events(run_id, states[run_id]), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let a proxy hold events back
+    return response
+
+
+def _include_anomalies(request):
+    return request.GET.get('include_anomalies', '').lower() in ('1', 'true', 'yes')
 
 
 @api_view(['GET'])
-def dashboard_stats(request):
-    """Get dashboard statistics"""
-    try:
-        total_permits = Permit.objects.count()
-        total_value = Permit.objects.aggregate(
-            total=models.Sum('estimated_cost')
-        )['total'] or 0
-        
-        # Recent runs
-        recent_runs = ScraperRun.objects.filter(
-            status__in=['completed', 'partial']
-        ).order_by('-started_at')[:5]
-        
-        # City breakdown
-        city_stats = []
-        for city_key, city_data in CITIES.items():
-            city_permits = Permit.objects.filter(city=city_data['name'])
-            city_count = city_permits.count()
-            city_value = city_permits.aggregate(
-                total=models.Sum('estimated_cost')
-            )['total'] or 0
-            
-            city_stats.append({
-                'city': city_data['name'],
-                'permit_count': city_count,
-                'total_value': str(city_value)
-            })
-        
-        return Response({
-            'total_permits': total_permits,
-            'total_value': str(total_value),
-            'city_stats': city_stats,
-            'recent_runs': ScraperRunSerializer(recent_runs, many=True).data
-        })
-        
-    except Exception as e:
+def rollup_stats(request):
+    """Slice and dice permit aggregates from the rollup cube
+
+    ?group_by=city,month,work_type,cost_bucket,cost_anomaly (any subset, default city)
+    filters: city, work_type, cost_bucket, month_from, month_to (YYYY-MM);
+    cost anomalies are left out unless ?include_anomalies=1 or grouped by
+    """
+    group_by = [d.strip() for d in request.query_params.get('group_by', 'city').split(',') if d.strip()]
+    unknown = [d for d in group_by if d not in ROLLUP_DIMENSIONS]
+    if unknown:
         return Response(
-            {'error': f'Failed to get dashboard stats: {str(e)}'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            {'error': f"Unknown dimensions: {', '.join(unknown)} (use {', '.join(ROLLUP_DIMENSIONS)})"},
+            status=status.HTTP_400_BAD_REQUEST
         )
+    
+    queryset = PermitRollup.objects.all()
+    if not (_include_anomalies(request) or 'cost_anomaly' in group_by):
+        queryset = queryset.filter(**HEADLINE)
+    try:
+        for name in ('city', 'work_type'):
+            values = request.query_params.getlist(name)
+            if values:
+                queryset = queryset.filter(**{f'{name}__in': values})
+        buckets = request.query_params.getlist('cost_bucket')
+        if buckets:
+            queryset = queryset.filter(cost_bucket__in=[int(b) for b in buckets])
+        for param, lookup in (('month_from', 'month__gte'), ('month_to', 'month__lte')):
+            value = request.query_params.get(param)
+            if value:
+                queryset = queryset.filter(**{lookup: datetime.strptime(value[:7], '%Y-%m').date()})
+    except ValueError as e:
+        return Response({'error': f'Invalid filter: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    rows = queryset.values(*group_by).annotate(
+        permit_count=models.Sum('permit_count'), total_cost=models.Sum('total_cost'),
+        min_cost=models.Min('min_cost'), max_cost=models.Max('max_cost')
+    ).order_by(*group_by)
+    
+    results = []
+    for row in rows:
+        row['total_cost'] = str(row['total_cost'])
+        row['min_cost'] = str(row['min_cost'])
+        row['max_cost'] = str(row['max_cost'])
+        row['avg_cost'] = str(round(Decimal(row['total_cost']) / row['permit_count'], 2)) if row['permit_count'] else '0'
+        if 'month' in row:
+            row['month'] = row['month'].strftime('%Y-%m')
+        if 'cost_bucket' in row:
+            row['cost_bucket_label'] = cost_bucket_label(row['cost_bucket'])
+        results.append(row)
+    
+    return Response({
+        'group_by': group_by,
+        'cost_buckets': [{'bucket': i, 'label': cost_bucket_label(i)} for i in range(len(COST_BUCKETS))],
+        'results': results,
+    })
 
 
 @api_view(['GET'])
-def export_permits_csv(request):
-    """Export permits to CSV with optional filtering"""
+def permit_heatmap(request):
+    """Permit counts and costs per geohash cell from the precomputed grid
+
+    ?precision=3-6 (cell size, default 5), filters: city, month_from, month_to
+    (YYYY-MM), bbox=min_lon,min_lat,max_lon,max_lat. Like the rollups, cost
+    anomalies are left out unless ?include_anomalies=1.
+    """
+    params = request.query_params
+    queryset = PermitGridCell.objects.all()
+    if not _include_anomalies(request):
+        queryset = queryset.filter(**HEADLINE)
+    box = None
     try:
-        # Get base queryset
-        queryset = Permit.objects.all()
-        
-        # Apply filters similar to PermitListView
-        city = request.query_params.get('city')
-        if city:
-            queryset = queryset.filter(city__icontains=city)
-        
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        if start_date:
-            queryset = queryset.filter(issue_date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(issue_date__lte=end_date)
-        
-        min_cost = request.query_params.get('min_cost')
-        if min_cost:
-            queryset = queryset.filter(estimated_cost__gte=min_cost)
-        
-        search = request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                project_description__icontains=search
-            ) | queryset.filter(
-                full_address__icontains=search
+        precision = int(params.get('precision') or DEFAULT_PRECISION)
+        if precision not in GRID_PRECISIONS:
+            raise ValueError(f"precision must be one of {', '.join(map(str, GRID_PRECISIONS))}")
+        queryset = queryset.filter(precision=precision)
+        cities = params.getlist('city')
+        if cities:
+            queryset = queryset.filter(city__in=cities)
+        for param, lookup in (('month_from', 'month__gte'), ('month_to', 'month__lte')):
+            value = params.get(param)
+            if value:
+                queryset = queryset.filter(**{lookup: datetime.strptime(value[:7], '%Y-%m').date()})
+        bbox = params.get('bbox')
+        if bbox:
+            min_lon, min_lat, max_lon, max_lat = _coordinates(bbox, 4, 'bbox=min_lon,min_lat,max_lon,max_lat')
+            if min_lat > max_lat or min_lon > max_lon:
+                raise ValueError("bbox minimums must not exceed its maximums")
+            box = (min_lat, min_lon, max_lat, max_lon)
+            queryset = queryset.filter(geo.in_cells(*box, max_precision=precision))
+    except ValueError as e:
+        return Response({'error': f'Invalid filter: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = queryset.values('geohash').annotate(
+        permit_count=models.Sum('permit_count'), total_cost=models.Sum('total_cost')
+    ).order_by('geohash')
+
+    cells = []
+    for row in rows:
+        bounds = geo.bounds(row['geohash'])
+        # The covering ranges are coarser than the box; drop cells entirely outside it
+        if box and (bounds[0] > box[2] or bounds[2] < box[0] or bounds[1] > box[3] or bounds[3] < box[1]):
+            continue
+        latitude, longitude = geo.decode(row['geohash'])
+        cells.append({
+            'geohash': row['geohash'],
+            'latitude': round(latitude, 6),
+            'longitude': round(longitude, 6),
+            'bounds': [round(value, 6) for value in bounds],
+            'permit_count': row['permit_count'],
+            'total_cost': str(row['total_cost']),
+        })
+
+    return Response({'precision': precision, 'count': len(cells), 'cells': cells})
+
+
+def _dashboard_cache_key(include_anomalies):
+    return f'scraper:dashboard:{int(include_anomalies)}'
+
+
+def _dashboard_payload(include_anomalies):
+    """Body of the dashboard response"""
+    # Totals come from the rollup cube (one row per city x month x work type x cost bucket x anomaly flag)
+    rollups = PermitRollup.objects.all() if include_anomalies else PermitRollup.objects.filter(**HEADLINE)
+    totals = rollups.aggregate(
+        count=models.Sum('permit_count'), total=models.Sum('total_cost')
+    )
+    total_permits = totals['count'] or 0
+    total_value = totals['total'] or 0
+    
+    # Recent runs
+    recent_runs = ScraperRun.objects.filter(
+        status__in=['completed', 'partial']
+    ).order_by('-started_at')[:5]
+    
+    # City breakdown in one grouped query
+    by_city = {
+        row['city']: row
+        for row in rollups.values('city').annotate(
+            permit_count=models.Sum('permit_count'), total=models.Sum('total_cost')
+        ).order_by()
+    }
+    city_stats = []
+    for city_key, city_data in CITIES.items():
+        row = by_city.get(city_data['name'], {})
+        city_stats.append({
+            'city': city_data['name'],
+            'permit_count': row.get('permit_count', 0),
+            'total_value': str(row.get('total') or 0)
+        })
+    
+    return {
+        'total_permits': total_permits,
+        'total_value': str(total_value),
+        'anomalous_permits': PermitRollup.objects.exclude(**HEADLINE).aggregate(
+            count=models.Sum('permit_count'))['count'] or 0,
+        'city_stats': city_stats,
+        'recent_runs': list(ScraperRunSerializer(recent_runs, many=True).data)
+    }
+
+
+async def dashboard_stats(request):
+    """Get dashboard statistics (cost anomalies left out unless ?include_anomalies=1)
+
+    Served from the cache for DASHBOARD_CACHE_SECONDS; a completed run clears it.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    include_anomalies = _include_anomalies(request)
+    key = _dashboard_cache_key(include_anomalies)
+    payload = await cache.aget(key)
+    if payload is None:
+        try:
+            payload = await sync_to_async(_dashboard_payload)(include_anomalies)
+        except Exception as e:
+            return JsonResponse(
+                {'error': f'Failed to get dashboard stats: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-        
-        # Order by issue date (most recent first)
-        queryset = queryset.order_by('-issue_date', '-created_at')
-        
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"permits_export_{timestamp}.csv"
-        
-        # Create CSV response
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        writer = csv.writer(response)
-        
-        # Write header row
-        writer.writerow([
-            'Permit ID', 'City', 'Issue Date', 'Full Address', 'Borough/Area', 'ZIP Code',
-            'Project Description', 'Estimated Cost', 'Contractor Name', 'Contractor License',
-            'Applicant Name', 'Owner Name', 'Architect Name', 'License Status',
-            'Business Address', 'Business Phone', 'Data Source', 'Scraped At'
-        ])
-        
-        # Write data rows
-        count = 0
-        for permit in queryset.iterator():  # Use iterator for memory efficiency
-            writer.writerow([
-                permit.permit_id,
-                permit.city,
-                permit.issue_date.strftime('%Y-%m-%d') if permit.issue_date else '',
-                permit.full_address,
-                permit.borough_area or '',
-                permit.zip_code or '',
-                permit.project_description,
-                float(permit.estimated_cost) if permit.estimated_cost else 0,
-                permit.contractor_name or '',
-                permit.contractor_license or '',
-                permit.applicant_name or '',
-                permit.owner_name or '',
-                permit.architect_name or '',
-                permit.license_status or '',
-                permit.business_address or '',
-                permit.business_phone or '',
-                permit.data_source or '',
-                permit.scraped_at.strftime('%Y-%m-%d %H:%M:%S') if permit.scraped_at else ''
-            ])
-            count += 1
-        
-        # Add count information as metadata in response headers
-        response['X-Total-Records'] = str(count)
-        
-        return response
-        
-    except Exception as e:
-        return Response(
-            {'error': f'Failed to export CSV: {str(e)}'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        await cache.aset(key, payload, settings.DASHBOARD_CACHE_SECONDS)
+    return JsonResponse(payload)
+
+
+def _export_queryset(params):
+    """Permits matching the export filters: city, start_date, end_date, min_cost, search, bbox, near
+
+    Raises ValueError for a malformed filter - a streamed export can't turn
+    into an error response once it has started.
+    """
+    queryset = Permit.objects.all()
+    
+    city = params.get('city')
+    if city:
+        queryset = queryset.filter(city__name__icontains=city)
+    
+    for param, lookup in (('start_date', 'issue_date__gte'), ('end_date', 'issue_date__lte')):
+        value = params.get(param)
+        if value:
+            try:
+                day = parse_date(value)
+            except ValueError:
+                day = None
+            if day is None:
+                raise ValueError(f"Invalid {param}: {value} (use YYYY-MM-DD)")
+            queryset = queryset.filter(**{lookup: day})
+    
+    min_cost = params.get('min_cost')
+    if min_cost:
+        try:
+            queryset = queryset.filter(estimated_cost__gte=Decimal(min_cost))
+        except InvalidOperation:
+            raise ValueError(f"Invalid min_cost: {min_cost}")
+    
+    search = params.get('search')
+    if search:
+        queryset = queryset.filter(
+            models.Q(project_description__icontains=search) | models.Q(full_address__icontains=search)
         )
+    
+    return _filter_location(queryset, params)
+
+
+def _routed_export_queryset(params):
+    queryset = _export_queryset(params)
+    # The rows are read after the view returns; keep the database routed to now (see scraper/replicas.py)
+    return queryset.using(queryset.db)
+
+
+async def export_permits_csv(request):
+    """Stream permits as CSV with optional filtering (see _export_queryset)"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        # Routing the queryset can read the replica watermark, so this can query
+        queryset = await sync_to_async(_routed_export_queryset)(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return await exports.astream_permits_csv(queryset, f"permits_export_{timestamp}.csv")
+
+
+def _require_staff(request):
+    # Export jobs write full-table files on the server; like the admin's background exports they are for staff
+    if not (request.user.is_authenticated and request.user.is_staff):
+        raise PermissionDenied('Export jobs are only available to staff users')
+
+
+def _enqueue_export(request):
+    _require_staff(request)
+    # Same rule as DRF's SessionAuthentication: logged-in browser sessions need the CSRF token
+    SessionAuthentication().enforce_csrf(request)
+    queryset = _export_queryset(request.GET)
+    if exports.active_job_count() >= settings.EXPORT_MAX_ACTIVE_JOBS:
+        raise Throttled(detail=(
+            f'{settings.EXPORT_MAX_ACTIVE_JOBS} export jobs are already queued or running; '
+            'try again when one has finished'
+        ))
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    job = exports.start_export_job(
+        queryset, f"permits_export_{timestamp}.csv", description='API export', user=request.user
+    )
+    return ExportJobSerializer(job).data
+
+
+async def export_jobs(request):
+    """POST: write the permits matching the export filters to a CSV file in the background"""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        job = await sync_to_async(_enqueue_export)(request)
+    except PermissionDenied as e:
+        return JsonResponse({'error': str(e.detail)}, status=status.HTTP_403_FORBIDDEN)
+    except Throttled as e:
+        return JsonResponse({'error': str(e.detail)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse(job, status=status.HTTP_202_ACCEPTED)
+
+
+# CSRF is checked in _enqueue_export; csrf_exempt() itself would wrap the view in a sync function
+export_jobs.csrf_exempt = True
+
+
+async def export_job_status(request, pk):
+    """Get the status of a background export job"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        # request.user loads the session, which is sync-only in Django 4.2
+        await sync_to_async(_require_staff)(request)
+    except PermissionDenied as e:
+        return JsonResponse({'error': str(e.detail)}, status=status.HTTP_403_FORBIDDEN)
+    await sync_to_async(exports.fail_stale_jobs)()
+    try:
+        job = await ExportJob.objects.aget(pk=pk)
+    except ExportJob.DoesNotExist:
+        return JsonResponse({'error': f'Export job {pk} not found'}, status=status.HTTP_404_NOT_FOUND)
+    return JsonResponse(ExportJobSerializer(job).data)
 
 
 def export_csv_page(request):
     """Render the CSV export page"""
     from django.shortcuts import render
-    from django.db.models import Sum, Count
+    from django.db.models import Sum
     
-    # Get statistics for the page
-    total_permits = Permit.objects.count()
-    total_value = Permit.objects.aggregate(Sum('estimated_cost'))['estimated_cost__sum'] or 0
+    # Get statistics for the page (from the rollup cube)
+    totals = PermitRollup.objects.filter(**HEADLINE).aggregate(count=Sum('permit_count'), total=Sum('total_cost'))
+    total_permits = totals['count'] or 0
+    total_value = totals['total'] or 0
     
     # Get list of cities
-    cities = Permit.objects.values_list('city', flat=True).distinct().order_by('city')
+    cities = PermitRollup.objects.values_list('city', flat=True).distinct().order_by('city')
     
     context = {
         'total_permits': total_permits,
@@ -404,3 +759,12 @@ def export_csv_page(request):
     }
     
     return render(request, 'scraper/export_csv.html', context)
+
+
+def metrics_view(request):
+    """Prometheus metrics for this process (or all workers in multiprocess mode)"""
+    allowed = settings.METRICS_ALLOWED_IPS
+    user = getattr(request, 'user', None)
+    if allowed and request.META.get('REMOTE_ADDR') not in allowed and not (user and user.is_staff):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,176 @@
+"""
+Content-addressed cache for processed ZIP outputs.
+
+Uploads are hashed while they stream in, and the flattened ZIP produced by
+the FileProcessor pipeline is stored under that hash. A repeat upload of the
+same bundle is served straight from the cache instead of being extracted and
+re-zipped. The cache is bounded by total size and entry count; the least
+recently used outputs are evicted first.
+
+The content hash is a block hash: SHA-256 over the concatenated SHA-256
+digests of fixed 4MB blocks. That lets chunked uploads hash each block as it
+arrives (across requests) and gives the same key as a plain multipart upload.
+"""
+
+import os
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import IntegrityError
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import ZipCacheEntry
+
+logger = logging.getLogger('scraper')
+
+# Upload chunk sizes must be a multiple of this so block digests line up
+BLOCK_SIZE = 1024 * 1024 * 4
+
+
+def combine_block_digests(block_digests):
+    """Content hash from the hex SHA-256 digests of consecutive blocks"""
+    return hashlib.sha256(b''.join(bytes.fromhex(d) for d in block_digests)).hexdigest()
+
+
+class ContentHasher:
+    """Incremental block hasher fed with arbitrarily sized pieces of data"""
+
+    def __init__(self):
+        self.block_digests = []
+        self._block = hashlib.sha256()
+        self._block_len = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(BLOCK_SIZE - self._block_len, len(view))
+            self._block.update(view[:take])
+            self._block_len += take
+            view = view[take:]
+            if self._block_len == BLOCK_SIZE:
+                self._finish_block()
+
+    def _finish_block(self):
+        self.block_digests.append(self._block.hexdigest())
+        self._block = hashlib.sha256()
+        self._block_len = 0
+
+    def finish(self):
+        """Flush the trailing partial block and return all block digests"""
+        if self._block_len:
+            self._finish_block()
+        return self.block_digests
+
+    def hexdigest(self):
+        return combine_block_digests(self.finish())
+
+
+def hash_file(path):
+    """Content hash of a file already on disk"""
+    hasher = ContentHasher()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+class ContentHashUploadHandler(FileUploadHandler):
+    """
+    Pass-through upload handler that hashes each file as it is received.
+    Hashes are exposed as request.upload_content_hashes[field_name].
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = ContentHasher()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, 'upload_content_hashes'):
+            self.request.upload_content_hashes = {}
+        self.request.upload_content_hashes[self.field_name] = self.hasher.hexdigest()
+        # Let the next handler build the actual uploaded file
+        return None
+
+
+def _cache_dir():
+    directory = settings.ZIP_CACHE_DIR
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def entry_path(entry):
+    return os.path.join(_cache_dir(), entry.output_file)
+
+
+def is_cache_path(path):
+    """True if path points into the cache (and must not be deleted after serving)"""
+    cache_dir = os.path.realpath(settings.ZIP_CACHE_DIR)
+    return os.path.realpath(path).startswith(cache_dir + os.sep)
+
+
+def lookup(content_hash):
+    """Return the cache entry for a content hash and mark it as recently used"""
+    if not content_hash:
+        return None
+    try:
+        entry = ZipCacheEntry.objects.get(content_hash=content_hash)
+    except ZipCacheEntry.DoesNotExist:
+        return None
+
+    if not os.path.exists(entry_path(entry)):
+        logger.warning(f"ZIP cache entry {content_hash} is missing its file, dropping it")
+        entry.delete()
+        return None
+
+    ZipCacheEntry.objects.filter(pk=entry.pk).update(
+        hits=F('hits') + 1, last_used_at=timezone.now()
+    )
+    return entry
+
+
+def store(content_hash, output_path, files_count):
+    """Move a freshly processed output into the cache and return its cached path"""
+    filename = f'{content_hash}.zip'
+    cached_path = os.path.join(_cache_dir(), filename)
+    os.replace(output_path, cached_path)
+
+    try:
+        ZipCacheEntry.objects.create(
+            content_hash=content_hash,
+            output_file=filename,
+            size_bytes=os.path.getsize(cached_path),
+            files_count=files_count,
+            last_used_at=timezone.now(),
+        )
+    except IntegrityError:
+        # Same bundle processed concurrently - the identical file is already cached
+        pass
+
+    evict(keep=content_hash)
+    return cached_path
+
+
+def evict(keep=None):
+    """Drop least recently used outputs until the cache is within its bounds"""
+    entries = ZipCacheEntry.objects.order_by('last_used_at')
+    total_bytes = entries.aggregate(total=Sum('size_bytes'))['total'] or 0
+    total_entries = entries.count()
+
+    for entry in entries.exclude(content_hash=keep).iterator():
+        if total_bytes <= settings.ZIP_CACHE_MAX_BYTES and total_entries <= settings.ZIP_CACHE_MAX_ENTRIES:
+            break
+        try:
+            os.remove(entry_path(entry))
+        except FileNotFoundError:
+            pass
+        entry.delete()
+        total_bytes -= entry.size_bytes
+        total_entries -= 1
+        logger.info(f"Evicted ZIP cache entry {entry.content_hash} ({entry.size_bytes} bytes)")